@@ -0,0 +1,179 @@
+import os
+from collections import OrderedDict
+import pygame
+
+# Default memory budget for cached surfaces (bytes). Entries that are no longer
+# referenced are kept around until the budget is exceeded, then evicted LRU-first.
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def resolve_path(path):
+    """Resolve a path relative to the package directory (absolute paths are kept)."""
+    if os.path.isabs(path):
+        return os.path.normpath(path)
+    return os.path.normpath(os.path.join(os.path.dirname(__file__), path))
+
+
+def surface_bytes(surf):
+    """Approximate pixel memory held by a surface."""
+    try:
+        return surf.get_pitch() * surf.get_height()
+    except Exception:
+        w, h = surf.get_size()
+        return w * h * surf.get_bytesize()
+
+
+class _Entry:
+    __slots__ = ('surface', 'refs', 'nbytes', 'converted')
+
+    def __init__(self, surface, converted):
+        self.surface = surface
+        self.refs = 0
+        self.nbytes = surface_bytes(surface)
+        self.converted = converted
+
+
+class AssetCache:
+    """Deduplicating, refcounted image cache.
+
+    Images are keyed by (path, scale, alpha). Surfaces are converted to the display
+    format as soon as a display exists; entries loaded before the display was
+    created are converted on their next acquire.
+
+    Usage:
+      img = assets.acquire("images/grass.png")
+      img = assets.acquire("images/box.png", scale=(32, 32))
+      assets.release("images/box.png", scale=(32, 32))
+    """
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = int(budget_bytes)
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(path, scale=None, alpha=True):
+        if scale is not None:
+            scale = (int(scale[0]), int(scale[1]))
+        return (resolve_path(path), scale, bool(alpha))
+
+    def _display_ready(self):
+        try:
+            return pygame.display.get_surface() is not None
+        except Exception:
+            return False
+
+    def _convert(self, surf, alpha):
+        if alpha:
+            try:
+                return surf.convert_alpha()
+            except Exception:
+                pass
+        return surf.convert()
+
+    def _load(self, key):
+        path, scale, alpha = key
+        if scale is None:
+            surf = pygame.image.load(path)
+        else:
+            # scaled variants are derived from the unscaled entry so the file is decoded once
+            base = self._get_entry((path, None, alpha)).surface
+            try:
+                surf = pygame.transform.smoothscale(base, scale)
+            except Exception:
+                surf = pygame.transform.scale(base, scale)
+        self.loads += 1
+        converted = False
+        if self._display_ready():
+            surf = self._convert(surf, alpha)
+            converted = True
+        return _Entry(surf, converted)
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+            self._entries[key] = entry
+            self.total_bytes += entry.nbytes
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if not entry.converted and self._display_ready():
+                self.total_bytes -= entry.nbytes
+                entry.surface = self._convert(entry.surface, key[2])
+                entry.nbytes = surface_bytes(entry.surface)
+                entry.converted = True
+                self.total_bytes += entry.nbytes
+        return entry
+
+    def acquire(self, path, scale=None, alpha=True):
+        """Return the cached surface for (path, scale, alpha), loading it if needed.
+
+        Each acquire increments the entry's reference count; pair it with release().
+        """
+        key = self.make_key(path, scale, alpha)
+        entry = self._get_entry(key)
+        entry.refs += 1
+        self.evict()
+        return entry.surface
+
+    def release(self, path, scale=None, alpha=True):
+        """Drop one reference. Unreferenced entries stay cached until evicted."""
+        key = self.make_key(path, scale, alpha)
+        entry = self._entries.get(key)
+        if entry is not None and entry.refs > 0:
+            entry.refs -= 1
+        self.evict()
+
+    def invalidate(self, path):
+        """Forget every cached variant of `path` (used when the file changes on disk)."""
+        path = resolve_path(path)
+        for key in [k for k in self._entries if k[0] == path]:
+            self.total_bytes -= self._entries.pop(key).nbytes
+
+    def evict(self):
+        """Evict unreferenced entries, least recently used first, until within budget."""
+        if self.total_bytes <= self.budget_bytes:
+            return 0
+        evicted = 0
+        for key in list(self._entries):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refs > 0:
+                continue
+            del self._entries[key]
+            self.total_bytes -= entry.nbytes
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'budget': self.budget_bytes,
+            'referenced': sum(1 for e in self._entries.values() if e.refs > 0),
+            'loads': self.loads,
+            'hits': self.hits,
+            'evictions': self.evictions,
+        }
+
+    def items(self):
+        """Yield (key, refs, nbytes) for every cached entry."""
+        for key, entry in self._entries.items():
+            yield key, entry.refs, entry.nbytes
+
+    def surfaces(self):
+        """Yield (key, refs, surface) for every cached entry."""
+        for key, entry in self._entries.items():
+            yield key, entry.refs, entry.surface
+
+
+assets = AssetCache()
@@ -0,0 +1,90 @@
+import time
+import pygame
+from .camera import camera
+from . import map_render
+
+# Chunk sizes (tiles per side) tried by tune_chunk_size
+CANDIDATE_CHUNK_SIZES = (4, 8, 16, 32, 64)
+# Frames drawn per candidate when timing blits
+BENCH_FRAMES = 30
+# Bake cost is spread over this many frames when scoring (roughly how long a
+# freshly baked screen of chunks stays in view while scrolling)
+BAKE_AMORTIZE_FRAMES = 60
+# Candidates whose baked surfaces for one view exceed this are rejected
+MEMORY_BUDGET_BYTES = 96 * 1024 * 1024
+
+
+def measure_chunk_size(game_map, chunk_size, target, frames=BENCH_FRAMES):
+    """Bake the chunks around the camera at `chunk_size` and time drawing them into `target`.
+
+    Returns a dict with bake_ms, draw_ms (per frame), blits (per frame), overdraw
+    (pixels blitted per screen pixel, so padding shows up above 1.0 per layer) and
+    bytes (baked surface memory). Leaves the map's chunks reset.
+    """
+    game_map.set_chunk_size(chunk_size)
+    start = time.perf_counter()
+    game_map.bake_view()
+    bake_ms = (time.perf_counter() - start) * 1000.0
+
+    screen_rect = target.get_rect()
+    area = 0
+    memory = 0
+    for surf, rect in game_map.baked_surfaces():
+        memory += surf.get_width() * surf.get_height() * surf.get_bytesize()
+        clip = rect.move(-camera.x, -camera.y).clip(screen_rect)
+        area += clip.width * clip.height
+
+    game_map.draw(target)
+    start = time.perf_counter()
+    for _ in range(frames):
+        game_map.draw(target)
+    draw_ms = (time.perf_counter() - start) * 1000.0 / frames
+    stats = map_render.last_draw_stats
+    result = {
+        'chunk_size': int(chunk_size),
+        'bake_ms': bake_ms,
+        'draw_ms': draw_ms,
+        'blits': stats.get('chunk_blits', 0) + stats.get('sorted_blits', 0),
+        'overdraw': area / float(max(1, screen_rect.width * screen_rect.height)),
+        'bytes': memory,
+    }
+    game_map.evict_all()
+    return result
+
+
+def score(result):
+    """Per-frame cost of a measurement (lower is better): draw time plus amortized bake time."""
+    if result['bytes'] > MEMORY_BUDGET_BYTES:
+        return float('inf')
+    return result['draw_ms'] + result['bake_ms'] / BAKE_AMORTIZE_FRAMES
+
+
+def tune_chunk_size(game_map, screen, candidates=CANDIDATE_CHUNK_SIZES, frames=BENCH_FRAMES):
+    """Benchmark `candidates` against the map at the current camera and switch to the best.
+
+    Drawing goes to an offscreen copy of `screen`, so nothing flickers. Returns
+    (best_chunk_size, results) with one measure_chunk_size() dict per candidate,
+    each with its 'score'. Chunks are rebaked at the chosen size on the next draw.
+
+    Usage:
+      best, results = tune_chunk_size(game_map, screen)
+    """
+    target = pygame.Surface(screen.get_size(), 0, screen)
+    original = game_map.chunk_size
+    # warm-up: page regions in and convert tile images so the first candidate is not charged for it
+    measure_chunk_size(game_map, original, target, 1)
+    results = []
+    for cs in candidates:
+        try:
+            result = measure_chunk_size(game_map, cs, target, frames)
+        except Exception as e:
+            print(f"[autotune] chunk_size {cs} failed: {e}")
+            continue
+        result['score'] = score(result)
+        results.append(result)
+        print(f"[autotune] chunk_size {cs}: bake {result['bake_ms']:.1f} ms, draw {result['draw_ms']:.2f} ms, "
+              f"{result['blits']} blits, overdraw {result['overdraw']:.2f}x, {result['bytes'] / 1048576:.1f} MB")
+    finite = [r for r in results if r['score'] != float('inf')]
+    best = min(finite, key=lambda r: r['score'])['chunk_size'] if finite else original
+    game_map.set_chunk_size(best)
+    return best, results
@@ -0,0 +1,153 @@
+import os
+import atexit
+import multiprocessing
+from multiprocessing import shared_memory
+import pygame
+
+# Below this many surfaces a bake pass stays on the main thread (pool overhead dominates)
+MIN_POOL_JOBS = 32
+
+# Per-process cache of the tile images published by the parent: shm name -> surfaces
+_worker_images = {}
+
+
+def _attach_images(name, meta):
+    images = _worker_images.get(name)
+    if images is None:
+        shm = shared_memory.SharedMemory(name=name)
+        images = []
+        try:
+            for off, w, h, fmt, colorkey, alpha in meta:
+                img = pygame.image.frombytes(bytes(shm.buf[off:off + w * h * len(fmt)]), (w, h), fmt)
+                if colorkey is not None:
+                    img.set_colorkey(colorkey)
+                if alpha is not None:
+                    img.set_alpha(alpha)
+                images.append(img)
+        finally:
+            shm.close()
+        _worker_images.clear()
+        _worker_images[name] = images
+    return images
+
+
+def _bake_batch(args):
+    """Worker: rasterize a batch of jobs into the shared output buffer as raw RGBA."""
+    images_name, meta, out_name, jobs = args
+    images = _attach_images(images_name, meta)
+    out = shared_memory.SharedMemory(name=out_name)
+    try:
+        for offset, size, items, opaque in jobs:
+            canvas = pygame.Surface(size) if opaque else pygame.Surface(size, pygame.SRCALPHA)
+            canvas.blits([(images[t], (x, y)) for t, x, y in items], False)
+            n = size[0] * size[1] * 4
+            out.buf[offset:offset + n] = pygame.image.tobytes(canvas, 'RGBA')
+    finally:
+        out.close()
+    return len(jobs)
+
+
+class BakePool:
+    """Rasterize chunk layouts in a pool of worker processes.
+
+    Tile images are published once (and again only when their pixels change) as
+    raw bytes in shared memory: RGBA for per-pixel alpha images, RGB plus their
+    colorkey and surface alpha for the rest, so workers blit exactly what the
+    main thread would. Workers are spawned, not forked (the parent has SDL
+    state and threads by the time the first pool bake runs). Each job is a layout from plan_chunk/plan_strips:
+    ((w, h), [(kind, x, y), ...], opaque). Workers blit it with pygame into a shared
+    output buffer; the main thread only wraps the pixels in display-format surfaces.
+
+    Usage:
+      pool = BakePool(workers=4)
+      surfaces = pool.bake(jobs, tile_kinds)
+      pool.close()
+    """
+    def __init__(self, workers=None):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self._pool = None
+        self._images = None
+        self._images_meta = None
+        self._images_key = None
+        atexit.register(self.close)
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.get_context('spawn').Pool(self.workers)
+        return self._pool
+
+    def _publish_images(self, tile_kinds):
+        images = [tk.image for tk in tile_kinds]
+        blobs = []
+        fmts = []
+        for img in images:
+            # without per-pixel alpha the exported alpha byte is garbage: send RGB
+            fmt = 'RGBA' if img.get_flags() & pygame.SRCALPHA else 'RGB'
+            fmts.append(fmt)
+            blobs.append(pygame.image.tobytes(img, fmt))
+        # keyed on the pixels themselves: a reloaded image may reuse a freed surface's id
+        key = [(img.get_size(), fmt, img.get_colorkey(), img.get_alpha(), blob)
+               for img, fmt, blob in zip(images, fmts, blobs)]
+        if key == self._images_key:
+            return
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(len(b) for b in blobs)))
+        meta = []
+        off = 0
+        for blob, (size, fmt, colorkey, alpha, _) in zip(blobs, key):
+            shm.buf[off:off + len(blob)] = blob
+            meta.append((off, size[0], size[1], fmt, colorkey, alpha))
+            off += len(blob)
+        self._release_images()
+        self._images, self._images_meta, self._images_key = shm, meta, key
+
+    def _release_images(self):
+        if self._images is not None:
+            self._images.close()
+            self._images.unlink()
+            self._images = None
+            self._images_key = None
+
+    def bake(self, jobs, tile_kinds):
+        """Rasterize `jobs` in parallel and return their surfaces in job order."""
+        if not jobs:
+            return []
+        self._publish_images(tile_kinds)
+        offsets = []
+        total = 0
+        for size, _, _ in jobs:
+            offsets.append(total)
+            total += size[0] * size[1] * 4
+        out = shared_memory.SharedMemory(create=True, size=max(1, total))
+        try:
+            # a few batches per worker keeps them busy without pickling per job
+            per_batch = max(1, len(jobs) // (self.workers * 4))
+            batches = []
+            for i in range(0, len(jobs), per_batch):
+                batch = [(offsets[j], jobs[j][0], jobs[j][1], jobs[j][2]) for j in range(i, min(len(jobs), i + per_batch))]
+                batches.append((self._images.name, self._images_meta, out.name, batch))
+            self._ensure_pool().map(_bake_batch, batches)
+
+            display = pygame.display.get_surface() is not None
+            surfaces = []
+            for (size, _, opaque), off in zip(jobs, offsets):
+                view = out.buf[off:off + size[0] * size[1] * 4]
+                wrapped = pygame.image.frombuffer(view, size, 'RGBA')
+                # converting copies the pixels out of the shared buffer
+                if display:
+                    surf = wrapped.convert() if opaque else wrapped.convert_alpha()
+                else:
+                    surf = wrapped.copy()
+                del wrapped
+                view.release()
+                surfaces.append(surf)
+            return surfaces
+        finally:
+            out.close()
+            out.unlink()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._release_images()
@@ -0,0 +1,318 @@
+import math
+import time
+from itertools import repeat
+import numpy as np
+from .assets import assets
+from .sprite import _resolve_image_path
+
+# What an entity does when its next step would enter a solid tile
+HIT_STOP = 0     # stay put on that axis (like the player)
+HIT_BOUNCE = 1   # reverse velocity on that axis
+HIT_KILL = 2     # despawn (projectiles)
+
+INITIAL_CAPACITY = 256
+# Largest bounding box (in tiles) read with one tile_block; sparser lookups use Map.tiles_at()
+MAX_BLOCK_TILES = 1 << 16
+# Rejection-sampling rounds scatter() makes over rects too large to read whole
+SCATTER_ROUNDS = 8
+
+# Per-entity columns: name -> dtype
+FIELDS = (
+    ('id', np.int64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('vx', np.float64),
+    ('vy', np.float64),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('sprite', np.int32),
+    ('on_hit', np.uint8),
+    ('ttl', np.float64),
+    ('tx', np.float64),
+    ('ty', np.float64),
+)
+_FIELD_NAMES = frozenset(name for name, _ in FIELDS)
+
+
+def solid_table(tile_kinds, outside=False):
+    """Bool lookup: kind index -> is_solid, plus a trailing entry (`outside`) for cells outside the map."""
+    return np.array([bool(tk.is_solid) for tk in tile_kinds] + [bool(outside)], dtype=bool)
+
+
+class EntityStore:
+    """Entities as columns of NumPy arrays instead of one Sprite object each.
+
+    Positions, velocities, sizes, sprite ids, hit responses, lifetimes and steering
+    targets (tx, ty; NaN for none) are stored per column; `store.x`, `store.vx`, ... are views of the live rows and
+    can be edited in place (e.g. to steer a whole group at once). update() moves
+    every entity in one vectorized step, axis by axis, and tests the boxes
+    against the map's tile solidity in batch. Collision is per tile square (the
+    player additionally uses per-pixel masks). Rows are compacted on despawn, so
+    refer to entities by the stable ids spawn() returns, not by row. Unlike the
+    player, entities treat the area outside the map as solid (`solid_outside`).
+
+    Usage:
+      npcs = EntityStore()
+      sid = npcs.add_sprite("images/player.jpg", (24, 24))
+      npcs.spawn_many(xs, ys, sid, vxs, vys, on_hit=HIT_BOUNCE)
+      npcs.update(game_map, dt)
+      game_map.draw(screen, sprites=[player], entities=(npcs,))
+    """
+    solid_outside = True
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self._next_id = 0
+        self._columns = {name: np.zeros(max(1, int(capacity)), dtype) for name, dtype in FIELDS}
+        self._sprite_keys = []
+        self._images = np.empty(0, dtype=object)
+        self._sprite_sizes = np.zeros((0, 2), dtype=np.int32)
+        self.last_update_ms = 0.0
+
+    def __getattr__(self, name):
+        if name in _FIELD_NAMES:
+            return self._columns[name][:self.count]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self._columns['id'])
+
+    def add_sprite(self, image, scale=None):
+        """Register an image (held in the asset cache) and return its sprite id."""
+        path = _resolve_image_path(image)
+        surf = assets.acquire(path, scale)
+        self._sprite_keys.append((path, scale))
+        images = np.empty(len(self._images) + 1, dtype=object)
+        images[:-1] = self._images
+        images[-1] = surf
+        self._images = images
+        self._sprite_sizes = np.vstack([self._sprite_sizes, [surf.get_size()]]).astype(np.int32)
+        return len(self._images) - 1
+
+    def _reserve(self, n):
+        if n <= self.capacity:
+            return
+        new_cap = self.capacity
+        while new_cap < n:
+            new_cap *= 2
+        for name, col in self._columns.items():
+            grown = np.zeros(new_cap, col.dtype)
+            grown[:self.count] = col[:self.count]
+            self._columns[name] = grown
+
+    def spawn_many(self, xs, ys, sprite, vxs=0.0, vys=0.0, on_hit=HIT_STOP, ttl=math.inf):
+        """Add entities (arguments broadcast against each other); returns their ids."""
+        xs, ys, sprite, vxs, vys, on_hit, ttl = np.broadcast_arrays(xs, ys, sprite, vxs, vys, on_hit, ttl)
+        n = xs.size
+        if n == 0:
+            return np.zeros(0, np.int64)
+        start, end = self.count, self.count + n
+        self._reserve(end)
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._next_id += n
+        sprite = sprite.ravel().astype(np.int32)
+        c = self._columns
+        c['id'][start:end] = ids
+        c['x'][start:end] = xs.ravel()
+        c['y'][start:end] = ys.ravel()
+        c['vx'][start:end] = vxs.ravel()
+        c['vy'][start:end] = vys.ravel()
+        c['w'][start:end] = self._sprite_sizes[sprite, 0]
+        c['h'][start:end] = self._sprite_sizes[sprite, 1]
+        c['sprite'][start:end] = sprite
+        c['on_hit'][start:end] = on_hit.ravel()
+        c['ttl'][start:end] = ttl.ravel()
+        c['tx'][start:end] = np.nan
+        c['ty'][start:end] = np.nan
+        self.count = end
+        return ids
+
+    def spawn(self, x, y, sprite, vx=0.0, vy=0.0, on_hit=HIT_STOP, ttl=math.inf):
+        """Add one entity; returns its id."""
+        return int(self.spawn_many(x, y, sprite, vx, vy, on_hit, ttl)[0])
+
+    def rows(self, ids):
+        """Current row of each id in `ids` (-1 for despawned ids)."""
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if not self.count:
+            return np.full(ids.shape, -1, np.int64)
+        live = self.id
+        # ids are assigned in increasing order and compaction keeps order, so rows stay sorted
+        pos = np.minimum(np.searchsorted(live, ids), self.count - 1)
+        return np.where(live[pos] == ids, pos, -1)
+
+    def kill(self, ids):
+        """Despawn the entities with the given ids."""
+        self._compact(~np.isin(self.id, ids))
+
+    def clear(self):
+        self.count = 0
+
+    def _compact(self, keep):
+        kept = int(np.count_nonzero(keep))
+        if kept == self.count:
+            return
+        for col in self._columns.values():
+            col[:kept] = col[:self.count][keep]
+        self.count = kept
+
+    def blocked(self, game_map, x, y):
+        """Bool per entity: would its box at (x, y) overlap a solid tile (or leave the map, see solid_outside)?"""
+        n = self.count
+        if n == 0:
+            return np.zeros(0, bool)
+        ts = game_map.tile_size
+        w, h = self.w, self.h
+        right = x + (w - 1)
+        bottom = y + (h - 1)
+        # sample the box every tile_size pixels plus its far edge, so no tile it touches is skipped
+        samples = []
+        for i in range(int(math.ceil(int(w.max()) / ts)) + 1):
+            cols = np.floor(np.minimum(x + i * ts, right) / ts).astype(np.int64)
+            for j in range(int(math.ceil(int(h.max()) / ts)) + 1):
+                samples.append((cols, np.floor(np.minimum(y + j * ts, bottom) / ts).astype(np.int64)))
+        table = solid_table(game_map.tile_kinds, self.solid_outside)
+        tx0 = int(np.floor(x.min() / ts))
+        ty0 = int(np.floor(y.min() / ts))
+        tx1 = int(np.floor(right.max() / ts)) + 1
+        ty1 = int(np.floor(bottom.max() / ts)) + 1
+        if (tx1 - tx0) * (ty1 - ty0) > MAX_BLOCK_TILES:
+            # entities far apart: look up just the sampled tiles instead of the box between them
+            kinds = game_map.tiles_at(np.concatenate([c for c, _ in samples]), np.concatenate([r for _, r in samples]),
+                                      fill=len(table) - 1)
+            return table[kinds].reshape(len(samples), n).any(axis=0)
+        solid = table[game_map.tile_block(tx0, ty0, tx1, ty1, fill=len(table) - 1)]
+        hit = np.zeros(n, bool)
+        for cols, rows in samples:
+            hit |= solid[rows - ty0, cols - tx0]
+        return hit
+
+    def update(self, game_map, dt):
+        """Advance every entity by `dt` seconds, resolving tile collisions per axis."""
+        start = time.perf_counter()
+        if self.count:
+            dt = float(dt)
+            ttl = self.ttl
+            ttl -= dt
+            dead = ttl <= 0.0
+            on_hit = self.on_hit
+            x, y, vx, vy = self.x, self.y, self.vx, self.vy
+            # x first, then y from the resolved x (same order as Player.update)
+            nx = x + vx * dt
+            hit = self.blocked(game_map, nx, y) if game_map is not None else np.zeros(self.count, bool)
+            np.copyto(x, nx, where=~hit)
+            vx[hit & (on_hit == HIT_BOUNCE)] *= -1.0
+            dead |= hit & (on_hit == HIT_KILL)
+            ny = y + vy * dt
+            hit = self.blocked(game_map, x, ny) if game_map is not None else np.zeros(self.count, bool)
+            np.copyto(y, ny, where=~hit)
+            vy[hit & (on_hit == HIT_BOUNCE)] *= -1.0
+            dead |= hit & (on_hit == HIT_KILL)
+            if dead.any():
+                self._compact(~dead)
+        self.last_update_ms = (time.perf_counter() - start) * 1000.0
+
+    def steer(self, speed, dt):
+        """Point entities that have a target (tx, ty) at it with `speed`, without overshooting.
+
+        Entities within one step of their target are placed on it, stopped and have
+        the target cleared; returns their rows.
+        """
+        if not self.count:
+            return np.zeros(0, np.int64)
+        tx, ty = self.tx, self.ty
+        has = ~np.isnan(tx)
+        dx = np.where(has, tx - self.x, 0.0)
+        dy = np.where(has, ty - self.y, 0.0)
+        dist = np.hypot(dx, dy)
+        step = float(speed) * max(float(dt), 1e-6)
+        arrived = has & (dist <= step)
+        moving = has & ~arrived
+        scale = float(speed) / np.where(moving, dist, 1.0)
+        self.vx[moving] = (dx * scale)[moving]
+        self.vy[moving] = (dy * scale)[moving]
+        self.x[arrived] = tx[arrived]
+        self.y[arrived] = ty[arrived]
+        self.vx[arrived] = 0.0
+        self.vy[arrived] = 0.0
+        tx[arrived] = np.nan
+        ty[arrived] = np.nan
+        return np.flatnonzero(arrived)
+
+    def wander(self, dt, speed, turn_rate=0.5, rng=None):
+        """Give each entity a new random heading at `speed` with probability turn_rate * dt."""
+        if not self.count:
+            return
+        rng = rng if rng is not None else np.random.default_rng()
+        turn = rng.random(self.count) < turn_rate * float(dt)
+        k = int(np.count_nonzero(turn))
+        if k:
+            angle = rng.random(k) * (2.0 * math.pi)
+            self.vx[turn] = np.cos(angle) * speed
+            self.vy[turn] = np.sin(angle) * speed
+
+    def scatter(self, game_map, count, sprite, x0, y0, x1, y1, speed=0.0, on_hit=HIT_BOUNCE, seed=0):
+        """Spawn up to `count` entities on random open tiles in tile rect [x0, x1) x [y0, y1).
+
+        Rects larger than MAX_BLOCK_TILES are not read whole: random tiles are
+        drawn and the open ones kept, for up to SCATTER_ROUNDS rounds.
+        """
+        rng = np.random.default_rng(seed)
+        outside = len(game_map.tile_kinds)
+        table = solid_table(game_map.tile_kinds, outside=True)
+        if (x1 - x0) * (y1 - y0) <= MAX_BLOCK_TILES:
+            rows, cols = np.nonzero(~table[game_map.tile_block(x0, y0, x1, y1, fill=outside)])
+            if rows.size == 0:
+                return np.zeros(0, np.int64)
+            pick = rng.integers(0, rows.size, int(count))
+            cols, rows = cols[pick], rows[pick]
+        else:
+            found_x, found_y, total = [], [], 0
+            for _ in range(SCATTER_ROUNDS):
+                cx = rng.integers(x0, x1, 2 * int(count))
+                cy = rng.integers(y0, y1, 2 * int(count))
+                keep = ~table[game_map.tiles_at(cx, cy, fill=outside)]
+                found_x.append(cx[keep] - x0)
+                found_y.append(cy[keep] - y0)
+                total += int(np.count_nonzero(keep))
+                if total >= count:
+                    break
+            cols = np.concatenate(found_x)[:int(count)]
+            rows = np.concatenate(found_y)[:int(count)]
+            if rows.size == 0:
+                return np.zeros(0, np.int64)
+        ts = game_map.tile_size
+        w, h = self._sprite_sizes[sprite]
+        angle = rng.random(rows.size) * (2.0 * math.pi)
+        return self.spawn_many((cols + x0) * ts + (ts - w) // 2, (rows + y0) * ts + (ts - h) // 2,
+                               sprite, np.cos(angle) * speed, np.sin(angle) * speed, on_hit)
+
+    def depth_items(self, cam_x, cam_y, screen_w, screen_h):
+        """Draw list for map_render.draw_depth_sorted: (depth, 1, x, image, (sx, sy)) per on-screen entity."""
+        if not self.count:
+            return []
+        sx = (self.x - cam_x).astype(np.int64)
+        sy = (self.y - cam_y).astype(np.int64)
+        w, h = self.w, self.h
+        idx = np.flatnonzero((sx < screen_w) & (sy < screen_h) & (sx + w > 0) & (sy + h > 0))
+        if idx.size == 0:
+            return []
+        return list(zip((self.y[idx] + h[idx]).tolist(), repeat(1), self.x[idx].tolist(),
+                        self._images[self.sprite[idx]].tolist(), zip(sx[idx].tolist(), sy[idx].tolist())))
+
+    def release(self):
+        """Drop every entity and give the sprite images back to the asset cache."""
+        self.clear()
+        for path, scale in self._sprite_keys:
+            assets.release(path, scale)
+        self._sprite_keys = []
+        self._images = np.empty(0, dtype=object)
+        self._sprite_sizes = np.zeros((0, 2), dtype=np.int32)
+
+    def memory_items(self):
+        for col in self._columns.values():
+            yield 'entities', 'entity columns', col
@@ -0,0 +1,264 @@
+import math
+import time
+import numpy as np
+from .camera import camera
+from .entities import solid_table
+
+# Tiles of map around the view covered by the field (agents beyond it stop)
+WINDOW_MARGIN = 16
+# The window origin snaps to multiples of this many tiles, so small camera moves keep the field
+WINDOW_SNAP = 8
+# Minimum seconds between recomputes (target moves and tile edits wait for the next slot)
+RECOMPUTE_INTERVAL = 0.2
+# Distance changes below this count as converged (carries round in float64)
+SWEEP_TOLERANCE = 1e-6
+
+# 8 moves as (dx, dy, cost)
+_MOVES = tuple((dx, dy, math.sqrt(2.0) if dx and dy else 1.0)
+               for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy)
+
+
+def _shift(dx, dy, h, w):
+    """(cell slices, neighbour slices): cells whose neighbour at (+dx, +dy) is inside an h x w grid."""
+    cell = (slice(max(0, -dy), h - max(0, dy)), slice(max(0, -dx), w - max(0, dx)))
+    nbr = (slice(max(0, dy), h - max(0, -dy)), slice(max(0, dx), w - max(0, -dx)))
+    return cell, nbr
+
+
+def _runs(linked, spacing):
+    """Run numbers times `spacing` for lines of cells: they step up after every
+    position whose move to the next cell is not allowed (`linked` is False)."""
+    runs = np.zeros((linked.shape[0], linked.shape[1] + 1))
+    runs[:, 1:] = np.cumsum(~linked, axis=1) * spacing
+    return runs
+
+
+def _diagonals(allowed, dx, dy):
+    """Every diagonal line in direction (dx, dy) of an h x w grid.
+
+    Returns (cells, linked): flat cell indices, one line per row (short lines
+    padded with h * w), and whether the move from each cell to the next along its
+    line is allowed.
+    """
+    h, w = allowed.shape
+    sx, sy = np.meshgrid(np.arange(w), np.arange(h))
+    starts = ~((sx - dx >= 0) & (sx - dx < w) & (sy - dy >= 0) & (sy - dy < h))
+    k = np.arange(min(h, w))
+    xs = sx[starts][:, None] + k * dx
+    ys = sy[starts][:, None] + k * dy
+    inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    cx, cy = np.where(inside, xs, 0), np.where(inside, ys, 0)
+    cells = np.where(inside, cy * w + cx, h * w)
+    linked = inside[:, 1:] & allowed[cy[:, :-1], cx[:, :-1]]
+    return cells, linked
+
+
+def _carry(d, along):
+    """`d` with distances carried both ways along each row, staying within runs.
+
+    `along` is each cell's distance from the row start plus its run number
+    (spaced far apart), so one running minimum per row covers every run at
+    once: d - along is carried forwards, d + along backwards. Distances must be
+    finite (a run's own values have to undercut the runs before it).
+    """
+    fwd = np.minimum.accumulate(d - along, axis=1) + along
+    back = np.minimum.accumulate((d + along)[:, ::-1], axis=1)[:, ::-1] - along
+    return np.minimum(d, np.minimum(fwd, back))
+
+
+def distance_field(passable, tx, ty):
+    """Travel cost from every cell of `passable` to (tx, ty), 8-connected without corner cutting.
+
+    Exact wavefront by vectorized relaxation: each round carries distances along
+    every straight run of allowed moves (rows, columns and both diagonals), in
+    both directions, until a round changes nothing. Fronts cover whole corridors
+    per round, so a window converges in about as many rounds as its paths have
+    turns. Returns (dist, step_x, step_y): float32 costs (inf where unreachable)
+    and the int8 offset of the next cell downhill (0, 0 at the target and where
+    unreachable).
+    """
+    h, w = passable.shape
+    dist = np.full((h, w), np.inf, dtype=np.float32)
+    moves = []
+    allowed = {}
+    for dx, dy, cost in _MOVES:
+        cell, nbr = _shift(dx, dy, h, w)
+        ok = passable[cell] & passable[nbr]
+        if dx and dy:
+            # both orthogonal cells must be open to move diagonally
+            ok &= passable[cell[0], nbr[1]] & passable[nbr[0], cell[1]]
+        moves.append((dx, dy, cell, nbr, np.where(ok, np.float32(cost), np.float32(np.inf))))
+        allowed[(dx, dy)] = np.zeros((h, w), dtype=bool)
+        allowed[(dx, dy)][cell] = ok
+    if 0 <= tx < w and 0 <= ty < h and passable[ty, tx]:
+        # unreached cells hold a finite sentinel, twice any real distance (carries
+        # may round it a little), and runs are spaced wider still so they never mix
+        unreached = 4.0 * (h + 1) * (w + 1)
+        spacing = 2.0 * unreached + 2.0 * (h + w)
+        # line sets as (flat cell indices, `along` for _carry)
+        index = np.arange(h * w).reshape(h, w)
+        passes = [
+            (index, _runs(allowed[(1, 0)][:, :-1], spacing) + np.arange(w)),
+            (index.T, _runs(allowed[(0, 1)].T[:, :-1], spacing) + np.arange(h)),
+        ]
+        for dx, dy in ((1, 1), (1, -1)):
+            cells, linked = _diagonals(allowed[(dx, dy)], dx, dy)
+            passes.append((cells, _runs(linked, spacing) + np.arange(cells.shape[1]) * math.sqrt(2.0)))
+        flat = np.full(h * w + 1, unreached)
+        flat[ty * w + tx] = 0.0
+        while True:
+            before = flat.copy()
+            for cells, along in passes:
+                flat[cells] = _carry(flat[cells], along)
+                # padding cells all share the last slot
+                flat[-1] = unreached
+            if not np.any(flat < before - SWEEP_TOLERANCE):
+                break
+        flat[flat > unreached / 2] = np.inf
+        dist = flat[:-1].reshape(h, w).astype(np.float32)
+
+    best = np.full((h, w), np.inf, dtype=np.float32)
+    step_x = np.zeros((h, w), dtype=np.int8)
+    step_y = np.zeros((h, w), dtype=np.int8)
+    for dx, dy, cell, nbr, cost in moves:
+        cand = dist[nbr] + cost
+        better = cand < best[cell]
+        best[cell] = np.where(better, cand, best[cell])
+        step_x[cell] = np.where(better, dx, step_x[cell])
+        step_y[cell] = np.where(better, dy, step_y[cell])
+    # no step at the target or where it is unreachable
+    stay = ~np.isfinite(dist) | (dist == 0.0)
+    step_x[stay] = 0
+    step_y[stay] = 0
+    return dist, step_x, step_y
+
+
+class FlowField:
+    """Shared steering toward one target for any number of agents.
+
+    The field covers a window of the map around the camera (WINDOW_MARGIN tiles
+    beyond the view) and is recomputed at most every RECOMPUTE_INTERVAL seconds:
+    when the target changes tile, the window moves or tiles are edited.
+    Passability comes from TileKind.is_solid. steer() then gives every entity of
+    an EntityStore its velocity with one lookup into the field.
+
+    Usage:
+      flow = FlowField(game_map)
+      flow.update(player.x + 16, player.y + 16)   # target in pixels
+      flow.steer(npcs, speed)
+    """
+    def __init__(self, game_map, margin=WINDOW_MARGIN, interval=RECOMPUTE_INTERVAL):
+        self.map = game_map
+        self.margin = int(margin)
+        self.interval = float(interval)
+        self.origin = (0, 0)
+        self.dist = None
+        self.step_x = self.step_y = None
+        self.target = None
+        self._key = None
+        self._dirty = True
+        self._last = -math.inf
+        self.last_compute_ms = 0.0
+        self.recomputes = 0
+        game_map.tile_listeners.append(self.tiles_changed)
+
+    def close(self):
+        try:
+            self.map.tile_listeners.remove(self.tiles_changed)
+        except ValueError:
+            pass
+
+    def tiles_changed(self, xs=None, ys=None):
+        if xs is None or self.dist is None:
+            self._dirty = True
+            return
+        ox, oy = self.origin
+        h, w = self.dist.shape
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        if np.any((xs >= ox) & (xs < ox + w) & (ys >= oy) & (ys < oy + h)):
+            self._dirty = True
+
+    def _window(self):
+        ts = self.map.tile_size
+        snap = WINDOW_SNAP
+        x0 = (int(camera.x // ts) - self.margin) // snap * snap
+        y0 = (int(camera.y // ts) - self.margin) // snap * snap
+        x1 = -(-(int((camera.x + camera.width) // ts) + 1 + self.margin) // snap) * snap
+        y1 = -(-(int((camera.y + camera.height) // ts) + 1 + self.margin) // snap) * snap
+        return (max(0, x0), max(0, y0), min(self.map.width, x1), min(self.map.height, y1))
+
+    def update(self, target_x, target_y, force=False):
+        """Move the target (in pixels); recomputes when due. Returns True if the field was rebuilt."""
+        now = time.perf_counter()
+        self.target = (float(target_x), float(target_y))
+        ts = self.map.tile_size
+        key = (int(target_x // ts), int(target_y // ts), self._window())
+        if not force and self.dist is not None:
+            if (key == self._key and not self._dirty) or now - self._last < self.interval:
+                return False
+        x0, y0, x1, y1 = key[2]
+        if x1 <= x0 or y1 <= y0:
+            return False
+        start = time.perf_counter()
+        table = ~solid_table(self.map.tile_kinds, outside=True)
+        passable = table[self.map.tile_block(x0, y0, x1, y1, fill=len(table) - 1)]
+        self.dist, self.step_x, self.step_y = distance_field(passable, key[0] - x0, key[1] - y0)
+        self.origin = (x0, y0)
+        self._key = key
+        self._dirty = False
+        self._last = now
+        self.recomputes += 1
+        self.last_compute_ms = (time.perf_counter() - start) * 1000.0
+        return True
+
+    def lookup(self, px, py):
+        """(tile x, tile y, inside window, reachable) arrays for pixel positions."""
+        ts = self.map.tile_size
+        ox, oy = self.origin
+        tx = np.floor(np.asarray(px) / ts).astype(np.int64) - ox
+        ty = np.floor(np.asarray(py) / ts).astype(np.int64) - oy
+        if self.dist is None:
+            inside = np.zeros(tx.shape, bool)
+            return tx, ty, inside, inside
+        h, w = self.dist.shape
+        inside = (tx >= 0) & (tx < w) & (ty >= 0) & (ty < h)
+        cx, cy = np.where(inside, tx, 0), np.where(inside, ty, 0)
+        reachable = inside & np.isfinite(self.dist[cy, cx])
+        return cx, cy, inside, reachable
+
+    def steer(self, store, speed, rows=None):
+        """Set velocities of `store` entities (all, or `rows`) to follow the field at `speed`.
+
+        Each entity heads for the centre of the next cell downhill from the cell
+        under its centre, or straight for the target once in the target's cell.
+        Entities outside the window or cut off from the target stop. Returns the
+        number of entities that have a route.
+        """
+        if not store.count or self.dist is None or self.target is None:
+            return 0
+        sel = slice(None) if rows is None else rows
+        ts = self.map.tile_size
+        w, h = store.w[sel], store.h[sel]
+        cx = store.x[sel] + w / 2.0
+        cy = store.y[sel] + h / 2.0
+        tx, ty, _, reachable = self.lookup(cx, cy)
+        sx = self.step_x[ty, tx]
+        sy = self.step_y[ty, tx]
+        ox, oy = self.origin
+        aim_x = (tx + ox + sx + 0.5) * ts
+        aim_y = (ty + oy + sy + 0.5) * ts
+        at_goal = (sx == 0) & (sy == 0)
+        aim_x = np.where(at_goal, self.target[0], aim_x)
+        aim_y = np.where(at_goal, self.target[1], aim_y)
+        dx, dy = aim_x - cx, aim_y - cy
+        norm = np.hypot(dx, dy)
+        moving = reachable & (norm > 1.0)
+        scale = np.where(moving, float(speed) / np.maximum(norm, 1e-6), 0.0)
+        store.vx[sel] = dx * scale
+        store.vy[sel] = dy * scale
+        return int(np.count_nonzero(reachable))
+
+    def memory_items(self):
+        for arr in (self.dist, self.step_x, self.step_y):
+            if arr is not None:
+                yield 'caches', 'flow field', arr
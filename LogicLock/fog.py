@@ -0,0 +1,146 @@
+import base64
+import zlib
+import numpy as np
+import pygame
+
+# Tiles per side of one stored block of explored bits (64 rows of 8 bytes)
+EXPLORED_BLOCK = 64
+# Colour and opacity drawn over unexplored tiles
+FOG_COLOR = (0, 0, 0)
+FOG_ALPHA = 255
+
+
+class ExploredBits:
+    """Which tiles have been explored, one bit per tile.
+
+    Bits are packed 8 tiles to a byte in square blocks of EXPLORED_BLOCK tiles,
+    created on first reveal, so memory follows the explored area rather than the
+    map size (streamed worlds can be huge). Coordinates are non-negative tiles.
+
+    Usage:
+      bits = ExploredBits()
+      fresh = bits.mark(seen, x0, y0)     # newly explored tiles of `seen`
+      grid = bits.read(0, 0, 16, 16)      # bool rows
+      state = bits.to_json()              # for save files
+    """
+    def __init__(self):
+        self.blocks = {}
+        self.count = 0
+
+    def _blocks_in(self, x0, y0, x1, y1):
+        b = EXPLORED_BLOCK
+        for by in range(y0 // b, (y1 - 1) // b + 1):
+            for bx in range(x0 // b, (x1 - 1) // b + 1):
+                yield bx, by
+
+    def _unpack(self, key):
+        packed = self.blocks.get(key)
+        if packed is None:
+            return None
+        return np.unpackbits(packed, axis=1).astype(bool)
+
+    def mark(self, mask, x0, y0):
+        """Explore the tiles where `mask` (bool rows, [0, 0] at tile (x0, y0)) is True.
+
+        Returns a bool array shaped like `mask` holding the tiles that were not
+        explored before.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        h, w = mask.shape
+        fresh = np.zeros((h, w), dtype=bool)
+        if not h or not w:
+            return fresh
+        b = EXPLORED_BLOCK
+        for bx, by in self._blocks_in(x0, y0, x0 + w, y0 + h):
+            bx0, by0 = bx * b, by * b
+            sx0, sy0 = max(x0, bx0), max(y0, by0)
+            sx1, sy1 = min(x0 + w, bx0 + b), min(y0 + h, by0 + b)
+            part = mask[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0]
+            if not part.any():
+                continue
+            bits = self._unpack((bx, by))
+            if bits is None:
+                bits = np.zeros((b, b), dtype=bool)
+            cur = bits[sy0 - by0:sy1 - by0, sx0 - bx0:sx1 - bx0]
+            new = part & ~cur
+            if not new.any():
+                continue
+            cur |= new
+            self.blocks[(bx, by)] = np.packbits(bits, axis=1)
+            fresh[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = new
+            self.count += int(np.count_nonzero(new))
+        return fresh
+
+    def read(self, x0, y0, x1, y1):
+        """Explored bits of tiles [x0, x1) x [y0, y1) as bool rows."""
+        out = np.zeros((max(0, y1 - y0), max(0, x1 - x0)), dtype=bool)
+        if not out.size:
+            return out
+        b = EXPLORED_BLOCK
+        for bx, by in self._blocks_in(x0, y0, x1, y1):
+            bits = self._unpack((bx, by))
+            if bits is None:
+                continue
+            bx0, by0 = bx * b, by * b
+            sx0, sy0 = max(x0, bx0), max(y0, by0)
+            sx1, sy1 = min(x1, bx0 + b), min(y1, by0 + b)
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = bits[sy0 - by0:sy1 - by0, sx0 - bx0:sx1 - bx0]
+        return out
+
+    def clear(self):
+        self.blocks.clear()
+        self.count = 0
+
+    def to_json(self):
+        """JSON-friendly state: each block's packed bits, zlib-compressed and base64-encoded."""
+        return {
+            'block': EXPLORED_BLOCK,
+            'blocks': [[bx, by, base64.b64encode(zlib.compress(packed.tobytes())).decode('ascii')]
+                       for (bx, by), packed in sorted(self.blocks.items())],
+        }
+
+    def load_json(self, state):
+        """Replace the bits with a to_json() state (None or an empty state clears them)."""
+        self.clear()
+        if not state:
+            return
+        b = int(state.get('block', EXPLORED_BLOCK))
+        for bx, by, data in state.get('blocks', ()):
+            packed = np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=np.uint8)
+            bits = np.unpackbits(packed.reshape(b, -1), axis=1)[:, :b].astype(bool)
+            self.mark(bits, int(bx) * b, int(by) * b)
+
+    def memory_items(self):
+        for packed in list(self.blocks.values()):
+            yield 'tiles', 'explored bits', packed
+
+
+def fog_surface(explored, tile_size, inside=None):
+    """Fog for one chunk from `explored`: its (n + 2) x (n + 2) bits including a one-tile ring of neighbours.
+
+    Unexplored tiles get FOG_ALPHA, explored ones are clear, and the boundary
+    fades across a tile (the tiny per-tile alpha image is smoothscaled, and the
+    ring makes the fade continue across chunk borders). `inside` is the (w, h)
+    of the chunk's tiles that lie on the map; the rest stays transparent.
+    Returns None when nothing in or around the chunk is fogged.
+    """
+    explored = np.asarray(explored, dtype=bool)
+    if explored.all():
+        return None
+    rows, cols = explored.shape
+    small = pygame.Surface((cols, rows), pygame.SRCALPHA)
+    small.fill(FOG_COLOR + (0,))
+    alpha = pygame.surfarray.pixels_alpha(small)
+    alpha[...] = np.where(explored, 0, FOG_ALPHA).T
+    del alpha
+    ts = tile_size
+    big = pygame.transform.smoothscale(small, (cols * ts, rows * ts))
+    w, h = (cols - 2) * ts, (rows - 2) * ts
+    surf = big.subsurface((ts, ts, w, h)).copy()
+    if inside is not None:
+        iw, ih = inside[0] * ts, inside[1] * ts
+        if iw < w:
+            surf.fill((0, 0, 0, 0), (iw, 0, w - iw, h))
+        if ih < h:
+            surf.fill((0, 0, 0, 0), (0, ih, w, h - ih))
+    return surf
@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+import time
+
+
+class FileWatcher:
+    """Poll a set of files for mtime changes on a background thread.
+
+    The thread only detects changes; changed paths are queued and handed to the
+    main thread through poll(), so reloads never touch pygame state concurrently
+    with rendering.
+
+    Usage:
+      watcher = FileWatcher([path_a, path_b])
+      watcher.start()
+      for path in watcher.poll():  # once per frame
+          ...
+    """
+    def __init__(self, paths=(), interval=1.0):
+        self.interval = float(interval)
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self._changes = queue.Queue()
+        self._thread = None
+        for p in paths:
+            self.add(p)
+
+    def _mtime(self, path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def add(self, path):
+        if not path:
+            return
+        path = os.path.normpath(os.path.abspath(path))
+        with self._lock:
+            if path not in self._mtimes:
+                self._mtimes[path] = self._mtime(path)
+
+    def paths(self):
+        with self._lock:
+            return list(self._mtimes)
+
+    def check(self):
+        """Compare mtimes once and queue every path that changed."""
+        for path in self.paths():
+            mtime = self._mtime(path)
+            with self._lock:
+                old = self._mtimes.get(path)
+                self._mtimes[path] = mtime
+            if mtime is not None and old is not None and mtime != old:
+                print(f"[hotreload] detected change in {path}")
+                self._changes.put(path)
+            elif mtime is not None and old is None:
+                self._changes.put(path)
+
+    def start(self):
+        if self._thread is not None:
+            return self._thread
+
+        def _watch():
+            while True:
+                try:
+                    self.check()
+                except Exception as e:
+                    print(f"[hotreload] watch error: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=_watch, daemon=True)
+        self._thread.start()
+        print(f"[hotreload] asset watcher started for {len(self._mtimes)} file(s)")
+        return self._thread
+
+    def poll(self):
+        """Return the changed paths queued since the last call (deduplicated, in order)."""
+        changed = []
+        while True:
+            try:
+                path = self._changes.get_nowait()
+            except queue.Empty:
+                break
+            if path not in changed:
+                changed.append(path)
+        return changed
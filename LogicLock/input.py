@@ -1,17 +1,210 @@
+import json
+import time
+from collections import deque
 import pygame
 
 # Keeps track of what key is down (event-driven fallback)
 keys_down = set()
 
+# Game actions, in bit order: bit i of a snapshot mask is ACTIONS[i]
+ACTIONS = (
+    'move_up', 'move_down', 'move_left', 'move_right',
+    'pause', 'confirm', 'save', 'load', 'save_config',
+    'hud', 'debug', 'chunk_formats', 'reload', 'autotune', 'memory_dump', 'input_history',
+    'tree_scale_down', 'tree_scale_up', 'tree_density_down', 'tree_density_up',
+)
+ACTION_BITS = {name: 1 << i for i, name in enumerate(ACTIONS)}
+
+# Default bindings: action -> key names (as understood by pygame.key.key_code)
+DEFAULT_BINDINGS = {
+    'move_up': ['w', 'up'],
+    'move_down': ['s', 'down'],
+    'move_left': ['a', 'left'],
+    'move_right': ['d', 'right'],
+    'pause': ['escape'],
+    'confirm': ['return', 'enter'],
+    'save': ['f9'],
+    'load': ['f10'],
+    'save_config': ['f5'],
+    'hud': ['f2'],
+    'debug': ['f3'],
+    'chunk_formats': ['f4'],
+    'reload': ['f6'],
+    'autotune': ['f7'],
+    'memory_dump': ['f8'],
+    'input_history': ['f11'],
+    'tree_scale_down': ['['],
+    'tree_scale_up': [']'],
+    'tree_density_down': [','],
+    'tree_density_up': ['.'],
+}
+
+# Raw input events kept for replay and diagnostics
+EVENT_HISTORY = 2048
+_RECORDED_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.ACTIVEEVENT)
+
+
 def is_key_pressed(key):
     """Return True if the key is currently pressed.
 
     Prefer to use the real-time keyboard state (pygame.key.get_pressed()) so
     missed KEYUP events or focus loss do not leave keys logically stuck.
     Fall back to the event-driven `keys_down` set for compatibility.
+    Game code should read `input_state.current` instead (one poll per frame).
     """
     try:
         pressed = pygame.key.get_pressed()
         return bool(pressed[key]) or (key in keys_down)
     except Exception:
         return key in keys_down
+
+
+def key_code(name):
+    """pygame key constant for a key name ('w', 'up', 'f9', ...), or None if unknown."""
+    try:
+        return pygame.key.key_code(name)
+    except (ValueError, pygame.error):
+        print(f"[input] unknown key name in bindings: {name!r}")
+        return None
+
+
+class InputSnapshot:
+    """Input for one frame: action bitmasks resolved from a single keyboard poll.
+
+    held: actions whose keys are down; pressed/released: actions whose keys went
+    down/up during the frame (from events, so quick taps are not missed).
+    """
+    __slots__ = ('frame', 'time', 'held_mask', 'pressed_mask', 'released_mask')
+
+    def __init__(self, frame=0, time=0.0, held_mask=0, pressed_mask=0, released_mask=0):
+        self.frame = frame
+        self.time = time
+        self.held_mask = held_mask
+        self.pressed_mask = pressed_mask
+        self.released_mask = released_mask
+
+    def held(self, action):
+        return bool(self.held_mask & ACTION_BITS[action])
+
+    def pressed(self, action):
+        return bool(self.pressed_mask & ACTION_BITS[action])
+
+    def released(self, action):
+        return bool(self.released_mask & ACTION_BITS[action])
+
+    def axis(self):
+        """(dx, dy) in {-1, 0, 1} from the held move_* actions."""
+        return (self.held('move_right') - self.held('move_left'),
+                self.held('move_down') - self.held('move_up'))
+
+
+class InputState:
+    """Per-frame keyboard snapshot, action bindings and a ring buffer of raw events.
+
+    Call begin_frame() once per frame with that frame's events; consumers then read
+    `current` rather than polling SDL. Bindings map action names to key names and
+    can be overridden from config (`key_bindings`).
+
+    Usage:
+      snap = input_state.begin_frame(pygame.event.get())
+      if snap.pressed('save'): ...
+      dx, dy = snap.axis()
+    """
+    def __init__(self, bindings=None):
+        self.history = deque(maxlen=EVENT_HISTORY)
+        self.frame = 0
+        self.current = InputSnapshot()
+        self.set_bindings(bindings)
+
+    def set_bindings(self, overrides=None):
+        """Use DEFAULT_BINDINGS with `overrides` ({action: [key names]}) applied."""
+        bindings = {action: list(keys) for action, keys in DEFAULT_BINDINGS.items()}
+        for action, keys in (overrides or {}).items():
+            if action not in ACTION_BITS:
+                print(f"[input] unknown action in bindings: {action!r}")
+                continue
+            bindings[action] = [keys] if isinstance(keys, str) else list(keys)
+        self.bindings = bindings
+        # resolved on first use: key names need pygame initialized
+        self._key_masks = None
+
+    def _masks(self):
+        """key code -> mask of the actions it triggers."""
+        if self._key_masks is None:
+            masks = {}
+            for action, names in self.bindings.items():
+                for name in names:
+                    code = key_code(name)
+                    if code is not None:
+                        masks[code] = masks.get(code, 0) | ACTION_BITS[action]
+            self._key_masks = masks
+        return self._key_masks
+
+    def key_mask(self, key):
+        """Bitmask of the actions bound to `key`."""
+        return self._masks().get(key, 0)
+
+    def is_bound(self, key, action):
+        return bool(self.key_mask(key) & ACTION_BITS[action])
+
+    def begin_frame(self, events):
+        """Record `events`, update keys_down and resolve this frame's snapshot."""
+        now = time.perf_counter()
+        self.frame += 1
+        pressed = released = 0
+        for event in events:
+            if event.type not in _RECORDED_EVENTS:
+                continue
+            key = getattr(event, 'key', None)
+            self.history.append((now, self.frame, event.type, key, getattr(event, 'mod', 0), getattr(event, 'gain', None)))
+            if event.type == pygame.KEYDOWN:
+                keys_down.add(key)
+                pressed |= self.key_mask(key)
+            elif event.type == pygame.KEYUP:
+                keys_down.discard(key)
+                released |= self.key_mask(key)
+            elif getattr(event, 'gain', 1) == 0:
+                keys_down.clear()
+
+        held = 0
+        try:
+            state = pygame.key.get_pressed()
+        except Exception:
+            state = None
+        for key, mask in self._masks().items():
+            if key in keys_down:
+                held |= mask
+            elif state is not None:
+                try:
+                    if state[key]:
+                        held |= mask
+                except IndexError:
+                    pass
+        self.current = InputSnapshot(self.frame, now, held, pressed, released)
+        return self.current
+
+    def reset(self):
+        """Forget held keys, e.g. after a modal loop consumed the KEYUP events."""
+        keys_down.clear()
+        self.current = InputSnapshot(self.frame, time.perf_counter())
+
+    def dump_history(self, path):
+        """Write the recorded events as JSON lines (time, frame, type, key, mod, gain)."""
+        with open(path, 'w', encoding='utf-8') as fh:
+            for record in self.history:
+                fh.write(json.dumps(record) + '\n')
+        return len(self.history)
+
+    @staticmethod
+    def load_history(path):
+        """Recorded events from dump_history() as {frame: [pygame.event.Event, ...]}, for replay via begin_frame()."""
+        frames = {}
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                _, frame, etype, key, mod, gain = json.loads(line)
+                attrs = {'key': key, 'mod': mod} if etype in (pygame.KEYDOWN, pygame.KEYUP) else {'gain': gain, 'state': 0}
+                frames.setdefault(frame, []).append(pygame.event.Event(etype, attrs))
+        return frames
+
+
+input_state = InputState()
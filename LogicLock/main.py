@@ -12,13 +12,15 @@ def asset_path(rel_path):
 # Prefer package-relative imports, but fall back to absolute imports when the module is run as a script
 try:
     from .sprite import sprites, Sprite
+    from .assets import assets
     
     class StaticSprites:
         """Batched rendering for static sprites using single surface"""
         
         def __init__(self, image_path, positions, tile_size):
-            self.image = pygame.image.load(image_path).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (tile_size, tile_size))
+            self.image_path = image_path
+            self.tile_size = tile_size
+            self.image = assets.acquire(image_path, scale=(tile_size, tile_size))
             
             min_x = min(x for x, y in positions)
             max_x = max(x for x, y in positions)
@@ -43,25 +45,41 @@ try:
                 screen.blit(self.surface, 
                            (self.rect.x - camera.x, self.rect.y - camera.y))
 
+        def release(self):
+            assets.release(self.image_path, scale=(self.tile_size, self.tile_size))
+
+        def memory_items(self):
+            yield 'surfaces', 'static sprites', self.surface
+
     from .player import Player
-    from .input import keys_down
-    from .map import Map, TileKind
-    from .map_io import scale_tree_images, sparsify_trees
+    from .input import input_state
+    from .entities import EntityStore, HIT_BOUNCE
+    from .navigation import Navigator, PathFollower
+    from .flowfield import FlowField
+    from .visibility import Visibility
+    from .map import Map
+    from .tilekind import default_tile_kinds
     from . import map_render
     from .camera import create_screen, camera
+    from .hotreload import FileWatcher
+    from .worldgen import WorldGenerator
+    from .autotune import tune_chunk_size
+    from .memory import memory
 except Exception:
     import sys
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     if repo_root not in sys.path:
         sys.path.insert(0, repo_root)
     from LogicLock.sprite import sprites, Sprite
+    from LogicLock.assets import assets
     
     class StaticSprites:
         """Batched rendering for static sprites using single surface"""
         
         def __init__(self, image_path, positions, tile_size):
-            self.image = pygame.image.load(image_path).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (tile_size, tile_size))
+            self.image_path = image_path
+            self.tile_size = tile_size
+            self.image = assets.acquire(image_path, scale=(tile_size, tile_size))
             
             min_x = min(x for x, y in positions)
             max_x = max(x for x, y in positions)
@@ -86,12 +104,26 @@ except Exception:
                 screen.blit(self.surface, 
                            (self.rect.x - camera.x, self.rect.y - camera.y))
 
+        def release(self):
+            assets.release(self.image_path, scale=(self.tile_size, self.tile_size))
+
+        def memory_items(self):
+            yield 'surfaces', 'static sprites', self.surface
+
     from LogicLock.player import Player
-    from LogicLock.input import keys_down
-    from LogicLock.map import Map, TileKind
-    from LogicLock.map_io import scale_tree_images, sparsify_trees
+    from LogicLock.input import input_state
+    from LogicLock.entities import EntityStore, HIT_BOUNCE
+    from LogicLock.navigation import Navigator, PathFollower
+    from LogicLock.flowfield import FlowField
+    from LogicLock.visibility import Visibility
+    from LogicLock.map import Map
+    from LogicLock.tilekind import default_tile_kinds
     import LogicLock.map_render as map_render
     from LogicLock.camera import create_screen, camera
+    from LogicLock.hotreload import FileWatcher
+    from LogicLock.worldgen import WorldGenerator
+    from LogicLock.autotune import tune_chunk_size
+    from LogicLock.memory import memory
     # Hot-reloadable modules (remote server removed)
     import importlib, threading, time as _time, os as _os
     try:
@@ -158,8 +190,32 @@ _default_config = {
     'tree_scale': 4.0,
     'tree_density': 0.04,
     'clustered_trees': True,
+    'tree_seed': 0,
     'chunk_size': 8,
     'max_tiles': 120,
+    'map_downsample': 'majority',
+    'map_file': 'images/spam.png',
+    'map_stream': False,
+    'region_size': 64,
+    'max_regions': 64,
+    'world_gen': False,
+    'world_seed': 0,
+    'bake_workers': 0,
+    'optimize_chunk_formats': True,
+    'chunk_autotune': False,
+    'chunk_autotune_persist': True,
+    'tuned_chunk_sizes': {},
+    'memory_tracemalloc': False,
+    'key_bindings': {},
+    'npc_count': 0,
+    'npc_speed': 60.0,
+    'npc_pathing': False,
+    'npc_goal_radius': 12,
+    'npc_chase': False,
+    'npc_sight': 0,
+    'fog_of_war': False,
+    'fog_radius': 10,
+    'animated_tiles': True,
     'clear_color': [30, 150, 50]
 }
 
@@ -184,6 +240,8 @@ def load_config():
 CONFIG = load_config()
 
 def main():
+    # Bindings first: the main menu navigates with them too
+    input_state.set_bindings(CONFIG.get('key_bindings'))
     # Display the main menu (use hot-reloadable module)
     menu_action = HOT_MODULES['menu'].main_menu()
 
@@ -192,6 +250,8 @@ def main():
         do_load = (menu_action == "load_game")
         # Proceed to the game loop
         pygame.init()
+        if CONFIG.get('memory_tracemalloc', _default_config['memory_tracemalloc']):
+            memory.start_tracing()
         # create the screen via create_screen so camera.width/height are set
         screen = create_screen(800, 600, "Game")
 
@@ -207,13 +267,7 @@ def main():
         running = True
 
         TILE_SIZE = int(CONFIG.get('tile_size', _default_config['tile_size']))
-        tile_kinds = [
-            TileKind("dirt", asset_path("images/dirt.png"), False),
-            TileKind("grass", asset_path("images/grass.png"), False),
-            TileKind("water", asset_path("images/water.png"), False),
-            TileKind("tree", asset_path("images/tree.png"), True),
-            TileKind("wood", asset_path("images/wood.png"), False)
-        ]
+        tile_kinds = default_tile_kinds(animated=bool(CONFIG.get('animated_tiles', _default_config['animated_tiles'])))
 
         # Initialize the player
         player = Player(asset_path("images/player.jpg"), TILE_SIZE * 11, TILE_SIZE * 7,
@@ -225,16 +279,63 @@ def main():
 
         # debug logging removed
 
-        map = Map(
-            asset_path("images/spam.png"),
-            tile_kinds,
-            TILE_SIZE,
-            tree_density=float(CONFIG.get('tree_density', _default_config['tree_density'])),
-            clustered=bool(CONFIG.get('clustered_trees', _default_config['clustered_trees'])),
-            tree_scale=float(CONFIG.get('tree_scale', _default_config['tree_scale'])),
-            chunk_size=int(CONFIG.get('chunk_size', _default_config['chunk_size'])),
-            max_tiles=int(CONFIG.get('max_tiles', _default_config['max_tiles']))
-        )
+        # chunk_size tuned earlier for this map (see chunk_autotune) wins over the configured one
+        if CONFIG.get('world_gen', _default_config['world_gen']):
+            map_key = f"worldgen:{int(CONFIG.get('world_seed', _default_config['world_seed']))}"
+        else:
+            map_key = str(CONFIG.get('map_file', _default_config['map_file']))
+        tuned_sizes = CONFIG.get('tuned_chunk_sizes') or {}
+        chunk_size = int(tuned_sizes.get(map_key, CONFIG.get('chunk_size', _default_config['chunk_size'])))
+
+        if CONFIG.get('world_gen', _default_config['world_gen']):
+            # procedural world: regions are generated as the camera approaches them
+            generator = WorldGenerator(tile_kinds, seed=int(CONFIG.get('world_seed', _default_config['world_seed'])))
+            map = Map.from_source(
+                generator, generator.size, generator.size,
+                tile_kinds,
+                TILE_SIZE,
+                tree_density=float(CONFIG.get('tree_density', _default_config['tree_density'])),
+                clustered=bool(CONFIG.get('clustered_trees', _default_config['clustered_trees'])),
+                tree_seed=int(CONFIG.get('tree_seed', _default_config['tree_seed'])),
+                tree_scale=float(CONFIG.get('tree_scale', _default_config['tree_scale'])),
+                chunk_size=chunk_size,
+                region_size=int(CONFIG.get('region_size', _default_config['region_size'])),
+                max_regions=int(CONFIG.get('max_regions', _default_config['max_regions'])),
+                bake_workers=int(CONFIG.get('bake_workers', _default_config['bake_workers']))
+            )
+            # spawn near the middle of the world on dry, open ground
+            spawn_x, spawn_y = generator.find_spawn(generator.size // 2, generator.size // 2, tile_kinds)
+            player.x = spawn_x * TILE_SIZE
+            player.y = spawn_y * TILE_SIZE
+            camera._x = player.x + player.image.get_width() / 2 - camera.width / 2
+            camera._y = player.y + player.image.get_height() / 2 - camera.height / 2
+        else:
+            map = Map(
+                asset_path(str(CONFIG.get('map_file', _default_config['map_file']))),
+                tile_kinds,
+                TILE_SIZE,
+                tree_density=float(CONFIG.get('tree_density', _default_config['tree_density'])),
+                clustered=bool(CONFIG.get('clustered_trees', _default_config['clustered_trees'])),
+                tree_seed=int(CONFIG.get('tree_seed', _default_config['tree_seed'])),
+                tree_scale=float(CONFIG.get('tree_scale', _default_config['tree_scale'])),
+                chunk_size=chunk_size,
+                max_tiles=int(CONFIG.get('max_tiles', _default_config['max_tiles'])),
+                downsample=str(CONFIG.get('map_downsample', _default_config['map_downsample'])),
+                stream=bool(CONFIG.get('map_stream', _default_config['map_stream'])),
+                region_size=int(CONFIG.get('region_size', _default_config['region_size'])),
+                max_regions=int(CONFIG.get('max_regions', _default_config['max_regions'])),
+                bake_workers=int(CONFIG.get('bake_workers', _default_config['bake_workers']))
+            )
+
+        map.optimize_formats = bool(CONFIG.get('optimize_chunk_formats', _default_config['optimize_chunk_formats']))
+        memory.track(map)
+
+        # Watch tile images and the palette so art edits apply live (only affected chunks rebake)
+        asset_watcher = FileWatcher(map.watch_paths())
+        try:
+            asset_watcher.start()
+        except Exception as e:
+            print(f"[hotreload] asset watcher failed to start: {e}")
 
         box_positions = [
             (0, 0), (7, 2), (1, 10),
@@ -244,7 +345,43 @@ def main():
             (1, 15)
         ]
         pixel_positions = [(x*TILE_SIZE, y*TILE_SIZE) for x, y in box_positions]
-        box_sprites = StaticSprites(asset_path("images/box.png"), pixel_positions, TILE_SIZE)
+        box_sprites = memory.track(StaticSprites(asset_path("images/box.png"), pixel_positions, TILE_SIZE))
+
+        def quit_game():
+            # Hand the box sprite back to the asset cache before shutting down
+            box_sprites.release()
+            memory.untrack(box_sprites)
+            # Remove region scratch files and stop bake workers
+            map.close()
+            pygame.quit()
+            sys.exit()
+
+        # Wandering NPCs live in one entity store (NumPy columns), updated and drawn in bulk
+        npcs = memory.track(EntityStore())
+        npc_speed = float(CONFIG.get('npc_speed', _default_config['npc_speed']))
+        npc_count = int(CONFIG.get('npc_count', _default_config['npc_count']))
+        if npc_count > 0:
+            npc_sprite = npcs.add_sprite(asset_path("images/player.jpg"), (TILE_SIZE * 3 // 4, TILE_SIZE * 3 // 4))
+            ptx, pty = int(player.x // TILE_SIZE), int(player.y // TILE_SIZE)
+            npcs.scatter(map, npc_count, npc_sprite, ptx - 40, pty - 40, ptx + 40, pty + 40,
+                         speed=npc_speed, on_hit=HIT_BOUNCE, seed=int(CONFIG.get('tree_seed', _default_config['tree_seed'])))
+
+        # Optional: NPCs walk HPA* paths to random nearby goals instead of wandering
+        nav = follower = None
+        if CONFIG.get('npc_pathing', _default_config['npc_pathing']):
+            nav = memory.track(Navigator(map))
+            follower = PathFollower(npcs, nav)
+        goal_radius = int(CONFIG.get('npc_goal_radius', _default_config['npc_goal_radius']))
+        # NPCs chasing the player share one flow field instead of pathing individually
+        flow = memory.track(FlowField(map)) if CONFIG.get('npc_chase', _default_config['npc_chase']) else None
+        # with a sight range, only NPCs with a clear line to the player (through no trees) chase
+        npc_sight = float(CONFIG.get('npc_sight', _default_config['npc_sight'])) * TILE_SIZE
+        # fog of war: tiles in the player's field of view become explored
+        map.fog_enabled = bool(CONFIG.get('fog_of_war', _default_config['fog_of_war']))
+        fog_radius = int(CONFIG.get('fog_radius', _default_config['fog_radius']))
+        vis = None
+        if (flow is not None and npc_sight > 0) or map.fog_enabled:
+            vis = memory.track(Visibility(map))
 
         font = pygame.font.Font(None, 20)
         _overlay_msgs = []
@@ -277,17 +414,28 @@ def main():
             repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
             save_path = path or os.path.join(repo_root, 'savegame.json')
             try:
+                map_state = {}
+                if map.store is not None:
+                    # streamed maps save only edited regions, next to the save file
+                    regions_dir = os.path.splitext(save_path)[0] + '.regions'
+                    map.save_regions(regions_dir)
+                    map_state['regions'] = os.path.basename(regions_dir)
+                    map_state['map_file'] = map.map_file
+                else:
+                    map_state['tiles'] = map.tiles.tolist()
+                map_state['explored'] = map.explored_state()
                 state = {
                     'version': 1,
                     'config': CONFIG,
                     'player': {'x': player.x, 'y': player.y, 'speed': player.speed},
                     'camera': {'_x': camera._x, '_y': camera._y},
                     'map': {
-                        'tiles': map.tiles,
+                        **map_state,
                         'tile_size': map.tile_size,
                         'tile_kinds': [tk.name for tk in map.tile_kinds],
                         'tree_density': map.tree_density,
                         'clustered': map.clustered,
+                        'tree_seed': map.tree_seed,
                         'tree_scale': map.tree_scale,
                         'chunk_size': map.chunk_size,
                         'max_tiles': map.max_tiles
@@ -336,7 +484,9 @@ def main():
                 saved_tiles = m.get('tiles')
                 saved_tile_names = m.get('tile_kinds') or []
 
-                if saved_tiles is not None:
+                if m.get('regions') and map.store is not None:
+                    map.load_regions(os.path.join(os.path.dirname(load_path), m['regions']))
+                elif saved_tiles is not None:
                     # Remap saved tile indices to current tile_kinds order by name
                     name_to_index = {tk.name: idx for idx, tk in enumerate(tile_kinds)}
                     remap = {}
@@ -354,6 +504,7 @@ def main():
                         int(m.get('tile_size', TILE_SIZE)),
                         tree_density=m.get('tree_density'),
                         clustered=bool(m.get('clustered')),
+                        tree_seed=int(m.get('tree_seed', map.tree_seed)),
                         max_tiles=int(m.get('max_tiles', map.max_tiles or _default_config['max_tiles'])),
                         tree_scale=m.get('tree_scale'),
                         chunk_size=int(m.get('chunk_size', map.chunk_size or _default_config['chunk_size']))
@@ -365,107 +516,194 @@ def main():
                     try:
                         # Swap attributes on existing map object to preserve references
                         map.tiles = new_map.tiles
+                        if map.store is not None:
+                            map.store.close()
+                        map.store = None
                         map.tile_kinds = new_map.tile_kinds
                         map.tile_size = new_map.tile_size
                         map.tree_density = new_map.tree_density
                         map.clustered = new_map.clustered
+                        map.tree_seed = new_map.tree_seed
                         map.max_tiles = new_map.max_tiles
                         map.tree_scale = new_map.tree_scale
                         map.chunk_size = new_map.chunk_size
-                        map._chunks = None
+                        map._reset_chunks()
+                        map.notify_tiles_changed()
                         map._images_converted = False
                     except Exception:
                         add_msg("Loaded map but failed to apply to current instance")
+                map.load_explored(m.get('explored'))
 
                 add_msg(f"Game loaded from {os.path.basename(load_path)}")
             except Exception as e:
                 add_msg(f"Failed to load game: {e}")
 
         def pause_menu():
-            """Simple in-game pause menu. Navigable with arrows/W,S and Enter. ESC to resume."""
+            """Simple in-game pause menu. Navigable with arrows/W,S and Enter. ESC to resume.
+
+            The world is frozen while paused, so the last presented game frame is captured
+            once with the dimming overlay and title composited onto it; afterwards only the
+            option list is redrawn, and only when the selection changes.
+            """
             menu_font = pygame.font.Font(None, 32)
             small_font = pygame.font.Font(None, 20)
             options = ["Resume", "Save", "Load", "Quit"]
             selected = 0
-            # translucent overlay used on top of the live game render
+
+            # Freeze the last game frame and pre-composite the translucent overlay and title
+            frozen = screen.copy()
             overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
             overlay.fill((0, 0, 0, 160))
+            frozen.blit(overlay, (0, 0))
+            title_surf = menu_font.render("PAUSED", True, (255, 255, 255))
+            tx = (screen.get_width() - title_surf.get_width()) // 2
+            ty = screen.get_height() // 4
+            frozen.blit(title_surf, (tx, ty))
+            frozen = frozen.convert()
+            oy = ty + 48
+
+            # Pre-render each option in both states so redraws are plain blits
+            option_surfs = [
+                (small_font.render(opt, True, (220, 220, 220)), small_font.render(opt, True, (255, 220, 100)))
+                for opt in options
+            ]
+            dirty = True
 
-            while True:
-                for ev in pygame.event.get():
-                    if ev.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                    if ev.type == pygame.KEYDOWN:
-                        if ev.key == pygame.K_ESCAPE:
-                            return
-                        if ev.key in (pygame.K_UP, pygame.K_w):
-                            selected = (selected - 1) % len(options)
-                        elif ev.key in (pygame.K_DOWN, pygame.K_s):
-                            selected = (selected + 1) % len(options)
-                        elif ev.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
-                            choice = options[selected]
-                            if choice == "Resume":
-                                return
-                            elif choice == "Save":
-                                save_game()
-                            elif choice == "Load":
-                                load_game()
+            try:
+                while True:
+                    for ev in [pygame.event.wait(500)] + pygame.event.get():
+                        if ev.type == pygame.QUIT:
+                            quit_game()
+                        if ev.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                            dirty = True
+                        if ev.type == pygame.KEYDOWN:
+                            if input_state.is_bound(ev.key, 'pause'):
                                 return
-                            elif choice == "Quit":
-                                pygame.quit()
-                                sys.exit()
-
-                # Render the last visible game frame so the world remains visible while paused
-                try:
-                    # draw map and sprites without updating game state
-                    map.draw(screen)
-                    for s in sprites:
-                        s.draw(screen)
-                    box_sprites.draw(screen)
+                            if input_state.is_bound(ev.key, 'move_up'):
+                                selected = (selected - 1) % len(options)
+                                dirty = True
+                            elif input_state.is_bound(ev.key, 'move_down'):
+                                selected = (selected + 1) % len(options)
+                                dirty = True
+                            elif input_state.is_bound(ev.key, 'confirm'):
+                                choice = options[selected]
+                                if choice == "Resume":
+                                    return
+                                elif choice == "Save":
+                                    save_game()
+                                    dirty = True
+                                elif choice == "Load":
+                                    load_game()
+                                    return
+                                elif choice == "Quit":
+                                    quit_game()
+
+                    if not dirty:
+                        continue
+
+                    screen.blit(frozen, (0, 0))
+                    screen.blits([
+                        (surfs[i == selected], ((screen.get_width() - surfs[0].get_width()) // 2, oy + i * 28))
+                        for i, surfs in enumerate(option_surfs)
+                    ], False)
                     draw_overlay(screen)
-                    if SHOW_PERF:
-                        draw_perf_hud(screen)
-                except Exception:
-                    # Fallback: clear screen if drawing fails
-                    screen.fill((0, 0, 0))
-
-                # Draw translucent overlay and menu UI on top
-                screen.blit(overlay, (0, 0))
-                title_surf = menu_font.render("PAUSED", True, (255, 255, 255))
-                tx = (screen.get_width() - title_surf.get_width()) // 2
-                ty = screen.get_height() // 4
-                screen.blit(title_surf, (tx, ty))
-
-                # Draw options
-                oy = ty + 48
-                for i, opt in enumerate(options):
-                    color = (255, 220, 100) if i == selected else (220, 220, 220)
-                    surf = small_font.render(opt, True, color)
-                    sx = (screen.get_width() - surf.get_width()) // 2
-                    screen.blit(surf, (sx, oy + i * 28))
-
-                pygame.display.flip()
-                clock.tick(60)
+                    pygame.display.flip()
+                    dirty = False
+                    # keep input latency low without spinning
+                    clock.tick(60)
+            finally:
+                # reset the frame timer so the first dt after resuming does not include the pause
+                clock.tick()
+                # key releases seen by the menu never reached the input snapshot
+                input_state.reset()
 
         def apply_tree_settings():
-            scale_tree_images(map.tile_kinds, map.tile_size, float(CONFIG.get('tree_scale')))
-            map._images_converted = False
-            map._chunks = None
-            add_msg(f"Applied tree_scale={CONFIG.get('tree_scale')}")
+            queued = map.set_tree_scale(float(CONFIG.get('tree_scale')))
+            add_msg(f"Applied tree_scale={CONFIG.get('tree_scale')} ({queued} chunks)")
+
+        autotune_results = []
+
+        def run_autotune():
+            # A failed benchmark must not stop the game: keep the chunk size we started with
+            original = map.chunk_size
+            try:
+                best, results = tune_chunk_size(map, screen)
+            except Exception as e:
+                map.set_chunk_size(original)
+                add_msg(f"Autotune failed: {e}")
+                print(f"AUTOTUNE ERROR: {e}")
+                return
+            autotune_results[:] = results
+            add_msg(f"Autotuned chunk_size={best}")
+            if CONFIG.get('chunk_autotune_persist', _default_config['chunk_autotune_persist']):
+                try:
+                    tuned = dict(CONFIG.get('tuned_chunk_sizes') or {})
+                    tuned[map_key] = best
+                    CONFIG['tuned_chunk_sizes'] = tuned
+                    save_config()
+                except Exception as e:
+                    add_msg(f"Failed to save tuned chunk size: {e}")
+                    print(f"AUTOTUNE ERROR: {e}")
 
 
         
-        SHOW_PERF = False
+        # F2 cycles the HUD through these pages and off
+        HUD_PAGES = ('perf', 'memory')
+        HUD_PAGE = None
+        MEMORY_REPORT = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'memory_report.txt')
+        INPUT_HISTORY = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'input_history.jsonl')
+
+        def memory_hud_lines():
+            rep = memory.report()
+            lines = []
+            for category, labels in rep['categories'].items():
+                lines.append(f"{category}: {rep['totals'][category] / 1048576:.2f} MB")
+                for label, nbytes in sorted(labels.items(), key=lambda kv: -kv[1])[:4]:
+                    lines.append(f"  {label}: {nbytes / 1048576:.2f} MB")
+            if rep['python']['tracing']:
+                lines.append(f"python heap: {rep['python']['current'] / 1048576:.2f} MB (peak {rep['python']['peak'] / 1048576:.2f} MB)")
+            lines.append("F8: dump breakdown to memory_report.txt")
+            return lines
+
+        def perf_hud_lines(stats):
+            lines = [
+                f"FPS: {clock.get_fps():.1f}",
+                f"Map draw: {stats.get('draw_ms', 0.0):.2f} ms",
+                f"Chunk blits: {stats.get('chunk_blits', 0)}",
+                f"Depth-sorted blits: {stats.get('sorted_blits', 0)}",
+                f"Animated tile blits: {stats.get('animated_blits', 0)}",
+                f"Entities: {len(npcs)} (update {npcs.last_update_ms:.2f} ms)",
+            ]
+            if nav is not None:
+                info = nav.cache_info()
+                lines.append(f"Paths: {nav.stats['queries']} queries, {nav.pending_requests()} queued, "
+                             f"cache {info['paths']} ({info['hit_rate'] * 100:.0f}% hits), {info['clusters']} clusters")
+            if flow is not None and flow.dist is not None:
+                lines.append(f"Flow field: {flow.dist.shape[1]}x{flow.dist.shape[0]} tiles, "
+                             f"{flow.last_compute_ms:.2f} ms, {flow.recomputes} recomputes")
+            if map.fog_enabled:
+                lines.append(f"Fog: {map.explored.count} tiles explored, {map.fog_rebuilds} chunk rebuilds")
+            if vis is not None and npc_sight > 0:
+                lines.append(f"Sight rays: {vis.stats['last_batch']} in {vis.stats['last_batch_ms']:.2f} ms")
+            lines += [
+                "Blit formats: " + ', '.join(f"{fmt} {n}" for fmt, n in sorted(stats.get('blit_formats', {}).items())),
+                "Baked formats: " + ', '.join(f"{fmt} {n}" for fmt, n in map.format_counts().items()),
+                f"Format optimizer (F4): {'ON' if map.optimize_formats else 'OFF'}",
+                f"Chunk size: {map.chunk_size} (F7: autotune)"
+            ]
+            for r in autotune_results:
+                mark = '*' if r['chunk_size'] == map.chunk_size else ' '
+                lines.append(f"{mark}cs {r['chunk_size']}: draw {r['draw_ms']:.2f} ms, {r['blits']} blits, "
+                             f"overdraw {r['overdraw']:.2f}x, bake {r['bake_ms']:.0f} ms, {r['bytes'] / 1048576:.1f} MB")
+            return lines
 
         def draw_perf_hud(screen):
             try:
                 stats = map_render.last_draw_stats or {}
-                lines = [
-                    f"FPS: {clock.get_fps():.1f}",
-                    f"Map draw: {stats.get('draw_ms', 0.0):.2f} ms",
-                    f"Chunk blits: {stats.get('chunk_blits', 0)}"
-                ]
+                if HUD_PAGE == 'memory':
+                    lines = memory_hud_lines()
+                else:
+                    lines = perf_hud_lines(stats)
                 
                 rendered = [font.render(ln, True, (255, 255, 255)) for ln in lines]
                 w = max(s.get_width() for s in rendered)
@@ -497,60 +735,115 @@ def main():
             # do_load only exists when menu_action was start/load; ignore otherwise
             pass
 
+        if CONFIG.get('chunk_autotune', _default_config['chunk_autotune']):
+            run_autotune()
+
         # Game Loop
         while running:
             frame_start = time.perf_counter()
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.KEYDOWN:
-                    keys_down.add(event.key)
-                    if event.key == pygame.K_F3:
-                        map.toggle_debug()
-                    elif event.key == pygame.K_F2:
-                        try:
-                            SHOW_PERF = not SHOW_PERF
-                            add_msg(f"Perf HUD {'ON' if SHOW_PERF else 'OFF'}")
-                        except Exception as e:
-                            add_msg(f"Error toggling perf display: {str(e)}")
-                            print(f"PERF TOGGLE ERROR: {e}")
-                    elif event.key == pygame.K_F6:
-                        try:
-                            reload_hot_modules()
-                            add_msg('Hot-reload complete')
-                        except Exception as e:
-                            add_msg(f'Reload failed: {e}')
-                            print(f"HOTRELOAD ERROR: {e}")
-                    elif event.key == pygame.K_F9:
-                        save_game()
-                    elif event.key == pygame.K_F10:
-                        load_game()
-                    elif event.key == pygame.K_ESCAPE:
-                        pause_menu()
-                    elif event.key == pygame.K_F5:
-                        save_config()
-                elif event.type == pygame.KEYUP:
-                    keys_down.discard(event.key)
-                elif event.type == pygame.ACTIVEEVENT and getattr(event, 'gain', 1) == 0:
-                    keys_down.clear()
+            events = pygame.event.get()
+            if any(event.type == pygame.QUIT for event in events):
+                running = False
+            # one keyboard poll per frame; everything below (and player.update) reads the snapshot
+            snap = input_state.begin_frame(events)
+            if snap.pressed_mask:
+                if snap.pressed('debug'):
+                    map.toggle_debug()
+                if snap.pressed('chunk_formats'):
+                    map.set_optimize_formats(not map.optimize_formats)
+                    add_msg(f"Chunk format optimizer {'ON' if map.optimize_formats else 'OFF'}")
+                if snap.pressed('hud'):
+                    try:
+                        pages = (None,) + HUD_PAGES
+                        HUD_PAGE = pages[(pages.index(HUD_PAGE) + 1) % len(pages)]
+                        add_msg(f"HUD: {HUD_PAGE or 'OFF'}")
+                    except Exception as e:
+                        add_msg(f"Error toggling perf display: {str(e)}")
+                        print(f"PERF TOGGLE ERROR: {e}")
+                if snap.pressed('autotune'):
+                    run_autotune()
+                if snap.pressed('reload'):
+                    try:
+                        reload_hot_modules()
+                        add_msg('Hot-reload complete')
+                    except Exception as e:
+                        add_msg(f'Reload failed: {e}')
+                        print(f"HOTRELOAD ERROR: {e}")
+                if snap.pressed('memory_dump'):
+                    try:
+                        memory.dump(MEMORY_REPORT)
+                        add_msg(f"Memory report written to {os.path.basename(MEMORY_REPORT)}")
+                    except Exception as e:
+                        add_msg(f"Memory report failed: {e}")
+                        print(f"MEMORY REPORT ERROR: {e}")
+                if snap.pressed('input_history'):
+                    try:
+                        count = input_state.dump_history(INPUT_HISTORY)
+                        add_msg(f"{count} input events written to {os.path.basename(INPUT_HISTORY)}")
+                    except Exception as e:
+                        add_msg(f"Input history dump failed: {e}")
+                        print(f"INPUT HISTORY ERROR: {e}")
+                if snap.pressed('save'):
+                    save_game()
+                if snap.pressed('load'):
+                    load_game()
+                if snap.pressed('save_config'):
+                    save_config()
+                if snap.pressed('tree_scale_down') or snap.pressed('tree_scale_up'):
+                    step = 0.25 if snap.pressed('tree_scale_up') else -0.25
+                    CONFIG['tree_scale'] = max(0.25, float(CONFIG.get('tree_scale', _default_config['tree_scale'])) + step)
+                    apply_tree_settings()
+                if snap.pressed('tree_density_down') or snap.pressed('tree_density_up'):
+                    step = 0.01 if snap.pressed('tree_density_up') else -0.01
+                    density = min(1.0, max(0.0, float(CONFIG.get('tree_density', _default_config['tree_density'])) + step))
+                    CONFIG['tree_density'] = round(density, 4)
+                    changed = map.set_tree_density(CONFIG['tree_density'])
+                    add_msg(f"Applied tree_density={CONFIG['tree_density']} ({changed} tiles changed)")
+                if snap.pressed('pause'):
+                    pause_menu()
 
             # Remote server removed — no remote key integration
 
+            for changed_path in asset_watcher.poll():
+                try:
+                    msg = map.on_file_changed(changed_path)
+                    if msg:
+                        add_msg(msg)
+                except Exception as e:
+                    add_msg(f"Asset reload failed: {e}")
+                    print(f"ASSET RELOAD ERROR: {e}")
+
             dt = clock.tick_busy_loop(60)/1000.0 if hasattr(clock, 'tick_busy_loop') else clock.tick(60)/1000.0
             player.update(map, dt)
+            if map.fog_enabled and fog_radius > 0:
+                ptx = int((player.x + player.image.get_width() / 2) // TILE_SIZE)
+                pty = int((player.y + player.image.get_height() / 2) // TILE_SIZE)
+                seen, (fx0, fy0) = vis.fov(ptx, pty, fog_radius)
+                map.reveal(seen, fx0, fy0)
+            if flow is not None:
+                px, py = player.x + player.image.get_width() / 2, player.y + player.image.get_height() / 2
+                flow.update(px, py)
+                chasers = None
+                if vis is not None and npc_sight > 0:
+                    npcs.wander(dt, npc_speed)
+                    chasers = vis.sees(npcs.x + npcs.w / 2, npcs.y + npcs.h / 2, px, py, npc_sight)
+                flow.steer(npcs, npc_speed, chasers)
+            elif follower is not None:
+                follower.roam(goal_radius)
+                follower.update(dt, npc_speed)
+            else:
+                npcs.wander(dt, npc_speed)
+            npcs.update(map, dt)
 
             screen.fill(clear_color)
             
             t0 = time.perf_counter()
-            map.draw(screen)
+            # sprites are depth-sorted against tree canopies; boxes lie flat on the ground
+            map.draw(screen, sprites=sprites, underlays=(box_sprites,), entities=(npcs,))
             t1 = time.perf_counter()
-            for s in sprites:
-                s.draw(screen)
-            box_sprites.draw(screen)
-            t2 = time.perf_counter()
 
             draw_overlay(screen)
-            if SHOW_PERF:
+            if HUD_PAGE:
                 draw_perf_hud(screen)
 
             # Remote server removed — no frame streaming
@@ -570,6 +863,8 @@ def main():
             start_sleep = time.perf_counter()
             frame_end = time.perf_counter()
 
+        quit_game()
+
     elif menu_action == "settings":
         print("Settings menu not implemented yet.")
         pygame.quit()
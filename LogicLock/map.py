@@ -1,34 +1,129 @@
 import os
+import time
+from collections import OrderedDict
 import pygame
+import numpy as np
 from .camera import camera
 from .tilekind import TileKind
-from .map_io import image_to_tiles, text_to_tiles, find_palette_file_for_image, load_palette_from_file, sparsify_trees, scale_tree_images
-from .map_render import convert_tile_images, compute_extra_pixels, create_chunks, draw_map
+from .map_io import image_to_tiles, text_to_tiles, find_palette_file_for_image, load_palette_from_file, sparsify_trees, scale_tree_images, as_tile_grid
+from .map_format import EXTENSION as COMPILED_MAP_EXTENSION, load_map
+from . import map_render
+from .map_render import LAYERS, DEPTH_SORTED_LAYERS, plan_chunk, plan_strips, render_plan, optimize_surface, surface_format, SURFACE_FORMATS, draw_depth_sorted, compute_extra_pixels, convert_tile_images, draw_map, build_kind_index, changed_chunks, padding_for_kinds, report_clipped, layer_table, layer_kinds, split_animated, draw_animated
+from .regions import RegionStore, DEFAULT_REGION_SIZE, DEFAULT_MAX_REGIONS
+from .bakepool import BakePool, MIN_POOL_JOBS
+from .fog import ExploredBits, fog_surface, FOG_COLOR
+
+# Time budget (ms) per frame for rebaking chunks queued by hot-reload
+REBAKE_BUDGET_MS = 4.0
+# Baked chunk surfaces kept around the camera when the map is streamed
+MAX_STREAMED_CHUNKS = 96
+# Regions paged in ahead of the camera per frame on streamed maps (within one region of the view)
+PREFETCH_REGIONS = 1
+# Fog chunk surfaces kept around the camera (at least; they are full chunk-sized SRCALPHA surfaces)
+MAX_FOG_CHUNKS = 16
+
+
+class ChunkLayer:
+    """Baked chunk surfaces for one map layer, with its kind <-> chunk indexes and rebake queue.
+
+    Ground chunks hold only ground kinds, so they are tight and opaque; padded
+    SRCALPHA surfaces are only used by layers whose kinds overhang their tile.
+    Depth-sorted layers store a list of per-row occluder strips per chunk instead.
+    Animated kinds are left out of the baked surfaces of other layers; `animated`
+    holds their positions per chunk, drawn each frame from the kinds' frames.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.opaque = name == 'ground'
+        self.depth_sorted = name in DEPTH_SORTED_LAYERS
+        self.chunks = {}
+        self.kind_chunks = {}
+        self.chunk_kinds = {}
+        self.animated = {}
+        self.pending = set()
+        # baked surfaces per surface format, kept current by put/drop/clear
+        self.formats = dict.fromkeys(SURFACE_FORMATS, 0)
+
+    def _count(self, entry, step):
+        if entry is None:
+            return
+        for surf in ([s for _, s, _ in entry] if self.depth_sorted else [entry]):
+            self.formats[surface_format(surf)] += step
+
+    def put(self, key, entry):
+        """Store chunk `key`'s surface (a strip list on depth-sorted layers); None removes it."""
+        self._count(self.chunks.pop(key, None), -1)
+        if entry is not None:
+            self.chunks[key] = entry
+            self._count(entry, 1)
+
+    def set_chunk_kinds(self, key, kinds):
+        """Replace the kinds recorded for one chunk in both indexes."""
+        for kind in self.chunk_kinds.pop(key, ()):
+            keys = self.kind_chunks.get(kind)
+            if keys is not None:
+                keys.discard(key)
+        if kinds:
+            self.chunk_kinds[key] = set(kinds)
+            for kind in kinds:
+                self.kind_chunks.setdefault(kind, set()).add(key)
+
+    def drop(self, key):
+        self.put(key, None)
+        self.animated.pop(key, None)
+        self.set_chunk_kinds(key, ())
+        self.pending.discard(key)
+
+    def clear(self):
+        self.chunks.clear()
+        self.formats = dict.fromkeys(SURFACE_FORMATS, 0)
+        self.animated.clear()
+        self.kind_chunks.clear()
+        self.chunk_kinds.clear()
+        self.pending.clear()
 
 
 class Map:
-    """Thin orchestrator that delegates IO and rendering to helper modules."""
-    def __init__(self, map_file, tile_kinds, tile_size, color_map=None, tree_density=None, clustered=False, max_tiles=120, tree_scale=None, chunk_size=8):
+    """Thin orchestrator that delegates IO and rendering to helper modules.
+
+    Tiles either live in memory (`tiles`, an int16 array) or, for streamed maps, in
+    a RegionStore (`store`) that pages fixed-size regions in around the camera. Use
+    tile_at()/tile_block()/set_tile() and width/height, which work in both modes.
+
+    Each tile is drawn on the layer its TileKind names (ground, objects, overhead);
+    every layer keeps its own chunk cache, so e.g. resizing trees never rebakes ground.
+    Baked surfaces are stored in the cheapest format that draws them correctly
+    (see map_render.optimize_surface) unless `optimize_formats` is off.
+
+    With `fog_enabled`, tiles not yet explored (see reveal()) are covered by
+    per-chunk fog surfaces, rebuilt only when a chunk's explored bits change.
+    """
+    optimize_formats = True
+    fog_enabled = False
+
+    def __init__(self, map_file, tile_kinds, tile_size, color_map=None, tree_density=None, clustered=False, max_tiles=120, tree_scale=None, chunk_size=8, tree_seed=0, downsample='majority',
+                 stream=False, region_size=DEFAULT_REGION_SIZE, max_regions=DEFAULT_MAX_REGIONS, bake_workers=0):
         self.tile_kinds = tile_kinds
         self.tile_size = tile_size
         self.color_map = None
         self.tree_density = tree_density
         self.clustered = clustered
+        self.tree_seed = tree_seed
+        self.downsample = downsample
         self.max_tiles = max_tiles
         self.tree_scale = tree_scale
         self.chunk_size = int(chunk_size) if chunk_size and chunk_size > 0 else 8
+        self.bake_workers = int(bake_workers or 0)
 
         # Ensure required properties
-        self._chunks = None
-        self._images_converted = False
-        self._extra_px_x = 0
-        self._extra_px_y = 0
+        self._init_caches()
 
         # Resolve path relative to this module if a relative path was provided
         if not os.path.isabs(map_file):
             map_file = os.path.join(os.path.dirname(__file__), map_file)
         if not os.path.exists(map_file):
             raise FileNotFoundError(f"Map file not found: {map_file}")
+        self.map_file = map_file
 
         # If the map is an image, try to find a palette file nearby if none provided
         palette_path = None
@@ -38,25 +133,189 @@ class Map:
             candidate = find_palette_file_for_image(map_file)
             if candidate:
                 palette_path = candidate
+        self.palette_path = palette_path
 
-        # Load tiles (image or text)
-        lower = map_file.lower()
-        if lower.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-            self.tiles, (mw, mh) = image_to_tiles(map_file, tile_kinds, max_tiles=self.max_tiles, color_map=palette_path)
+        if stream and map_file.lower().endswith(COMPILED_MAP_EXTENSION):
+            self._open_map_reader()
+            self._init_stream(self._read_compiled, self._map_reader.width, self._map_reader.height, region_size, max_regions)
         else:
-            self.tiles = text_to_tiles(map_file)
+            if stream:
+                print(f"Streaming needs a compiled {COMPILED_MAP_EXTENSION} map; loading {os.path.basename(map_file)} into memory")
+            self.tiles = self._load_tiles()
 
         # Optionally scale tree images before conversion
         if self.tree_scale is not None:
             scale_tree_images(self.tile_kinds, self.tile_size, self.tree_scale)
 
+    def _init_caches(self):
+        # runtime-only caches
+        self._images_converted = False
+        # per-layer chunk caches; _resident holds the chunk keys baked so far (None = not built)
+        self._layers = {name: ChunkLayer(name) for name in LAYERS}
+        self._resident = None
+        # worker processes for large bake passes (created on first use when bake_workers > 0)
+        self._bake_pool = None
+        # parsed source grid (pre-sparsification), used to diff live map edits
+        self._source_tiles = None
+        # streamed maps: paged tile regions and the raw region source
+        self.store = None
+        self._base_source = None
+        self._map_reader = None
+        # callables told about tile edits (e.g. Navigator.tiles_changed); see notify_tiles_changed
+        self.tile_listeners = []
+        # fog of war: explored bits per tile and the fog surface per chunk (None = nothing fogged)
+        self.explored = ExploredBits()
+        self._fog_chunks = OrderedDict()
+        self._fog_opaque = None
+        self.fog_rebuilds = 0
+
+    def _init_stream(self, source, width, height, region_size=DEFAULT_REGION_SIZE, max_regions=DEFAULT_MAX_REGIONS):
+        self.tiles = None
+        self._base_source = source
+        self.store = RegionStore(self._region_source, width, height, region_size, max_regions)
+
+    def _open_map_reader(self):
+        old = self._map_reader
+        self._map_reader = load_map(self.map_file, self.tile_kinds)
+        if old is not None:
+            old.close()
+
+    def _read_compiled(self, x0, y0, w, h):
+        return self._map_reader.read_tiles(x0, y0, w, h)
+
+    def _region_source(self, x0, y0, w, h):
+        # regions are sparsified with per-tile randomness and one tile of context on
+        # each side, so they match their neighbours at the seams and are identical
+        # every time they are paged in
+        if self.tree_density is None or not (0.0 <= self.tree_density <= 1.0):
+            return as_tile_grid(self._base_source(x0, y0, w, h))
+        hx0, hy0 = max(0, x0 - 1), max(0, y0 - 1)
+        hx1, hy1 = min(self.store.width, x0 + w + 1), min(self.store.height, y0 + h + 1)
+        block = as_tile_grid(self._base_source(hx0, hy0, hx1 - hx0, hy1 - hy0))
+        block = sparsify_trees(block, self.tile_kinds, self.tree_density, self.clustered,
+                               seed=abs(int(self.tree_seed)), origin=(hx0, hy0))
+        return block[y0 - hy0:y0 - hy0 + h, x0 - hx0:x0 - hx0 + w]
+
+    @classmethod
+    def from_source(cls, source, width, height, tile_kinds, tile_size, tree_density=None, clustered=False, tree_scale=None, chunk_size=8, tree_seed=0,
+                    region_size=DEFAULT_REGION_SIZE, max_regions=DEFAULT_MAX_REGIONS, bake_workers=0):
+        """Construct a streamed Map whose tiles come from `source(x0, y0, w, h)` (e.g. a world generator)."""
+        self = cls.__new__(cls)
+        self.tile_kinds = tile_kinds
+        self.tile_size = tile_size
+        self.color_map = None
+        self.tree_density = tree_density
+        self.clustered = clustered
+        self.tree_seed = tree_seed
+        self.downsample = 'majority'
+        self.max_tiles = None
+        self.tree_scale = tree_scale
+        self.chunk_size = int(chunk_size) if chunk_size and chunk_size > 0 else 8
+        self.bake_workers = int(bake_workers or 0)
+        self.map_file = None
+        self.palette_path = None
+
+        self._init_caches()
+        self._init_stream(source, width, height, region_size, max_regions)
+
+        if self.tree_scale is not None:
+            scale_tree_images(self.tile_kinds, self.tile_size, self.tree_scale)
+        return self
+
+    @property
+    def width(self):
+        """Map width in tiles."""
+        if self.store is not None:
+            return self.store.width
+        return self.tiles.shape[1] if self.tiles.ndim == 2 else 0
+
+    @property
+    def height(self):
+        """Map height in tiles."""
+        if self.store is not None:
+            return self.store.height
+        return self.tiles.shape[0]
+
+    def tile_at(self, tx, ty):
+        """Tile-kind index at (tx, ty), or None outside the map."""
+        if self.store is not None:
+            return self.store.tile(tx, ty)
+        if 0 <= ty < self.height and 0 <= tx < self.width:
+            return int(self.tiles[ty, tx])
+        return None
+
+    def tile_block(self, x0, y0, x1, y1, fill=0):
+        """Tiles in [x0, x1) x [y0, y1) as an int16 array; cells outside the map get `fill`."""
+        if self.store is not None:
+            return self.store.read_block(x0, y0, x1, y1, fill)
+        out = np.full((max(0, y1 - y0), max(0, x1 - x0)), fill, dtype=np.int16)
+        sx0, sy0 = max(0, x0), max(0, y0)
+        sx1, sy1 = min(self.width, x1), min(self.height, y1)
+        if sx0 < sx1 and sy0 < sy1:
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = self.tiles[sy0:sy1, sx0:sx1]
+        return out
+
+    def tiles_at(self, xs, ys, fill=0):
+        """Tile-kind indices at coordinate arrays (xs, ys); cells outside the map get `fill`.
+
+        For scattered lookups, where tile_block over the bounding box would be huge.
+        """
+        if self.store is not None:
+            return self.store.gather(xs, ys, fill)
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        out = np.full(xs.shape, fill, dtype=np.int16)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        out[inside] = self.tiles[ys[inside], xs[inside]]
+        return out
+
+    def set_tile(self, tx, ty, kind_idx):
+        """Change one tile and queue its chunk for rebaking on the layers it affects."""
+        old = self.tile_at(tx, ty)
+        if self.store is not None:
+            self.store.set_tile(tx, ty, kind_idx)
+        else:
+            self.tiles[ty, tx] = kind_idx
+        self.notify_tiles_changed([tx], [ty])
+        key = (tx // self.chunk_size, ty // self.chunk_size)
+        if self._resident is None or key not in self._resident:
+            return
+        for layer in self._layers.values():
+            table = layer_table(self.tile_kinds, layer.name)
+            if table[old] != table[kind_idx]:
+                layer.pending.add(key)
+
+    def _parse_source(self):
+        """Parse the map source (compiled, image or text) into a tile grid, before sparsification."""
+        lower = self.map_file.lower()
+        if lower.endswith(COMPILED_MAP_EXTENSION):
+            # in-memory maps need every tile; streamed maps page regions in via _read_compiled
+            with load_map(self.map_file, self.tile_kinds) as mf:
+                return mf.read_tiles(0, 0, mf.width, mf.height)
+        if lower.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+            tiles, (mw, mh) = image_to_tiles(self.map_file, self.tile_kinds, max_tiles=self.max_tiles, color_map=self.palette_path, downsample=self.downsample)
+        else:
+            tiles = text_to_tiles(self.map_file)
+        return as_tile_grid(tiles)
+
+    def _sparsify(self, tiles):
         # Optionally sparsify tree tiles
         if self.tree_density is not None and 0.0 <= self.tree_density <= 1.0:
-            self.tiles = sparsify_trees(self.tiles, self.tile_kinds, self.tree_density, self.clustered)
+            tiles = sparsify_trees(tiles, self.tile_kinds, self.tree_density, self.clustered, seed=self.tree_seed)
+        return tiles
+
+    def _load_tiles(self):
+        """Parse the map source and apply tree sparsification.
+
+        The parsed grid is kept so live edits to the source can be diffed.
+        """
+        source = self._parse_source()
+        self._source_tiles = source.copy()
+        return self._sparsify(source)
 
     @classmethod
-    def from_tiles(cls, tiles, tile_kinds, tile_size, tree_density=None, clustered=False, max_tiles=120, tree_scale=None, chunk_size=8):
-        """Construct a Map directly from a tiles 2D-list (used when loading saved state)."""
+    def from_tiles(cls, tiles, tile_kinds, tile_size, tree_density=None, clustered=False, max_tiles=120, tree_scale=None, chunk_size=8, tree_seed=0):
+        """Construct a Map directly from a tiles 2D-list or array (used when loading saved state)."""
         self = cls.__new__(cls)
         # assign basic fields
         self.tile_kinds = tile_kinds
@@ -64,18 +323,19 @@ class Map:
         self.color_map = None
         self.tree_density = tree_density
         self.clustered = clustered
+        self.tree_seed = tree_seed
+        self.downsample = 'majority'
         self.max_tiles = max_tiles
         self.tree_scale = tree_scale
         self.chunk_size = int(chunk_size) if chunk_size and chunk_size > 0 else 8
+        self.bake_workers = 0
+        self.map_file = None
+        self.palette_path = None
 
-        # runtime-only caches
-        self._chunks = None
-        self._images_converted = False
-        self._extra_px_x = 0
-        self._extra_px_y = 0
+        self._init_caches()
 
         # set provided tiles
-        self.tiles = tiles
+        self.tiles = as_tile_grid(tiles)
 
         # Optionally scale tree images before conversion
         if self.tree_scale is not None:
@@ -85,24 +345,535 @@ class Map:
 
         return self
 
-    def draw(self, screen):
+    def draw(self, screen, layers=LAYERS, sprites=(), underlays=(), entities=()):
+        """Draw the map's `layers` (all by default, in order) around the camera.
+
+        Depth-sorted layers (overhead) are drawn interleaved with `sprites` (objects
+        with image/x/y) and `entities` (EntityStores) so they walk behind canopies;
+        `underlays` (objects with draw(screen)) are drawn just before that pass,
+        above the ground.
+        """
         # Ensure images have been converted for display and masks built
         if not self._images_converted:
             convert_tile_images(self.tile_kinds)
             self._images_converted = True
 
-        # compute extra pixel margins used in chunking
-        self._extra_px_x, self._extra_px_y = compute_extra_pixels(self.tile_kinds, self.tile_size)
+        cs, ts = self.chunk_size, self.tile_size
+        if self._resident is None:
+            self._resident = OrderedDict()
+            for layer in self._layers.values():
+                layer.clear()
+            if self.store is None:
+                # in-memory maps are baked whole; each layer chunk is padded only for its own kinds
+                rows = (self.height + cs - 1) // cs
+                cols = (self.width + cs - 1) // cs
+                self._bake_chunks([(cx, cy) for cy in range(rows) for cx in range(cols)])
+        elif any(layer.pending for layer in self._layers.values()):
+            self.rebake_pending()
+
+        if self.store is not None:
+            self._bake_visible()
+
+        # Delegate the actual draw to rendering helper (pass debug flag); stats cover all layers
+        draw_ms = 0.0
+        blits = 0
+        sorted_blits = 0
+        animated_blits = 0
+        formats = {}
+        for name in layers:
+            layer = self._layers[name]
+            if layer.depth_sorted:
+                for underlay in underlays:
+                    underlay.draw(screen)
+                start = time.perf_counter()
+                sorted_blits += draw_depth_sorted(screen, self._visible_strips(layer), sprites, formats, entities)
+                draw_ms += (time.perf_counter() - start) * 1000.0
+                continue
+            pad_x, pad_y = padding_for_kinds(self.tile_kinds, layer_kinds(self.tile_kinds, name), ts)
+            draw_map(screen, self.tiles, self.tile_kinds, ts, layer.chunks, pad_x, pad_y,
+                     debug=getattr(self, '_debug', False) and name == 'ground', chunk_size=cs,
+                     map_size=(self.width, self.height), tile_at=self.tile_at)
+            draw_ms += map_render.last_draw_stats.get('draw_ms', 0.0)
+            blits += map_render.last_draw_stats.get('chunk_blits', 0)
+            for fmt, n in map_render.last_draw_stats.get('blit_formats', {}).items():
+                formats[fmt] = formats.get(fmt, 0) + n
+            if layer.animated:
+                start = time.perf_counter()
+                animated_blits += draw_animated(screen, self._visible_animated(layer, pad_x, pad_y), self.tile_kinds, start)
+                draw_ms += (time.perf_counter() - start) * 1000.0
+        if self.fog_enabled:
+            # fog goes over every layer (canopies and sprites included) in the same chunk grid
+            self._build_visible_fog()
+            draw_map(screen, self.tiles, self.tile_kinds, ts, self._fog_chunks, 0, 0, chunk_size=cs,
+                     map_size=(self.width, self.height), tile_at=self.tile_at)
+            draw_ms += map_render.last_draw_stats.get('draw_ms', 0.0)
+            blits += map_render.last_draw_stats.get('chunk_blits', 0)
+            for fmt, n in map_render.last_draw_stats.get('blit_formats', {}).items():
+                formats[fmt] = formats.get(fmt, 0) + n
+        map_render.last_draw_stats.update(draw_ms=draw_ms, chunk_blits=blits, sorted_blits=sorted_blits,
+                                          animated_blits=animated_blits, blit_formats=formats)
+
+    def _visible_chunk_range(self, pad_x, pad_y):
+        """(cx0, cx1, cy0, cy1) of chunks whose area, widened by the given overhang, meets the camera."""
+        cs = self.chunk_size
+        span = cs * self.tile_size
+        cols = (self.width + cs - 1) // cs
+        rows = (self.height + cs - 1) // cs
+        return (max(0, int((camera.x - pad_x) // span)), min(cols - 1, int((camera.x + camera.width + pad_x) // span)),
+                max(0, int((camera.y - pad_y) // span)), min(rows - 1, int((camera.y + camera.height + pad_y) // span)))
+
+    def _visible_strips(self, layer):
+        pad_x, pad_y = compute_extra_pixels([self.tile_kinds[k] for k in layer_kinds(self.tile_kinds, layer.name)] or self.tile_kinds, self.tile_size)
+        cx0, cx1, cy0, cy1 = self._visible_chunk_range(pad_x, pad_y)
+        strips = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                strips.extend(layer.chunks.get((cx, cy), ()))
+        return strips
+
+    def _visible_animated(self, layer, pad_x, pad_y):
+        cx0, cx1, cy0, cy1 = self._visible_chunk_range(pad_x, pad_y)
+        items = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                items.extend(layer.animated.get((cx, cy), ()))
+        return items
+
+    def _bake_visible(self):
+        """Streamed maps: bake the chunks around the camera on demand and drop the least recently seen ones."""
+        pad_x, pad_y = compute_extra_pixels(self.tile_kinds, self.tile_size)
+        cx0, cx1, cy0, cy1 = self._visible_chunk_range(pad_x, pad_y)
+
+        missing = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                if (cx, cy) in self._resident:
+                    self._resident.move_to_end((cx, cy))
+                else:
+                    missing.append((cx, cy))
+        self._bake_chunks(missing)
+
+        limit = max(MAX_STREAMED_CHUNKS, 2 * (cx1 - cx0 + 1) * (cy1 - cy0 + 1))
+        while len(self._resident) > limit:
+            key, _ = self._resident.popitem(last=False)
+            for layer in self._layers.values():
+                layer.drop(key)
+
+        if self.store is None:
+            return
+        # page neighbouring regions in a few per frame, before the camera reaches them
+        rs, ts = self.store.region_size, self.tile_size
+        self.store.prefetch(int(camera.x // ts) - rs, int(camera.y // ts) - rs,
+                            int((camera.x + camera.width) // ts) + rs + 1, int((camera.y + camera.height) // ts) + rs + 1,
+                            limit=PREFETCH_REGIONS)
+
+    def reveal(self, seen, x0, y0):
+        """Mark tiles where `seen` (bool rows, [0, 0] at tile (x0, y0)) is True as explored.
+
+        Only fog chunks around newly explored tiles are rebuilt. Returns the
+        number of tiles newly explored.
+        """
+        seen = np.asarray(seen, dtype=bool)
+        h, w = seen.shape
+        sx0, sy0 = max(0, x0), max(0, y0)
+        sx1, sy1 = min(self.width, x0 + w), min(self.height, y0 + h)
+        if sx0 >= sx1 or sy0 >= sy1:
+            return 0
+        fresh = self.explored.mark(seen[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0], sx0, sy0)
+        ys, xs = np.nonzero(fresh)
+        if not len(ys):
+            return 0
+        # a tile's fog fades one tile into its neighbours, which may sit in the next chunk
+        cs = self.chunk_size
+        for cy in range((int(ys.min()) + sy0 - 1) // cs, (int(ys.max()) + sy0 + 1) // cs + 1):
+            for cx in range((int(xs.min()) + sx0 - 1) // cs, (int(xs.max()) + sx0 + 1) // cs + 1):
+                self._fog_chunks.pop((cx, cy), None)
+        return int(len(ys))
+
+    def explored_state(self):
+        """Explored tiles as JSON-friendly data for save files."""
+        return self.explored.to_json()
+
+    def load_explored(self, state):
+        """Restore explored tiles from explored_state() data (None clears them)."""
+        self.explored.load_json(state)
+        self._fog_chunks.clear()
+
+    def _fog_chunk(self, cx, cy):
+        cs, ts = self.chunk_size, self.tile_size
+        x0, y0 = cx * cs, cy * cs
+        x1, y1 = min(self.width, x0 + cs), min(self.height, y0 + cs)
+        # the chunk plus a ring of neighbour tiles; beyond the map the edge tiles are repeated
+        rx0, ry0 = max(0, x0 - 1), max(0, y0 - 1)
+        rx1, ry1 = min(self.width, x0 + cs + 1), min(self.height, y0 + cs + 1)
+        grid = self.explored.read(rx0, ry0, rx1, ry1)
+        grid = np.pad(grid, ((ry0 - (y0 - 1), y0 + cs + 1 - ry1), (rx0 - (x0 - 1), x0 + cs + 1 - rx1)), mode='edge')
+        inside = (x1 - x0, y1 - y0)
+        if not grid.any() and inside == (cs, cs):
+            # fully unexplored: every such chunk shares one opaque surface
+            span = cs * ts
+            if self._fog_opaque is None or self._fog_opaque.get_size() != (span, span):
+                self._fog_opaque = pygame.Surface((span, span))
+                self._fog_opaque.fill(FOG_COLOR)
+            return self._fog_opaque
+        return fog_surface(grid, ts, inside)
+
+    def _build_visible_fog(self):
+        cx0, cx1, cy0, cy1 = self._visible_chunk_range(0, 0)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                key = (cx, cy)
+                if key in self._fog_chunks:
+                    self._fog_chunks.move_to_end(key)
+                else:
+                    self._fog_chunks[key] = self._fog_chunk(cx, cy)
+                    self.fog_rebuilds += 1
+        limit = max(MAX_FOG_CHUNKS, 2 * (cx1 - cx0 + 1) * (cy1 - cy0 + 1))
+        while len(self._fog_chunks) > limit:
+            self._fog_chunks.popitem(last=False)
+
+    def _chunk_block(self, cx, cy):
+        cs = self.chunk_size
+        x0, y0 = cx * cs, cy * cs
+        return self.tile_block(x0, y0, min(self.width, x0 + cs), min(self.height, y0 + cs))
+
+    def _bake_chunks(self, keys):
+        """Bake every layer of the given chunks (each chunk's tiles are read once).
+
+        Large passes go to the process pool when bake_workers > 0; layouts are
+        planned here and only the rasterization runs in the workers.
+        """
+        clipped = []
+        planned = []
+        for key in keys:
+            block = self._chunk_block(*key)
+            for layer in self._layers.values():
+                planned.append((layer, key) + self._plan_layer(layer, key, block, clipped))
+            self._resident[key] = None
+        report_clipped(clipped)
+
+        jobs = [job for _, _, _, layer_jobs in planned for job in layer_jobs]
+        if self.bake_workers > 0 and len(jobs) >= MIN_POOL_JOBS:
+            if self._bake_pool is None:
+                self._bake_pool = BakePool(self.bake_workers)
+            surfaces = iter(self._bake_pool.bake(jobs, self.tile_kinds))
+        else:
+            surfaces = (render_plan(size, items, opaque, self.tile_kinds, self.tile_size) for size, items, opaque in jobs)
+        for layer, key, meta, layer_jobs in planned:
+            self._store_layer(layer, key, meta, [next(surfaces) for _ in layer_jobs])
+
+    def _plan_layer(self, layer, key, block=None, clipped=None):
+        """Plan one layer of chunk `key` and update its kind index.
+
+        Returns (meta, jobs): jobs are (size, items, opaque) layouts to rasterize;
+        meta holds each strip's (depth, position) on depth-sorted layers.
+        """
+        if block is None:
+            block = self._chunk_block(*key)
+        grid = layer_table(self.tile_kinds, layer.name)[block]
+        kinds = build_kind_index(grid, self.tile_kinds, self.chunk_size, composite=False).keys()
+        layer.set_chunk_kinds(key, kinds)
+        if not layer.depth_sorted:
+            # animated tiles are drawn every frame from their frames, not baked
+            cs = self.chunk_size
+            grid, animated = split_animated(grid, self.tile_kinds, self.tile_size, (key[0] * cs, key[1] * cs))
+            if animated:
+                layer.animated[key] = animated
+            else:
+                layer.animated.pop(key, None)
+        if not kinds or not (grid >= 0).any():
+            return None, []
+        if layer.depth_sorted:
+            cs = self.chunk_size
+            strips = plan_strips(grid, self.tile_kinds, self.tile_size, (key[0] * cs, key[1] * cs))
+            return [(depth, pos) for depth, pos, _, _ in strips], [(size, items, False) for _, _, size, items in strips]
+        pad_x, pad_y = padding_for_kinds(self.tile_kinds, kinds, self.tile_size)
+        return None, [plan_chunk(grid, self.tile_kinds, self.tile_size, self.chunk_size, 0, 0, pad_x, pad_y, clipped, layer.opaque)]
+
+    def _store_layer(self, layer, key, meta, surfaces):
+        if self.optimize_formats:
+            surfaces = [optimize_surface(surf) for surf in surfaces]
+        if not surfaces:
+            layer.put(key, None)
+        elif layer.depth_sorted:
+            layer.put(key, [(depth, surf, pos) for (depth, pos), surf in zip(meta, surfaces)])
+        else:
+            layer.put(key, surfaces[0])
+
+    def _bake_layer(self, layer, key, clipped=None):
+        """(Re)bake one layer of chunk `key` on the main thread."""
+        meta, jobs = self._plan_layer(layer, key, clipped=clipped)
+        self._store_layer(layer, key, meta, [render_plan(size, items, opaque, self.tile_kinds, self.tile_size) for size, items, opaque in jobs])
+
+    def notify_tiles_changed(self, xs=None, ys=None):
+        """Tell tile_listeners that the tiles at (xs, ys) changed; no arguments means any tile may have."""
+        for listener in list(self.tile_listeners):
+            try:
+                listener(xs, ys)
+            except Exception as e:
+                print(f"[map] tile listener failed: {e}")
+
+    def _reset_chunks(self):
+        """Drop every baked chunk; they are rebuilt on the next draw."""
+        self._resident = None
+        for layer in self._layers.values():
+            layer.clear()
+        self._fog_chunks.clear()
+
+    def invalidate_kind(self, kind_idx):
+        """Queue every chunk (on any layer) that uses tile kind `kind_idx` for an incremental rebake."""
+        count = 0
+        for layer in self._layers.values():
+            keys = layer.kind_chunks.get(kind_idx, ())
+            layer.pending.update(keys)
+            count += len(keys)
+        return count
+
+    def rebake_pending(self, budget_ms=REBAKE_BUDGET_MS):
+        """Rebake queued layer chunks, nearest to the camera first, within a per-frame time budget.
+
+        Stale chunk surfaces stay on screen until their replacement is ready, so large
+        invalidations are spread over several frames instead of stalling one.
+        """
+        if self._resident is None:
+            return 0
+        queued = [(layer, key) for layer in self._layers.values() for key in layer.pending]
+        if not queued:
+            return 0
+        span = self.chunk_size * self.tile_size
+        ccx = (camera.x + camera.width / 2) / span
+        ccy = (camera.y + camera.height / 2) / span
+        queued.sort(key=lambda item: (item[1][0] + 0.5 - ccx) ** 2 + (item[1][1] + 0.5 - ccy) ** 2)
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        clipped = []
+        done = 0
+        for layer, key in queued:
+            layer.pending.discard(key)
+            if key not in self._resident:
+                # streamed chunk evicted since it was queued; it is baked fresh when seen again
+                continue
+            self._bake_layer(layer, key, clipped=clipped)
+            done += 1
+            if time.perf_counter() >= deadline:
+                break
+        report_clipped(clipped)
+        return done
+
+    def pending_count(self):
+        return sum(len(layer.pending) for layer in self._layers.values())
+
+    def watch_paths(self):
+        """Files whose changes this map can apply live (tile images, map source and palette)."""
+        paths = [tk.image_path for tk in self.tile_kinds]
+        paths += [tk.frames_path for tk in self.tile_kinds if getattr(tk, 'frames_path', None)]
+        if self.map_file:
+            paths.append(self.map_file)
+        if self.palette_path:
+            paths.append(self.palette_path)
+        return paths
+
+    def reload_map_data(self):
+        """Re-parse the map source and rebake only the chunks covering changed tiles.
+
+        Source cells that did not change keep their live value, so already-sparsified
+        trees stay put; changed cells take the freshly parsed (and sparsified) value.
+        Player and camera state are not touched. Returns the number of changed tiles.
+
+        Streamed maps reopen the compiled file and re-page regions that were not edited;
+        they return 0 as the changed tiles are not counted.
+        """
+        if self.store is not None:
+            self._reopen_stream()
+            return 0
+        new_source = self._parse_source()
+        old_source = self._source_tiles
+        live = self.tiles
+        if old_source is None or new_source.shape != live.shape or old_source.shape != live.shape:
+            # dimensions changed: nothing to diff against
+            self._source_tiles = new_source
+            self.tiles = self._sparsify(new_source.copy())
+            self._reset_chunks()
+            self.notify_tiles_changed()
+            return int(new_source.size)
+
+        edited = new_source != old_source
+        self._source_tiles = new_source
+        if not edited.any():
+            return 0
+        candidate = live.copy()
+        candidate[edited] = self._sparsify(new_source)[edited]
+        return self._apply_tiles(candidate)
+
+    def _reopen_stream(self):
+        if self._map_reader is not None:
+            self._open_map_reader()
+        self.store.discard()
+        self._reset_chunks()
+        self.notify_tiles_changed()
+
+    def close(self):
+        """Release the region store, compiled map reader and bake workers of this map."""
+        if self.store is not None:
+            self.store.close()
+        if self._map_reader is not None:
+            self._map_reader.close()
+            self._map_reader = None
+        if self._bake_pool is not None:
+            self._bake_pool.close()
+            self._bake_pool = None
+
+    def save_regions(self, directory):
+        """Write the edited regions of a streamed map into `directory`. Returns the region count."""
+        return self.store.save(directory)
+
+    def load_regions(self, directory):
+        """Overlay regions saved by save_regions() onto a streamed map and rebake around the camera."""
+        self.store.load_overlay(directory)
+        self._reset_chunks()
+        self.notify_tiles_changed()
+
+    def _apply_tiles(self, new_tiles):
+        """Replace the live tiles with `new_tiles` (same shape), queueing only changed layer chunks."""
+        new_tiles = np.asarray(new_tiles, dtype=np.int16)
+        ys, xs = np.nonzero(self.tiles != new_tiles)
+        if not len(ys):
+            return 0
+        if self._resident is not None:
+            # chunks are rebaked in place; only layers whose cells changed are touched
+            for layer in self._layers.values():
+                table = layer_table(self.tile_kinds, layer.name)
+                _, keys = changed_chunks(table[self.tiles], table[new_tiles], self.chunk_size)
+                layer.pending.update(keys)
+        self.tiles = new_tiles
+        self.notify_tiles_changed(xs, ys)
+        return int(len(ys))
+
+    def set_tree_density(self, tree_density):
+        """Re-sparsify the parsed source at `tree_density` and rebake only chunks whose trees changed.
+
+        Sparsification is seeded, so unchanged settings reproduce the same trees.
+        Maps without a parsed source (e.g. restored from a save) keep their tiles.
+        """
+        self.tree_density = tree_density
+        if self.store is not None:
+            # unedited regions are re-paged (and re-sparsified) from the source
+            self.store.discard()
+            self._reset_chunks()
+            self.notify_tiles_changed()
+            return 0
+        if self._source_tiles is None or self._source_tiles.shape != self.tiles.shape:
+            return 0
+        return self._apply_tiles(self._sparsify(self._source_tiles.copy()))
+
+    def reload_tile_kind(self, kind_idx):
+        """Reload one TileKind's image from disk and rebake only the chunks that use it."""
+        self.tile_kinds[kind_idx].reload()
+        if self._resident is None:
+            return 0
+        return self.invalidate_kind(kind_idx)
+
+    def set_tree_scale(self, tree_scale):
+        """Switch tree kinds to the cached variant for `tree_scale` and rebake only tree chunks.
+
+        Trees live on the overhead layer, so only its chunks holding trees are rebaked
+        (and resized); ground chunks are untouched. Returns the number of chunks queued.
+        """
+        self.tree_scale = tree_scale
+        changed = scale_tree_images(self.tile_kinds, self.tile_size, tree_scale)
+        if self._resident is None:
+            return 0
+        return sum(self.invalidate_kind(idx) for idx in changed)
+
+    def on_file_changed(self, path):
+        """Apply a changed asset file. Returns a short status message, or None if unrelated."""
+        path = os.path.normcase(os.path.abspath(path))
+        msgs = []
+        for idx, tk in enumerate(self.tile_kinds):
+            own = [p for p in (tk.image_path, getattr(tk, 'frames_path', None)) if p]
+            if path in (os.path.normcase(os.path.abspath(p)) for p in own):
+                n = self.reload_tile_kind(idx)
+                msgs.append(f"Reloaded {tk.name} ({n} chunks)")
+        sources = [p for p in (self.map_file, self.palette_path) if p]
+        if self.map_file and path in (os.path.normcase(os.path.abspath(p)) for p in sources):
+            n = self.reload_map_data()
+            if self.store is not None:
+                msgs.append("Reloaded streamed map data")
+                return '; '.join(msgs)
+            msgs.append(f"Reloaded map data ({n} tiles changed, {self.pending_count()} chunks queued)")
+        return '; '.join(msgs) or None
+
+    def memory_items(self):
+        """(category, label, object) for memory accounting: chunk surfaces, tile storage and render caches."""
+        for layer in self._layers.values():
+            for entry in layer.chunks.values():
+                for surf in ([s for _, s, _ in entry] if layer.depth_sorted else [entry]):
+                    yield 'surfaces', f'map {layer.name} chunks', surf
+        for surf in list(self._fog_chunks.values()):
+            if surf is not None:
+                yield 'surfaces', 'map fog chunks', surf
+        yield from self.explored.memory_items()
+        if self.tiles is not None:
+            yield 'tiles', 'map tiles', self.tiles
+        if self._source_tiles is not None:
+            yield 'tiles', 'map source tiles', self._source_tiles
+        if self.store is not None:
+            for grid in list(self.store._regions.values()):
+                yield 'tiles', 'map regions', grid
+        for fmt, atlas in list(map_render._atlas_cache.items()):
+            if fmt != 'key':
+                yield 'caches', 'tile atlas', atlas[0]
+        if self._bake_pool is not None and self._bake_pool._images is not None:
+            yield 'caches', 'bake pool tile images', self._bake_pool._images.size
+
+    def set_chunk_size(self, chunk_size):
+        """Switch to `chunk_size` tiles per chunk side; every chunk is rebaked."""
+        self.chunk_size = max(1, int(chunk_size))
+        self._reset_chunks()
+
+    def set_optimize_formats(self, enabled):
+        """Turn per-surface format optimization on or off; every chunk is rebaked."""
+        self.optimize_formats = bool(enabled)
+        self._reset_chunks()
+
+    def evict_all(self):
+        """Drop every baked chunk (all layers and fog); they are rebuilt on the next draw."""
+        self._reset_chunks()
+
+    def bake_view(self):
+        """Bake only the chunks around the camera, even on in-memory maps (which draw() bakes whole).
+
+        Returns the number of chunks resident afterwards.
+        """
+        if self._resident is None:
+            self._resident = OrderedDict()
+        self._bake_visible()
+        return len(self._resident)
+
+    def baked_surfaces(self):
+        """Yield (surface, world pixel rect) for every baked chunk and strip on every layer."""
+        cs, ts = self.chunk_size, self.tile_size
+        span = cs * ts
+        for layer in self._layers.values():
+            for (cx, cy), entry in layer.chunks.items():
+                if layer.depth_sorted:
+                    for _, surf, (x, y) in entry:
+                        yield surf, pygame.Rect(x, y, surf.get_width(), surf.get_height())
+                else:
+                    pad_x, pad_y = map_render._chunk_padding(entry, cs, ts)
+                    yield entry, pygame.Rect(cx * span - pad_x, cy * span - pad_y, entry.get_width(), entry.get_height())
 
-        # Build chunk cache if needed
-        if self._chunks is None:
-            self._chunks = create_chunks(self.tiles, self.tile_kinds, self.tile_size, self.chunk_size, self._extra_px_x, self._extra_px_y)
+    def format_counts(self):
+        """Number of baked surfaces (chunks and strips, all layers) per surface format.
 
-        # Delegate the actual draw to rendering helper (pass debug flag)
-        draw_map(screen, self.tiles, self.tile_kinds, self.tile_size, self._chunks, self._extra_px_x, self._extra_px_y, debug=getattr(self, '_debug', False))
+        Read from counters the layers update as chunks are baked and evicted, so
+        it is cheap enough for every HUD frame.
+        """
+        counts = dict.fromkeys(SURFACE_FORMATS, 0)
+        for layer in self._layers.values():
+            for fmt, n in layer.formats.items():
+                counts[fmt] += n
+        return counts
 
-    
-    
     def toggle_debug(self):
         """Toggle debug overlay on/off and mark that a toggle occurred (for screenshot)."""
         self._debug = not getattr(self, '_debug', False)
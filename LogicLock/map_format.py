@@ -0,0 +1,234 @@
+"""Compiled binary map format (.llmap), read through mmap.
+
+Layout (little-endian):
+  header      struct HEADER (magic, version, sizes, offsets)
+  name table  kind_count entries of (u8 length, utf-8 name)
+  chunk index chunk_rows * chunk_cols u64 byte offsets, row-major
+  tile layer  each chunk's tiles (uint8 or uint16), row-major inside the chunk,
+              chunks stored in index order; edge chunks are cropped to the map
+
+Tile values index the name table, so files stay valid if the game's TileKind list
+is reordered. A chunk can be read without touching the rest of the file.
+
+Convert existing maps with:
+  python -m LogicLock.map_format maps/spam.png maps/spam.llmap
+"""
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b'LLMAP\x00\r\n'
+VERSION = 1
+# magic, version, header size, width, height, chunk size, dtype code, kind count,
+# name table offset, chunk index offset, tile layer offset
+HEADER = struct.Struct('<8sHHIIHBxHIQQ')
+DTYPES = {1: np.uint8, 2: np.uint16}
+EXTENSION = '.llmap'
+
+
+class MapFormatError(ValueError):
+    pass
+
+
+def write_map(path, tiles, kind_names, chunk_size=32):
+    """Write a 2D tile grid (values index `kind_names`) as a compiled map file."""
+    grid = np.asarray(tiles)
+    if grid.ndim != 2:
+        raise MapFormatError("tiles must be a 2D grid")
+    height, width = grid.shape
+    cs = int(chunk_size)
+    code = 1 if len(kind_names) <= 256 else 2
+    dtype = DTYPES[code]
+    grid = grid.astype(dtype)
+
+    names = b''.join(struct.pack('<B', len(n.encode('utf-8'))) + n.encode('utf-8') for n in kind_names)
+    rows = (height + cs - 1) // cs
+    cols = (width + cs - 1) // cs
+    names_offset = HEADER.size
+    index_offset = names_offset + len(names)
+    index_offset += (-index_offset) % 8
+    tiles_offset = index_offset + rows * cols * 8
+
+    offsets = np.zeros(rows * cols, dtype='<u8')
+    blocks = []
+    pos = tiles_offset
+    for cy in range(rows):
+        for cx in range(cols):
+            block = np.ascontiguousarray(grid[cy * cs:(cy + 1) * cs, cx * cs:(cx + 1) * cs])
+            offsets[cy * cols + cx] = pos
+            blocks.append(block)
+            pos += block.nbytes
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, HEADER.size, width, height, cs, code, len(kind_names),
+                             names_offset, index_offset, tiles_offset))
+        fh.write(names)
+        fh.write(b'\0' * (index_offset - names_offset - len(names)))
+        fh.write(offsets.tobytes())
+        for block in blocks:
+            fh.write(block.astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+    os.replace(tmp_path, path)
+
+
+class MapFile:
+    """Read-only, memory-mapped view of a compiled map.
+
+    Chunk reads return NumPy views straight into the mapping, so opening a map and
+    reading the chunks around the camera costs almost nothing regardless of size.
+
+    Usage:
+      with MapFile("maps/spam.llmap") as mf:
+          block = mf.chunk(0, 0)
+          tiles = mf.read_all()
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._fh.close()
+            raise
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise MapFormatError(f"Truncated map file: {path}")
+        (magic, version, header_size, self.width, self.height, self.chunk_size, code, kind_count,
+         names_offset, index_offset, tiles_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or code not in DTYPES:
+            self.close()
+            raise MapFormatError(f"Not a compiled map (or unsupported version): {path}")
+        self.dtype = np.dtype(DTYPES[code]).newbyteorder('<')
+        # file tile value -> game kind index, set by load_map() (None = values used as-is)
+        self.table = None
+
+        names = []
+        pos = names_offset
+        for _ in range(kind_count):
+            n = self._mm[pos]
+            names.append(self._mm[pos + 1:pos + 1 + n].decode('utf-8'))
+            pos += 1 + n
+        self.kind_names = names
+
+        cs = self.chunk_size
+        self.chunk_rows = (self.height + cs - 1) // cs
+        self.chunk_cols = (self.width + cs - 1) // cs
+        self._offsets = np.frombuffer(self._mm, dtype='<u8', count=self.chunk_rows * self.chunk_cols, offset=index_offset)
+
+    def chunk_shape(self, cx, cy):
+        cs = self.chunk_size
+        return min(cs, self.height - cy * cs), min(cs, self.width - cx * cs)
+
+    def chunk(self, cx, cy):
+        """Tiles of chunk (cx, cy) as an (h, w) array view into the mapping."""
+        if not (0 <= cx < self.chunk_cols and 0 <= cy < self.chunk_rows):
+            raise IndexError(f"chunk ({cx},{cy}) outside map")
+        h, w = self.chunk_shape(cx, cy)
+        offset = int(self._offsets[cy * self.chunk_cols + cx])
+        return np.frombuffer(self._mm, dtype=self.dtype, count=h * w, offset=offset).reshape(h, w)
+
+    def read_block(self, x0, y0, x1, y1, fill=0):
+        """Tiles in [x0, x1) x [y0, y1), assembled from the chunks that cover it.
+
+        Cells outside the map are set to `fill`.
+        """
+        out = np.full((max(0, y1 - y0), max(0, x1 - x0)), fill, dtype=self.dtype.newbyteorder('='))
+        cs = self.chunk_size
+        cx0, cy0 = max(0, x0) // cs, max(0, y0) // cs
+        cx1, cy1 = (min(self.width, x1) - 1) // cs, (min(self.height, y1) - 1) // cs
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                block = self.chunk(cx, cy)
+                bx0, by0 = cx * cs, cy * cs
+                sx0, sy0 = max(x0, bx0), max(y0, by0)
+                sx1, sy1 = min(x1, bx0 + block.shape[1]), min(y1, by0 + block.shape[0])
+                if sx0 < sx1 and sy0 < sy1:
+                    out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = block[sy0 - by0:sy1 - by0, sx0 - bx0:sx1 - bx0]
+        return out
+
+    def read_all(self):
+        """The whole map as an (height, width) array (a full copy; prefer read_tiles per region)."""
+        return self.read_block(0, 0, self.width, self.height)
+
+    def read_tiles(self, x0, y0, w, h):
+        """The (h, w) int16 block at (x0, y0) as game kind indices; a RegionStore source.
+
+        Only the chunks covering the block are touched, and only the block is copied.
+        """
+        block = self.read_block(x0, y0, x0 + w, y0 + h)
+        return block.astype(np.int16) if self.table is None else self.table[block]
+
+    def remap_table(self, tile_kinds, default=0):
+        """Lookup table translating file tile values to indices into `tile_kinds` (by name)."""
+        name_to_index = {tk.name: i for i, tk in enumerate(tile_kinds)}
+        return np.array([name_to_index.get(n, default) for n in self.kind_names] or [default], dtype=np.int16)
+
+    def close(self):
+        self._offsets = None
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_map(path, tile_kinds):
+    """Open a compiled map whose tiles read as indices into `tile_kinds`.
+
+    Nothing is read up front: the returned MapFile's read_tiles() pages blocks in
+    from the mapping on demand (pass it to a RegionStore). Close it when done.
+
+    Usage:
+      mf = load_map("maps/spam.llmap", tile_kinds)
+      store = RegionStore(mf.read_tiles, mf.width, mf.height)
+    """
+    mf = MapFile(path)
+    table = mf.remap_table(tile_kinds)
+    if not np.array_equal(table, np.arange(len(table))):
+        # file names do not match the kind order: translate on read
+        mf.table = table
+    return mf
+
+
+def compile_map(src, dst, tile_kinds, max_tiles=None, color_map=None, downsample='majority', chunk_size=32):
+    """Convert an image (+ .palette) or .map text source into a compiled map file.
+
+    Tiles are stored as parsed, before tree sparsification, which Map applies at load.
+    """
+    from .map_io import image_to_tiles, text_to_tiles, find_palette_file_for_image
+    if src.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+        if color_map is None:
+            color_map = find_palette_file_for_image(src)
+        tiles, _ = image_to_tiles(src, tile_kinds, max_tiles=max_tiles, color_map=color_map, downsample=downsample)
+    else:
+        tiles = text_to_tiles(src)
+    write_map(dst, tiles, [tk.name for tk in tile_kinds], chunk_size=chunk_size)
+    return np.shape(tiles)
+
+
+def main(argv=None):
+    import argparse
+    from .tilekind import default_tile_kinds
+    parser = argparse.ArgumentParser(description="Compile a .png/.map map into the binary .llmap format")
+    parser.add_argument('src')
+    parser.add_argument('dst', nargs='?')
+    parser.add_argument('--max-tiles', type=int, default=None)
+    parser.add_argument('--palette', default=None)
+    parser.add_argument('--downsample', default='majority', choices=('majority', 'smooth'))
+    parser.add_argument('--chunk-size', type=int, default=32)
+    args = parser.parse_args(argv)
+    dst = args.dst or os.path.splitext(args.src)[0] + EXTENSION
+    h, w = compile_map(args.src, dst, default_tile_kinds(), max_tiles=args.max_tiles, color_map=args.palette,
+                       downsample=args.downsample, chunk_size=args.chunk_size)
+    print(f"Wrote {dst}: {w}x{h} tiles, {os.path.getsize(dst)} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pygame
 
 
@@ -41,7 +42,7 @@ def build_rep_palette(tile_kinds):
     """Sample a representative color from each TileKind image (top-left-ish pixel)."""
     colors = []
     for tk in tile_kinds:
-        img = tk.image
+        img = getattr(tk, 'source_image', tk.image)
         w, h = img.get_size()
         px = img.get_at((min(1, w - 1), min(1, h - 1)))
         colors.append((px[0], px[1], px[2]))
@@ -59,25 +60,80 @@ def nearest_color_index(color, palette_colors):
     return best
 
 
-def image_to_tiles(map_file, tile_kinds, max_tiles=None, color_map=None):
+def classify_surface(surf, tile_kinds, palette=None):
+    """Vectorized pixel -> tile index classification of a whole surface.
+
+    Colors listed in `palette` map exactly; every other color goes to the nearest
+    representative TileKind color (as nearest_color_index does), computed once per
+    distinct color. Works on the surface's own 32-bit pixel values, so no per-pixel
+    RGB unpacking is needed. Returns an (h, w) int16 array indexed [y][x].
+    """
+    if surf.get_bitsize() != 32:
+        surf32 = pygame.Surface(surf.get_size(), 0, 32)
+        surf32.blit(surf, (0, 0))
+        surf = surf32
+    rmask, gmask, bmask, _ = surf.get_masks()
+    rshift, gshift, bshift, _ = surf.get_shifts()
+    rgb_mask = np.uint32(rmask | gmask | bmask)
+    # surfarray is indexed [x][y]; transpose to rows
+    keys = pygame.surfarray.pixels2d(surf).T & rgb_mask
+
+    classes = np.full(keys.shape, -1, dtype=np.int16)
+    matched = None
+    if palette:
+        pal_keys = np.array([(c[0] << rshift) | (c[1] << gshift) | (c[2] << bshift) for c in palette], dtype=np.uint32)
+        pal_idx = np.array(list(palette.values()), dtype=np.int16)
+        order = np.argsort(pal_keys)
+        pal_keys, pal_idx = pal_keys[order], pal_idx[order]
+        pos = np.searchsorted(pal_keys, keys)
+        np.minimum(pos, len(pal_keys) - 1, out=pos)
+        classes = pal_idx[pos]
+        matched = pal_keys[pos] == keys
+    unmatched = ~matched if matched is not None else np.ones(keys.shape, dtype=bool)
+    if unmatched.any():
+        uniq, inverse = np.unique(keys[unmatched], return_inverse=True)
+        colors = np.stack([(uniq & rmask) >> rshift, (uniq & gmask) >> gshift, (uniq & bmask) >> bshift], axis=1).astype(np.int32)
+        rep = np.array(build_rep_palette(tile_kinds), dtype=np.int32)
+        dist = ((colors[:, None, :] - rep[None, :, :]) ** 2).sum(axis=2)
+        classes[unmatched] = dist.argmin(axis=1).astype(np.int16)[inverse.ravel()]
+    return classes
+
+
+def block_majority(tiles, block_w, block_h, kind_count, out_size=None):
+    """Downsample a tile-index grid by taking the most common index in each block.
+
+    Partial blocks at the right/bottom edges vote with the cells they have. With
+    `out_size=(w, h)` the result has exactly that size instead: the cells left over
+    after whole blocks are spread over the blocks, which are then block_w or
+    block_w + 1 cells wide (likewise for height). All blocks are counted in a single
+    bincount pass over (block, kind) pairs.
+    """
+    h, w = tiles.shape
+    if out_size is None:
+        out_w, out_h = (w + block_w - 1) // block_w, (h + block_h - 1) // block_h
+        cols, rows = np.arange(w) // block_w, np.arange(h) // block_h
+    else:
+        out_w, out_h = out_size
+        cols, rows = np.arange(w) * out_w // w, np.arange(h) * out_h // h
+    block_ids = rows[:, None] * out_w + cols[None, :]
+    counts = np.bincount((block_ids * kind_count + tiles).ravel(), minlength=out_h * out_w * kind_count)
+    return counts.reshape(out_h, out_w, kind_count).argmax(axis=2).astype(np.int16)
+
+
+def image_to_tiles(map_file, tile_kinds, max_tiles=None, color_map=None, downsample='majority'):
     """Load an image file and convert each pixel to a tile index list-of-lists.
 
+    Images larger than `max_tiles` are reduced with `downsample`:
+      'majority' - classify every full-resolution pixel, then keep the most common
+                   tile in each block (palette-exact, no blended colors); blocks
+                   are sized so the result keeps the scaled size
+      'smooth'   - smoothscale the image first, then classify (legacy behavior)
+
     Returns (tiles, (mw,mh)) where tiles is a 2D list.
     """
     surf = pygame.image.load(map_file)
     mw, mh = surf.get_size()
 
-    if max_tiles is not None and (mw > max_tiles or mh > max_tiles):
-        scale = min(max_tiles / mw, max_tiles / mh)
-        new_w = max(1, int(mw * scale))
-        new_h = max(1, int(mh * scale))
-        try:
-            surf = pygame.transform.smoothscale(surf, (new_w, new_h))
-            print(f"Downscaled map image from {mw}x{mh} to {new_w}x{new_h} to limit tiles <= {max_tiles}")
-        except Exception:
-            surf = pygame.transform.scale(surf, (new_w, new_h))
-        mw, mh = surf.get_size()
-
     # build color_map if provided as path
     palette = None
     if isinstance(color_map, str):
@@ -85,24 +141,29 @@ def image_to_tiles(map_file, tile_kinds, max_tiles=None, color_map=None):
     elif isinstance(color_map, dict):
         palette = {tuple(k): v for k, v in color_map.items()}
 
-    rep_palette = None
-    if palette is None:
-        rep_palette = build_rep_palette(tile_kinds)
+    block = None
+    if max_tiles is not None and (mw > max_tiles or mh > max_tiles):
+        scale = min(max_tiles / mw, max_tiles / mh)
+        new_w = max(1, int(mw * scale))
+        new_h = max(1, int(mh * scale))
+        if downsample == 'majority':
+            block = (max(1, mw // new_w), max(1, mh // new_h))
+        else:
+            try:
+                surf = pygame.transform.smoothscale(surf, (new_w, new_h))
+                print(f"Downscaled map image from {mw}x{mh} to {new_w}x{new_h} to limit tiles <= {max_tiles}")
+            except Exception:
+                surf = pygame.transform.scale(surf, (new_w, new_h))
+            mw, mh = surf.get_size()
+
+    tiles = classify_surface(surf, tile_kinds, palette)
 
-    tiles = []
-    for y in range(mh):
-        row = []
-        for x in range(mw):
-            c = surf.get_at((x, y))
-            color = (c[0], c[1], c[2])
-            if palette and color in palette:
-                row.append(palette[color])
-            else:
-                if rep_palette is None:
-                    rep_palette = build_rep_palette(tile_kinds)
-                row.append(nearest_color_index(color, rep_palette))
-        tiles.append(row)
-    return tiles, (mw, mh)
+    if block is not None:
+        tiles = block_majority(tiles, block[0], block[1], len(tile_kinds), out_size=(new_w, new_h))
+        print(f"Downsampled map image from {mw}x{mh} to {new_w}x{new_h} (majority of {block[0]}x{block[1]} blocks) to limit tiles <= {max_tiles}")
+        mw, mh = new_w, new_h
+
+    return tiles.tolist(), (mw, mh)
 
 
 def text_to_tiles(map_file):
@@ -117,10 +178,81 @@ def text_to_tiles(map_file):
     return tiles
 
 
-def sparsify_trees(tiles, tile_kinds, tree_density, clustered=False):
+def neighbor_counts(mask):
+    """Count set cells in each cell's 3x3 neighborhood (a box convolution, center included).
+
+    The 3x3 box kernel is separable, so it is applied as a horizontal then a vertical
+    3-tap sum over a zero-padded uint8 copy.
+    """
+    p = np.pad(np.asarray(mask, dtype=np.uint8), 1)
+    rows = p[:, :-2] + p[:, 1:-1] + p[:, 2:]
+    return rows[:-2] + rows[1:-1] + rows[2:]
+
+
+def _chance(rng, shape, probability):
+    """Boolean array where each cell is True with `probability` (16-bit resolution).
+
+    Raw 64-bit generator output is split into four uint16 draws, which is several
+    times faster than rng.random() on large grids and still fully seeded.
+    """
+    threshold = int(round(min(1.0, max(0.0, probability)) * 65536))
+    if threshold >= 65536:
+        return np.ones(shape, dtype=bool)
+    n = int(np.prod(shape))
+    raw = rng.bit_generator.random_raw((n + 3) // 4).view(np.uint16)[:n]
+    return (raw < threshold).reshape(shape)
+
+
+def _tile_chance(seed, origin, shape, probability, salt=0):
+    """Like _chance, but each cell's draw depends only on (seed, salt) and its map position.
+
+    `origin` is the (x, y) map position of cell [0, 0]. A splitmix64 hash of each
+    coordinate pair replaces the generator stream, so any window of a map gets
+    the same draws as the whole map would.
+    """
+    threshold = int(round(min(1.0, max(0.0, probability)) * 65536))
+    if threshold >= 65536:
+        return np.ones(shape, dtype=bool)
+    mask = (1 << 64) - 1
+    key = np.uint64(((int(seed) & mask) * 0x9E3779B97F4A7C15 + (salt + 1) * 0xD1B54A32D192ED03) & mask)
+    h, w = shape
+    ys = np.arange(origin[1], origin[1] + h, dtype=np.uint64)[:, None]
+    xs = np.arange(origin[0], origin[0] + w, dtype=np.uint64)[None, :]
+    z = ((ys << np.uint64(32)) | xs) ^ key
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(48)) < threshold
+
+
+def _fill_where(grid, mask, value):
+    """In-place grid[mask] = value; branch-free arithmetic is much faster than boolean indexing."""
+    grid -= (grid - grid.dtype.type(value)) * mask.view(np.uint8)
+
+
+def as_tile_grid(tiles):
+    """Convert a 2D list/array of tile indices to an int16 array; ragged rows are padded with 0."""
+    if isinstance(tiles, np.ndarray):
+        return tiles.astype(np.int16, copy=False)
+    width = max((len(r) for r in tiles), default=0)
+    if any(len(r) != width for r in tiles):
+        tiles = [list(r) + [0] * (width - len(r)) for r in tiles]
+    return np.array(tiles, dtype=np.int16).reshape(len(tiles), width)
+
+
+def sparsify_trees(tiles, tile_kinds, tree_density, clustered=False, seed=0, origin=None):
+    """Thin out tree tiles so roughly `tree_density` of them remain.
+
+    With `clustered`, non-tree cells next to a surviving tree become trees with a
+    small probability. Randomness comes from a NumPy Generator seeded with `seed`,
+    so the same map and seed always produce the same result. Given `origin`, the
+    (x, y) map position of tiles[0][0], it instead comes from a per-tile hash, so
+    windows of a larger map sparsify exactly like the whole map (pass one extra
+    tile of context on each side for clustered growth to match at the edges).
+    Accepts a 2D list or array and returns the same kind.
+    """
     if tree_density is None or not (0.0 <= tree_density <= 1.0):
         return tiles
-    import random
 
     tree_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'tree'), None)
     if tree_idx is None:
@@ -130,39 +262,43 @@ def sparsify_trees(tiles, tile_kinds, tree_density, clustered=False):
     dirt_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'dirt'), None)
     replace_idx = grass_idx if grass_idx is not None else (dirt_idx if dirt_idx is not None else 0)
 
-    h = len(tiles)
-    w = len(tiles[0]) if h else 0
-    for y in range(h):
-        for x in range(w):
-            if tiles[y][x] == tree_idx:
-                if random.random() > tree_density:
-                    tiles[y][x] = replace_idx
+    as_list = not isinstance(tiles, np.ndarray)
+    grid = np.array(tiles)
+    if grid.ndim != 2 or grid.size == 0:
+        return tiles
+    if origin is None:
+        rng = np.random.default_rng(seed)
+        chance = lambda p, salt: _chance(rng, grid.shape, p)
+    else:
+        chance = lambda p, salt: _tile_chance(seed, origin, grid.shape, p, salt)
+
+    trees = grid == tree_idx
+    drop = ~chance(tree_density, 0)
+    drop &= trees
+    _fill_where(grid, drop, replace_idx)
 
     if clustered:
-        for y in range(h):
-            for x in range(w):
-                if tiles[y][x] != tree_idx:
-                    neighbors = 0
-                    for ny in range(max(0, y - 1), min(h, y + 2)):
-                        for nx in range(max(0, x - 1), min(w, x + 2)):
-                            if tiles[ny][nx] == tree_idx:
-                                neighbors += 1
-                    if neighbors > 0 and random.random() < 0.02:
-                        tiles[y][x] = tree_idx
-    return tiles
+        trees &= ~drop
+        near_tree = neighbor_counts(trees) > 0
+        grow = near_tree & ~trees
+        grow &= chance(0.02, 1)
+        _fill_where(grid, grow, tree_idx)
+    return grid.tolist() if as_list else grid
 
 
 def scale_tree_images(tile_kinds, tile_size, tree_scale):
+    """Point tree TileKinds at the variant `tile_size * tree_scale` pixels tall.
+
+    Variants are scaled from each kind's pristine source image and cached, so repeated
+    tweaks never rescale an already-scaled image. Returns the indices of kinds whose
+    drawn image changed.
+    """
+    changed = []
     if tree_scale is None:
-        return
-    for tk in tile_kinds:
+        return changed
+    desired_h = max(1, int(tile_size * tree_scale))
+    for idx, tk in enumerate(tile_kinds):
         if tk.name == 'tree':
-            img = tk.image
-            w, h = img.get_size()
-            desired_h = max(1, int(tile_size * tree_scale))
-            if h != desired_h and h != 0:
-                new_w = max(1, int(w * (desired_h / h)))
-                try:
-                    tk.image = pygame.transform.smoothscale(img, (new_w, desired_h))
-                except Exception:
-                    tk.image = pygame.transform.scale(img, (new_w, desired_h))
+            if tk.set_height(desired_h):
+                changed.append(idx)
+    return changed
@@ -1,4 +1,5 @@
 import pygame
+import numpy as np
 from .camera import camera
 import time
 import hashlib
@@ -12,6 +13,17 @@ last_draw_stats = {}
 # Maximum allowed padding multiplier (in tile units) to prevent runaway huge surfaces
 MAX_PADDING_MULTIPLIER = 4
 
+# Map layers in draw order. TileKind.layer says where a kind is drawn; cells whose
+# kind is not on the ground layer show the ground kind underneath.
+LAYERS = ('ground', 'objects', 'overhead')
+# Layers baked as per-row occluder strips and drawn depth-sorted with sprites
+DEPTH_SORTED_LAYERS = ('overhead',)
+
+# Surface formats picked by optimize_surface, cheapest blit first
+SURFACE_FORMATS = ('opaque', 'colorkey', 'alpha')
+# Colorkeys tried for binary-alpha surfaces; the first no visible pixel uses wins
+COLORKEY_CANDIDATES = ((255, 0, 255), (0, 255, 255), (1, 254, 3))
+
 
 def convert_tile_images(tile_kinds):
     for tk in tile_kinds:
@@ -24,21 +36,110 @@ def compute_extra_pixels(tile_kinds, tile_size):
     return max(0, max_w - tile_size), max(0, max_h - tile_size)
 
 
-def create_chunks(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y):
-    if not tiles:
-        return {}
-    map_h = len(tiles)
-    map_w = len(tiles[0]) if map_h else 0
-    cs = chunk_size
+def padding_for_kinds(tile_kinds, kinds, tile_size):
+    """Chunk padding needed by the given tile-kind indices, clamped to MAX_PADDING_MULTIPLIER tiles."""
+    if not kinds:
+        return 0, 0
+    extra_x, extra_y = compute_extra_pixels([tile_kinds[k] for k in kinds], tile_size)
+    max_pad = tile_size * MAX_PADDING_MULTIPLIER
+    return min(extra_x, max_pad), min(extra_y, max_pad)
 
-    cols = (map_w + cs - 1) // cs
-    rows = (map_h + cs - 1) // cs
 
+def _row(tiles, ty, tx0, tx1):
+    """Tiles [tx0, tx1) of row `ty` as plain ints (fast to index from Python loops)."""
+    row = tiles[ty][tx0:tx1]
+    return row.tolist() if hasattr(row, 'tolist') else row
+
+
+def find_tree_and_ground(tile_kinds):
+    """Return (tree_idx, ground_idx) used when compositing trees over ground."""
     tree_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'tree'), None)
     ground_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'grass'), None)
     if ground_idx is None:
         ground_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'dirt'), None)
-
+    return tree_idx, ground_idx
+
+
+def layer_table(tile_kinds, layer):
+    """Lookup table: tile-kind index -> kind drawn on `layer` for that cell (-1 = nothing)."""
+    _, ground_idx = find_tree_and_ground(tile_kinds)
+    ground_idx = -1 if ground_idx is None else ground_idx
+    table = []
+    for idx, tk in enumerate(tile_kinds):
+        kind_layer = getattr(tk, 'layer', 'ground')
+        if layer == 'ground':
+            table.append(idx if kind_layer == 'ground' else ground_idx)
+        else:
+            table.append(idx if kind_layer == layer else -1)
+    return np.array(table, dtype=np.int16)
+
+
+def layer_grid(tiles, tile_kinds, layer):
+    """The part of a tile grid drawn on `layer`, as an int16 array with -1 for empty cells."""
+    return layer_table(tile_kinds, layer)[np.asarray(tiles)]
+
+
+def layer_kinds(tile_kinds, layer):
+    """Indices of the tile kinds that can appear on `layer`."""
+    return sorted(set(layer_table(tile_kinds, layer).tolist()) - {-1})
+
+
+def split_animated(tiles, tile_kinds, tile_size, origin):
+    """Take the animated kinds out of a layer block whose top-left tile is `origin`.
+
+    Returns (tiles without them, [(kind, x, y), ...]): the block to bake, with
+    animated cells set to -1, and the world pixel position of each animated
+    tile's frames (overhanging their cell like baked tiles do).
+    """
+    grid = np.asarray(tiles)
+    # trailing False so empty cells (-1) index it
+    animated = np.array([bool(getattr(tk, 'animated', False)) for tk in tile_kinds] + [False])
+    mask = animated[grid]
+    if not mask.any():
+        return grid, []
+    ox, oy = origin
+    ts = tile_size
+    sizes = np.array([tk.frames[0].get_size() if getattr(tk, 'animated', False) else (ts, ts) for tk in tile_kinds],
+                     dtype=np.int64).reshape(-1, 2)
+    ly, lx = np.nonzero(mask)
+    kinds = grid[ly, lx].astype(np.int64)
+    xs = (ox + lx) * ts - (sizes[kinds, 0] - ts) // 2
+    ys = (oy + ly) * ts - np.maximum(0, sizes[kinds, 1] - ts)
+    rest = grid.copy()
+    rest[mask] = -1
+    return rest, list(zip(kinds.tolist(), xs.tolist(), ys.tolist()))
+
+
+def draw_animated(screen, items, tile_kinds, t):
+    """Blit animated tiles ([(kind, world x, world y), ...]) with the frame each kind shows at time `t`.
+
+    Tiles entirely off screen are skipped; the rest go out in one blits call.
+    Returns the number of tiles drawn.
+    """
+    frames = [tk.frames[tk.frame_index(t)] if getattr(tk, 'animated', False) else tk.image for tk in tile_kinds]
+    sizes = [f.get_size() for f in frames]
+    cam_x, cam_y = camera.x, camera.y
+    sw, sh = screen.get_size()
+    blits = []
+    for k, x, y in items:
+        sx, sy = int(x - cam_x), int(y - cam_y)
+        w, h = sizes[k]
+        if sx < sw and sy < sh and sx + w > 0 and sy + h > 0:
+            blits.append((frames[k], (sx, sy)))
+    screen.blits(blits, False)
+    return len(blits)
+
+
+def fit_chunk_padding(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y):
+    """Grow (extra_x, extra_y) until every tile image fits inside its chunk surface.
+
+    Padding is bounded by MAX_PADDING_MULTIPLIER tiles to avoid huge surfaces.
+    """
+    map_h = len(tiles)
+    map_w = len(tiles[0]) if map_h else 0
+    cs = chunk_size
+    cols = (map_w + cs - 1) // cs
+    rows = (map_h + cs - 1) // cs
     tile = tile_size
 
     # Attempt to ensure the provided extra_x/extra_y are sufficient to contain all tile images inside a chunk.
@@ -49,8 +150,6 @@ def create_chunks(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y):
     needed_extra_x = 0
     needed_extra_y = 0
 
-
-
     for it in range(max_iters):
         needed_extra_x = 0
         needed_extra_y = 0
@@ -65,9 +164,9 @@ def create_chunks(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y):
                 ty1 = min(map_h, (cy + 1) * cs)
 
                 for ty in range(ty0, ty1):
-                    row = tiles[ty]
+                    row = _row(tiles, ty, tx0, tx1)
                     for tx in range(tx0, tx1):
-                        t = row[tx]
+                        t = row[tx - tx0]
                         img = tile_kinds[t].image
                         x_offset = (img.get_width() - tile) // 2
                         y_offset = max(0, img.get_height() - tile)
@@ -104,80 +203,427 @@ def create_chunks(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y):
     if (needed_extra_x or needed_extra_y) and (it == max_iters - 1):
         print(f"Warning: chunk padding still insufficient after {max_iters} attempts (extra_x={extra_x_cur}, extra_y={extra_y_cur}).")
 
-    # Now build the actual chunk surfaces using the (possibly adjusted) padding
-    chunks = {}
-    clipped = []
-    for cy in range(rows):
-        for cx in range(cols):
-            chunk_pixel_w = cs * tile + 2 * extra_x_cur
-            chunk_pixel_h = cs * tile + 2 * extra_y_cur
-            surf = pygame.Surface((chunk_pixel_w, chunk_pixel_h), pygame.SRCALPHA)
-            tx0 = cx * cs
-            ty0 = cy * cs
-            tx1 = min(map_w, (cx + 1) * cs)
-            ty1 = min(map_h, (cy + 1) * cs)
-
-            # Precomposite tree+ground surfaces
-            composite_cache = {}
-            for ty in range(ty0, ty1):
-                row = tiles[ty]
-                for tx in range(tx0, tx1):
-                    t = row[tx]
-                    img_key = t
-                    if t == tree_idx and ground_idx is not None:
-                        # Create composite image if not cached
-                        img_key = (t, ground_idx)
-                        if img_key not in composite_cache:
-                            ground_img = tile_kinds[ground_idx].image
-                            # Create surface tall enough for both ground and tree
-                            ground_w, ground_h = ground_img.get_size()
-                            tree_w, tree_h = tile_kinds[t].image.get_size()
-                            comp_h = max(ground_h, tree_h)
-                            composite = pygame.Surface((ground_w, comp_h), pygame.SRCALPHA)
-                            composite.blit(ground_img, (0, comp_h - ground_h))  # Align ground to bottom
-                            # Center tree horizontally, align to bottom
-                            composite.blit(tile_kinds[t].image, 
-                                         ((ground_w - tree_w) // 2, 
-                                          comp_h - tree_h))
-                            composite_cache[img_key] = composite
-                        img = composite_cache[img_key]
-                    else:
-                        img = tile_kinds[t].image
-                        if t not in composite_cache:
-                            composite_cache[t] = img
-                        img = composite_cache[t]
-                    x_offset = (img.get_width() - tile) // 2
-                    y_offset = max(0, img.get_height() - tile)
-                    local_x = extra_x_cur + (tx - tx0) * tile - x_offset
-                    local_y = extra_y_cur + (ty - ty0) * tile - y_offset
-
-                    # Detect if this blit would be partially outside the chunk surface
-                    iw, ih = img.get_width(), img.get_height()
-                    out_left = local_x < 0
-                    out_top = local_y < 0
-                    out_right = (local_x + iw) > chunk_pixel_w
-                    out_bottom = (local_y + ih) > chunk_pixel_h
-                    if out_left or out_top or out_right or out_bottom:
-                        clipped.append((cx, cy, tx, ty, iw, ih, int(local_x), int(local_y), chunk_pixel_w, chunk_pixel_h))
-
-                    surf.blit(img, (int(local_x), int(local_y)))
-
-            chunks[(cx, cy)] = surf
+    return extra_x_cur, extra_y_cur
+
+
+def plan_chunk(tiles, tile_kinds, tile_size, chunk_size, cx, cy, extra_x, extra_y, clipped=None, opaque=False):
+    """Layout of chunk (cx, cy) without compositing: ((w, h), [(kind, x, y), ...], opaque).
+
+    Items are in draw order; cells < 0 are skipped. `opaque` is kept only for an
+    unpadded chunk covering a whole chunk of the map. Used by bake_chunk and by
+    the multiprocess baker, which rasterizes the same layout in worker processes.
+    """
+    map_h = len(tiles)
+    map_w = len(tiles[0]) if map_h else 0
+    cs = chunk_size
+    tile = tile_size
+    chunk_pixel_w = cs * tile + 2 * extra_x
+    chunk_pixel_h = cs * tile + 2 * extra_y
+    tx0 = cx * cs
+    ty0 = cy * cs
+    tx1 = min(map_w, (cx + 1) * cs)
+    ty1 = min(map_h, (cy + 1) * cs)
+    opaque = bool(opaque and not extra_x and not extra_y and tx1 - tx0 == cs and ty1 - ty0 == cs)
+    sizes = np.array([tk.image.get_size() for tk in tile_kinds], dtype=np.int64).reshape(-1, 2)
+    block = np.asarray(tiles)[ty0:ty1, tx0:tx1]
+    ly, lx = np.nonzero(block >= 0)
+    kinds = block[ly, lx].astype(np.int64)
+    iw, ih = sizes[kinds, 0], sizes[kinds, 1]
+    local_x = extra_x + lx * tile - (iw - tile) // 2
+    local_y = extra_y + ly * tile - np.maximum(0, ih - tile)
+    if clipped is not None:
+        out = (local_x < 0) | (local_y < 0) | (local_x + iw > chunk_pixel_w) | (local_y + ih > chunk_pixel_h)
+        for i in np.nonzero(out)[0].tolist():
+            clipped.append((cx, cy, tx0 + int(lx[i]), ty0 + int(ly[i]), int(iw[i]), int(ih[i]), int(local_x[i]), int(local_y[i]), chunk_pixel_w, chunk_pixel_h))
+    items = list(zip(kinds.tolist(), local_x.tolist(), local_y.tolist()))
+    return (chunk_pixel_w, chunk_pixel_h), items, opaque
+
+
+def new_chunk_surface(size, opaque):
+    """Blank chunk surface: opaque display-format when possible, else transparent SRCALPHA."""
+    if opaque:
+        display = pygame.display.get_surface()
+        # created straight in the display's pixel format (no convert() copy)
+        return pygame.Surface(size, 0, display) if display is not None else pygame.Surface(size)
+    return pygame.Surface(size, pygame.SRCALPHA)
+
+
+# Stacked pixels of the tile kinds the NumPy rasterizer can draw, per surface format
+# (rebuilt when tile images change)
+_atlas_cache = {}
+
+
+def _rasterizable(img, tile_size):
+    if img.get_size() != (tile_size, tile_size) or img.get_colorkey() is not None or img.get_alpha() not in (None, 255):
+        return False
+    if img.get_flags() & pygame.SRCALPHA:
+        return bool((pygame.surfarray.pixels_alpha(img) == 255).all())
+    return True
+
+
+def tile_atlas(tile_kinds, tile_size, surf):
+    """(pixels, drawable) for rasterizing tiles into surfaces formatted like `surf`.
+
+    pixels is a (kinds + 1, tile, tile) array of `surf`-format pixel values in row
+    order, whose last entry is blank (0: black, or transparent on SRCALPHA
+    surfaces); drawable[k] says kind k is an opaque tile-sized image and can be
+    copied instead of blitted.
+    """
+    images = tuple(tk.image for tk in tile_kinds)
+    fmt = (surf.get_bitsize(), surf.get_masks(), surf.get_flags() & pygame.SRCALPHA)
+    if _atlas_cache.get('key') != (tile_size, images):
+        _atlas_cache.clear()
+        _atlas_cache['key'] = (tile_size, images)
+    atlas = _atlas_cache.get(fmt)
+    if atlas is not None:
+        return atlas
+    pixels = np.zeros((len(images) + 1, tile_size, tile_size), dtype=np.uint32)
+    drawable = np.zeros(len(images) + 1, dtype=bool)
+    for k, img in enumerate(images):
+        try:
+            if _rasterizable(img, tile_size):
+                pixels[k] = pygame.surfarray.map_array(surf, pygame.surfarray.array3d(img)).T
+                drawable[k] = True
+        except Exception:
+            pass
+    _atlas_cache[fmt] = (pixels, drawable)
+    return pixels, drawable
+
+
+def rasterize_items(surf, items, tile_kinds, tile_size):
+    """Copy the opaque tile-sized items of a layout into `surf` in one NumPy operation.
+
+    The covered cells are gathered into a tile-index grid, which fancy-indexes the
+    stacked tile pixels; the result is reshaped into the chunk's pixel buffer and
+    written through surfarray. Cells without such a tile are written blank, exactly
+    as the fresh surface was. Returns the items still to be blitted (small or alpha
+    tiles), or all of them when the layout has images larger than a tile (their
+    overhang would overlap neighbouring cells, so draw order matters).
+    """
+    if not items or surf.get_bytesize() != 4:
+        return items
+    sizes = [tk.image.get_size() for tk in tile_kinds]
+    if any(sizes[t][0] > tile_size or sizes[t][1] > tile_size for t in set(t for t, _, _ in items)):
+        return items
+    pixels, drawable = tile_atlas(tile_kinds, tile_size, surf)
+    arr = np.array(items, dtype=np.int64)
+    kinds, xs, ys = arr[:, 0], arr[:, 1], arr[:, 2]
+    raster = drawable[kinds]
+    if not raster.any():
+        return items
+    # drawable items are tile-sized, so they all sit on one cell grid
+    ox, oy = int(xs[raster][0]) % tile_size, int(ys[raster][0]) % tile_size
+    gx, gy = (xs[raster] - ox) // tile_size, (ys[raster] - oy) // tile_size
+    gx0, gy0 = int(gx.min()), int(gy.min())
+    grid = np.full((int(gy.max()) - gy0 + 1, int(gx.max()) - gx0 + 1), len(tile_kinds), dtype=np.int64)
+    grid[gy - gy0, gx - gx0] = kinds[raster]
+    gh, gw = grid.shape
+    x0, y0 = ox + gx0 * tile_size, oy + gy0 * tile_size
+    view = pygame.surfarray.pixels2d(surf)
+    # .T is the surface's own row-major layout; split it into (cell row, y, cell col, x)
+    # so the gathered tiles are written straight into the pixel buffer
+    dest = view.T[y0:y0 + gh * tile_size, x0:x0 + gw * tile_size]
+    dest.shape = (gh, tile_size, gw, tile_size)
+    dest.transpose(0, 2, 1, 3)[...] = pixels[grid]
+    del dest, view
+    return [item for item, r in zip(items, raster.tolist()) if not r]
+
+
+def render_plan(size, items, opaque, tile_kinds, tile_size=None):
+    """Rasterize a chunk or strip layout from plan_chunk/plan_strips into a new surface.
+
+    With `tile_size`, opaque tile-sized tiles are copied with rasterize_items and
+    only the rest are blitted.
+    """
+    surf = new_chunk_surface(size, opaque)
+    if tile_size:
+        items = rasterize_items(surf, items, tile_kinds, tile_size)
+    surf.blits([(tile_kinds[t].image, (x, y)) for t, x, y in items], False)
+    return surf
+
+
+def surface_format(surf):
+    """Which of SURFACE_FORMATS a baked surface uses."""
+    if surf.get_flags() & pygame.SRCALPHA:
+        return 'alpha'
+    if surf.get_colorkey() is not None:
+        return 'colorkey'
+    return 'opaque'
+
+
+def optimize_surface(surf):
+    """Return `surf` in the cheapest display format that blits identically.
+
+    Fully opaque surfaces are converted without alpha; surfaces whose alpha is only
+    ever 0 or 255 become colorkeyed, RLE-accelerated opaque surfaces; anything with
+    partial alpha keeps per-pixel alpha (in display format). Needs a display.
+    """
+    display = pygame.display.get_surface()
+    if display is None or not surf.get_flags() & pygame.SRCALPHA:
+        return surf
+    alpha = pygame.surfarray.array_alpha(surf)
+    if alpha.min() == 255:
+        return surf.convert()
+    visible = alpha == 255
+    if not (visible | (alpha == 0)).all():
+        return surf.convert_alpha()
+    out = surf.convert()
+    pixels = pygame.surfarray.pixels2d(out)
+    used = pixels[visible]
+    for key in COLORKEY_CANDIDATES:
+        mapped = out.map_rgb(key)
+        if not (used == mapped).any():
+            pixels[~visible] = mapped
+            del pixels
+            out.set_colorkey(key, pygame.RLEACCEL)
+            return out
+    del pixels
+    return surf.convert_alpha()
+
+
+def bake_chunk(tiles, tile_kinds, tile_size, chunk_size, cx, cy, extra_x, extra_y, composite_cache=None, clipped=None, composite=True, opaque=False):
+    """Render chunk (cx, cy) into a new padded SRCALPHA surface.
+
+    `composite_cache` may be shared between calls so tree+ground composites are built
+    once per bake pass; `clipped` collects tiles that did not fit the padding.
+    With `composite=False` trees are drawn alone (layered maps), cells < 0 are
+    skipped, and `opaque` bakes an unpadded chunk that covers a whole chunk of the
+    map into an opaque display-format surface instead (see plan_chunk).
+    """
+    if not composite:
+        return render_plan(*plan_chunk(tiles, tile_kinds, tile_size, chunk_size, cx, cy, extra_x, extra_y, clipped, opaque), tile_kinds, tile_size)
 
+    map_h = len(tiles)
+    map_w = len(tiles[0]) if map_h else 0
+    cs = chunk_size
+    tile = tile_size
+    tree_idx, ground_idx = find_tree_and_ground(tile_kinds)
+    if composite_cache is None:
+        composite_cache = {}
+
+    chunk_pixel_w = cs * tile + 2 * extra_x
+    chunk_pixel_h = cs * tile + 2 * extra_y
+    tx0 = cx * cs
+    ty0 = cy * cs
+    tx1 = min(map_w, (cx + 1) * cs)
+    ty1 = min(map_h, (cy + 1) * cs)
+    surf = pygame.Surface((chunk_pixel_w, chunk_pixel_h), pygame.SRCALPHA)
+
+    # Precomposite tree+ground surfaces
+    for ty in range(ty0, ty1):
+        row = _row(tiles, ty, tx0, tx1)
+        for tx in range(tx0, tx1):
+            t = row[tx - tx0]
+            img_key = t
+            if t == tree_idx and ground_idx is not None:
+                # Create composite image if not cached
+                img_key = (t, ground_idx)
+                if img_key not in composite_cache:
+                    ground_img = tile_kinds[ground_idx].image
+                    # Create surface tall enough for both ground and tree
+                    ground_w, ground_h = ground_img.get_size()
+                    tree_w, tree_h = tile_kinds[t].image.get_size()
+                    comp_h = max(ground_h, tree_h)
+                    comp = pygame.Surface((ground_w, comp_h), pygame.SRCALPHA)
+                    comp.blit(ground_img, (0, comp_h - ground_h))  # Align ground to bottom
+                    # Center tree horizontally, align to bottom
+                    comp.blit(tile_kinds[t].image,
+                              ((ground_w - tree_w) // 2,
+                               comp_h - tree_h))
+                    composite_cache[img_key] = comp
+                img = composite_cache[img_key]
+            else:
+                img = tile_kinds[t].image
+            x_offset = (img.get_width() - tile) // 2
+            y_offset = max(0, img.get_height() - tile)
+            local_x = extra_x + (tx - tx0) * tile - x_offset
+            local_y = extra_y + (ty - ty0) * tile - y_offset
+
+            # Detect if this blit would be partially outside the chunk surface
+            iw, ih = img.get_width(), img.get_height()
+            out_left = local_x < 0
+            out_top = local_y < 0
+            out_right = (local_x + iw) > chunk_pixel_w
+            out_bottom = (local_y + ih) > chunk_pixel_h
+            if (out_left or out_top or out_right or out_bottom) and clipped is not None:
+                clipped.append((cx, cy, tx, ty, iw, ih, int(local_x), int(local_y), chunk_pixel_w, chunk_pixel_h))
+
+            surf.blit(img, (int(local_x), int(local_y)))
+    return surf
+
+
+def plan_strips(tiles, tile_kinds, tile_size, origin):
+    """Layout of the occluder strips of a layer block: [(depth, (x, y), (w, h), [(kind, x, y), ...])].
+
+    `tiles` is a block of layer cells (-1 = empty) whose top-left tile is `origin`.
+    (x, y) is the strip's world position; item positions are relative to it.
+    """
+    ox, oy = origin
+    ts = tile_size
+    sizes = [tk.image.get_size() for tk in tile_kinds]
+    strips = []
+    for ly, row in enumerate(np.asarray(tiles).tolist()):
+        ty = oy + ly
+        items = []
+        for lx, t in enumerate(row):
+            if t < 0:
+                continue
+            iw, ih = sizes[t]
+            items.append((t, (ox + lx) * ts - (iw - ts) // 2, ty * ts - max(0, ih - ts), iw, ih))
+        if not items:
+            continue
+        x0 = min(it[1] for it in items)
+        y0 = min(it[2] for it in items)
+        x1 = max(it[1] + it[3] for it in items)
+        y1 = max(it[2] + it[4] for it in items)
+        strips.append(((ty + 1) * ts, (x0, y0), (x1 - x0, y1 - y0), [(t, x - x0, y - y0) for t, x, y, _, _ in items]))
+    return strips
+
+
+def bake_strips(tiles, tile_kinds, tile_size, origin):
+    """Bake each tile row of a layer block into one tight occluder strip.
+
+    Returns [(depth, surface, (x, y))] in world pixels, where depth is the bottom
+    edge of the row: sprites whose feet are above it are drawn behind the strip.
+    """
+    return [(depth, render_plan(size, items, False, tile_kinds), pos)
+            for depth, pos, size, items in plan_strips(tiles, tile_kinds, tile_size, origin)]
+
+
+def draw_depth_sorted(screen, strips, sprites=(), formats=None, entities=()):
+    """Draw occluder strips and sprites back to front in one batched blits call.
+
+    Sprites sort by the bottom of their image (their feet); on ties the sprite is
+    drawn in front. `entities` are stores with depth_items() (see entities.py)
+    whose draw lists are built in bulk rather than per sprite object. Returns the
+    number of surfaces drawn; `formats` (a dict), if given, counts the drawn
+    strips by surface format.
+    """
+    cam_x, cam_y = camera.x, camera.y
+    sw, sh = screen.get_size()
+    items = []
+    for depth, surf, (x, y) in strips:
+        sx, sy = x - cam_x, y - cam_y
+        if sx < sw and sy < sh and sx + surf.get_width() > 0 and sy + surf.get_height() > 0:
+            items.append((depth, 0, x, surf, (sx, sy)))
+            if formats is not None:
+                fmt = surface_format(surf)
+                formats[fmt] = formats.get(fmt, 0) + 1
+    for spr in sprites:
+        img = spr.image
+        items.append((spr.y + img.get_height(), 1, spr.x, img, (int(spr.x - cam_x), int(spr.y - cam_y))))
+    for store in entities:
+        items.extend(store.depth_items(cam_x, cam_y, sw, sh))
+    items.sort(key=lambda it: it[:3])
+    screen.blits([(it[3], it[4]) for it in items], False)
+    return len(items)
+
+
+def report_clipped(clipped):
     if clipped:
         print(f"Warning: detected {len(clipped)} clipped tile(s) while building chunks")
         for ex in clipped[:6]:
             cx, cy, tx, ty, iw, ih, lx, ly, cw, ch = ex
             print(f"  chunk=({cx},{cy}) tile=({tx},{ty}) img={iw}x{ih} local=({lx},{ly}) chunk={cw}x{ch}")
 
-    return chunks
 
+def create_chunks(tiles, tile_kinds, tile_size, chunk_size, extra_x, extra_y, fit_padding=True, padding_for=None):
+    """Bake every chunk of the map.
 
-def draw_map(screen, tiles, tile_kinds, tile_size, chunks, extra_px_x, extra_px_y, debug=False):
-    if not tiles:
-        return
+    By default all chunks share (extra_x, extra_y), grown by fit_chunk_padding until
+    every tile fits. `padding_for(cx, cy)` can instead size each chunk individually.
+    """
+    if len(tiles) == 0:
+        return {}
     map_h = len(tiles)
     map_w = len(tiles[0]) if map_h else 0
+    cs = chunk_size
+
+    cols = (map_w + cs - 1) // cs
+    rows = (map_h + cs - 1) // cs
+
+    extra_x_cur, extra_y_cur = int(extra_x), int(extra_y)
+    if fit_padding and padding_for is None:
+        extra_x_cur, extra_y_cur = fit_chunk_padding(tiles, tile_kinds, tile_size, cs, extra_x, extra_y)
+
+    # Now build the actual chunk surfaces using the (possibly adjusted) padding
+    chunks = {}
+    clipped = []
+    composite_cache = {}
+    for cy in range(rows):
+        for cx in range(cols):
+            pad_x, pad_y = padding_for(cx, cy) if padding_for else (extra_x_cur, extra_y_cur)
+            chunks[(cx, cy)] = optimize_surface(bake_chunk(tiles, tile_kinds, tile_size, cs, cx, cy, pad_x, pad_y, composite_cache, clipped))
+
+    report_clipped(clipped)
+    return chunks
+
+
+def build_kind_index(tiles, tile_kinds, chunk_size, composite=True):
+    """Reverse index: tile-kind index -> set of chunk keys whose pixels depend on it.
+
+    With `composite`, chunks holding trees also depend on the ground kind they are
+    composited over. Cells < 0 (empty layer cells) are ignored.
+    """
+    index = {}
+    grid = np.asarray(tiles)
+    if grid.ndim != 2 or grid.size == 0:
+        return index
+    cs = chunk_size
+    map_h, map_w = grid.shape
+    rows = (map_h + cs - 1) // cs
+    cols = (map_w + cs - 1) // cs
+    # pad to whole chunks with -1 so every chunk is a (cs, cs) block
+    padded = np.full((rows * cs, cols * cs), -1, dtype=np.int32)
+    padded[:map_h, :map_w] = grid
+    blocks = padded.reshape(rows, cs, cols, cs)
+    tree_idx, ground_idx = find_tree_and_ground(tile_kinds)
+    present = {k: np.any(blocks == k, axis=(1, 3)) for k in range(len(tile_kinds))}
+    if composite and tree_idx is not None and ground_idx is not None:
+        present[ground_idx] = present[ground_idx] | present[tree_idx]
+    for k, mask in present.items():
+        cys, cxs = np.nonzero(mask)
+        if len(cys):
+            index[k] = set(zip(cxs.tolist(), cys.tolist()))
+    return index
+
+
+def changed_chunks(old_tiles, new_tiles, chunk_size):
+    """Vectorized diff of two equally-sized tile grids.
+
+    Returns (changed_tile_count, set of chunk keys covering the changed tiles).
+    """
+    diff = np.asarray(old_tiles) != np.asarray(new_tiles)
+    ys, xs = np.nonzero(diff)
+    if not len(ys):
+        return 0, set()
+    keys = np.unique(np.stack([xs // chunk_size, ys // chunk_size], axis=1), axis=0)
+    return int(len(ys)), set(map(tuple, keys.tolist()))
+
+
+def _chunk_padding(surf, chunk_size, tile_size):
+    w, h = surf.get_size()
+    span = chunk_size * tile_size
+    return (w - span) // 2, (h - span) // 2
+
+
+def draw_map(screen, tiles, tile_kinds, tile_size, chunks, extra_px_x, extra_px_y, debug=False, chunk_size=None, map_size=None, tile_at=None):
+    """Blit the visible chunk surfaces.
+
+    (extra_px_x, extra_px_y) is the largest chunk padding, used to widen the visible
+    range. When `chunk_size` is given, each chunk's own padding is derived from its
+    surface size, so chunks may be padded differently. Streamed maps pass `tiles=None`
+    with `map_size=(w, h)` and a `tile_at(x, y)` lookup for the debug overlay.
+    """
+    if map_size is not None:
+        map_w, map_h = map_size
+    else:
+        if len(tiles) == 0:
+            return
+        map_h = len(tiles)
+        map_w = len(tiles[0]) if map_h else 0
+    if tile_at is None:
+        tile_at = lambda x, y: tiles[y][x]
     if map_w == 0 or map_h == 0:
         return
 
@@ -208,14 +654,16 @@ def draw_map(screen, tiles, tile_kinds, tile_size, chunks, extra_px_x, extra_px_
             #    screen.blit(img, (x_loc, y_loc))
       #  return
 
-    cs = chunk_size = None
-    # infer chunk size from chunk surface dimensions
-    if chunks:
-        first = next(iter(chunks.values()))
-        chunk_pixel_w, chunk_pixel_h = first.get_size()
-        cs = (chunk_pixel_w - 2 * extra_px_x) // tile_size if tile_size else 8
-    else:
-        cs = 8
+    cs = chunk_size
+    per_chunk_padding = bool(cs)
+    if not per_chunk_padding:
+        # infer chunk size from chunk surface dimensions
+        if chunks:
+            first = next(iter(chunks.values()))
+            chunk_pixel_w, chunk_pixel_h = first.get_size()
+            cs = (chunk_pixel_w - 2 * extra_px_x) // tile_size if tile_size else 8
+        else:
+            cs = 8
 
     start_cx = start_x // cs
     end_cx = end_x // cs
@@ -224,36 +672,44 @@ def draw_map(screen, tiles, tile_kinds, tile_size, chunks, extra_px_x, extra_px_
 
     # Blit visible chunk surfaces and count how many we drew (for performance diagnostics)
     blit_count = 0
+    formats = {}
+    drawn = []
     start_ts = time.perf_counter()
     for cy in range(start_cy, end_cy + 1):
         for cx in range(start_cx, end_cx + 1):
             surf = chunks.get((cx, cy))
             if surf is None:
                 continue
-            blit_x = cx * cs * tile_size - extra_px_x - camera.x
-            blit_y = cy * cs * tile_size - extra_px_y - camera.y
+            pad_x, pad_y = _chunk_padding(surf, cs, tile_size) if per_chunk_padding else (extra_px_x, extra_px_y)
+            blit_x = cx * cs * tile_size - pad_x - camera.x
+            blit_y = cy * cs * tile_size - pad_y - camera.y
             screen.blit(surf, (int(blit_x), int(blit_y)))
             blit_count += 1
+            drawn.append(surf)
     end_ts = time.perf_counter()
+    for surf in drawn:
+        fmt = surface_format(surf)
+        formats[fmt] = formats.get(fmt, 0) + 1
 
     # Record draw stats
     global last_draw_stats
-    last_draw_stats = {'draw_ms': (end_ts - start_ts) * 1000.0, 'chunk_blits': blit_count, 'visible_cx_range': (start_cx, end_cx), 'visible_cy_range': (start_cy, end_cy)}
+    last_draw_stats = {'draw_ms': (end_ts - start_ts) * 1000.0, 'chunk_blits': blit_count, 'blit_formats': formats, 'visible_cx_range': (start_cx, end_cx), 'visible_cy_range': (start_cy, end_cy)}
 
     # Debug overlay: chunk borders and tile bounding boxes
     if debug:
         # draw chunk borders
         for (cx, cy), surf in chunks.items():
             cw, ch = surf.get_size()
-            blit_x = cx * cs * tile_size - extra_px_x - camera.x
-            blit_y = cy * cs * tile_size - extra_px_y - camera.y
+            pad_x, pad_y = _chunk_padding(surf, cs, tile_size) if per_chunk_padding else (extra_px_x, extra_px_y)
+            blit_x = cx * cs * tile_size - pad_x - camera.x
+            blit_y = cy * cs * tile_size - pad_y - camera.y
             pygame.draw.rect(screen, (0, 0, 255), (int(blit_x), int(blit_y), int(cw), int(ch)), 1)
 
         # draw tile bounding boxes (red) for visible tiles
         tree_idx = next((i for i, tk in enumerate(tile_kinds) if tk.name == 'tree'), None)
         for y in range(start_y, end_y + 1):
             for x in range(start_x, end_x + 1):
-                t = tiles[y][x]
+                t = tile_at(x, y)
                 img = tile_kinds[t].image
                 x_offset = (img.get_width() - tile_size) // 2
                 y_offset = max(0, img.get_height() - tile_size)
@@ -0,0 +1,123 @@
+import os
+import time
+import weakref
+import tracemalloc
+import pygame
+import numpy as np
+from .assets import assets, surface_bytes
+
+# Categories in report order
+CATEGORIES = ('surfaces', 'tiles', 'caches', 'entities')
+# Python allocation sites listed in dumps (and growth since the previous dump)
+TOP_ALLOCATIONS = 15
+
+
+def object_bytes(obj):
+    """Bytes held by a tracked object: a Surface, NumPy array, bytes-like object or a plain count."""
+    if isinstance(obj, pygame.Surface):
+        return surface_bytes(obj)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    return int(obj or 0)
+
+
+class MemoryTracker:
+    """Bytes per category and owner, for budgets and leak hunting.
+
+    Owners are registered with track() and held weakly; each must have a
+    memory_items() method yielding (category, label, object) for the surfaces,
+    tile arrays and caches it holds. The asset cache is always included. Objects
+    reachable from several owners (e.g. a cached image also used by a sprite) are
+    counted once. When tracemalloc is tracing, reports also include the Python
+    heap, and dumps list the top allocation sites and their growth since the
+    previous dump, which is how leaks across save/load cycles show up.
+
+    Usage:
+      memory.track(game_map)
+      rep = memory.report()
+      memory.dump("memory_report.txt")
+    """
+    def __init__(self):
+        self._owners = weakref.WeakValueDictionary()
+        self._last_snapshot = None
+
+    def track(self, owner):
+        self._owners[id(owner)] = owner
+        return owner
+
+    def untrack(self, owner):
+        self._owners.pop(id(owner), None)
+
+    def start_tracing(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def _items(self):
+        for key, refs, surf in assets.surfaces():
+            name = os.path.basename(key[0]) + (f" {key[1][0]}x{key[1][1]}" if key[1] else '')
+            yield 'caches', 'asset cache' if refs else 'asset cache (unreferenced)', surf, name
+        for owner in list(self._owners.values()):
+            try:
+                for category, label, obj in owner.memory_items():
+                    yield category, label, obj, None
+            except Exception as e:
+                print(f"[memory] {type(owner).__name__}.memory_items failed: {e}")
+
+    def report(self):
+        """{'categories': {category: {label: bytes}}, 'totals': {category: bytes}, 'owners': {type: live count}, 'python': {...}}."""
+        categories = {c: {} for c in CATEGORIES}
+        seen = set()
+        for category, label, obj, _ in self._items():
+            if not isinstance(obj, int):
+                if id(obj) in seen:
+                    continue
+                seen.add(id(obj))
+            bucket = categories.setdefault(category, {})
+            bucket[label] = bucket.get(label, 0) + object_bytes(obj)
+        owners = {}
+        for owner in list(self._owners.values()):
+            owners[type(owner).__name__] = owners.get(type(owner).__name__, 0) + 1
+        python = {'tracing': tracemalloc.is_tracing()}
+        if python['tracing']:
+            python['current'], python['peak'] = tracemalloc.get_traced_memory()
+        return {
+            'categories': categories,
+            'totals': {c: sum(v.values()) for c, v in categories.items()},
+            'owners': owners,
+            'python': python,
+        }
+
+    def dump(self, path):
+        """Write a full breakdown to `path` (appending, timestamped) and return the report."""
+        rep = self.report()
+        lines = [f"=== Memory report {time.strftime('%Y-%m-%d %H:%M:%S')} ==="]
+        for category in rep['categories']:
+            lines.append(f"{category}: {rep['totals'][category] / 1048576:.2f} MB")
+            for label, nbytes in sorted(rep['categories'][category].items(), key=lambda kv: -kv[1]):
+                lines.append(f"  {label}: {nbytes / 1048576:.2f} MB")
+        lines.append("asset cache entries:")
+        for category, label, obj, name in self._items():
+            if name is not None:
+                lines.append(f"  {name}: {object_bytes(obj) / 1024:.1f} KB ({label})")
+        lines.append("live owners: " + ', '.join(f"{k} {v}" for k, v in sorted(rep['owners'].items())))
+        if rep['python']['tracing']:
+            lines.append(f"python heap: {rep['python']['current'] / 1048576:.2f} MB (peak {rep['python']['peak'] / 1048576:.2f} MB)")
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            lines.append("top allocations:")
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                lines.append(f"  {stat.traceback[0].filename}:{stat.traceback[0].lineno}: {stat.size / 1024:.1f} KB in {stat.count} blocks")
+            if self._last_snapshot is not None:
+                lines.append("growth since previous dump:")
+                for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:TOP_ALLOCATIONS]:
+                    lines.append(f"  {stat.traceback[0].filename}:{stat.traceback[0].lineno}: {stat.size_diff / 1024:+.1f} KB ({stat.count_diff:+d} blocks)")
+            self._last_snapshot = snapshot
+        else:
+            lines.append("python heap: not traced (set memory_tracemalloc in config.json)")
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write('\n'.join(lines) + '\n\n')
+        return rep
+
+
+memory = MemoryTracker()
@@ -1,26 +1,40 @@
 import pygame
 import sys
 import os
+try:
+    from .assets import assets
+    from .input import input_state
+except ImportError:
+    # imported as a top-level module (main.py run as a script): share the package's cache
+    _repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if _repo_root not in sys.path:
+        sys.path.insert(0, _repo_root)
+    from LogicLock.assets import assets
+    from LogicLock.input import input_state
 
 
 def _asset_path(name):
     return os.path.join(os.path.dirname(__file__), 'images', name)
 
 
-def _load_image_if_exists(name):
+def _load_image_if_exists(name, acquired=None):
+    """Acquire images/<name> from the asset cache, or None if missing.
+
+    The path is appended to `acquired` (if given) so the caller can release it.
+    """
     path = _asset_path(name)
     if os.path.exists(path):
         try:
-            return pygame.image.load(path).convert_alpha()
+            surf = assets.acquire(path)
         except Exception:
-            try:
-                return pygame.image.load(path)
-            except Exception:
-                return None
+            return None
+        if acquired is not None:
+            acquired.append(path)
+        return surf
     return None
 
 
-def _auto_assign_images():
+def _auto_assign_images(acquired=None):
     img_dir = os.path.join(os.path.dirname(__file__), 'images')
     if not os.path.isdir(img_dir):
         return None, None, [None, None, None]
@@ -67,12 +81,12 @@ def _auto_assign_images():
         pass
 
     # load images (returns surfaces or None)
-    bg_surf = _load_image_if_exists(bg) if bg else None
-    logo_surf = _load_image_if_exists(logo) if logo else None
+    bg_surf = _load_image_if_exists(bg, acquired) if bg else None
+    logo_surf = _load_image_if_exists(logo, acquired) if logo else None
     option_surfaces = [
-        _load_image_if_exists(picks[0]) if picks[0] else None,
-        _load_image_if_exists(picks[1]) if picks[1] else None,
-        _load_image_if_exists(picks[2]) if picks[2] else None,
+        _load_image_if_exists(picks[0], acquired) if picks[0] else None,
+        _load_image_if_exists(picks[1], acquired) if picks[1] else None,
+        _load_image_if_exists(picks[2], acquired) if picks[2] else None,
     ]
 
     try:
@@ -83,7 +97,141 @@ def _auto_assign_images():
     return bg_surf, logo_surf, option_surfaces
 
 
+
+def _build_menu_layout(screen_size, bg, logo, option_images, font, option_count):
+    """Scale the menu assets to fit `screen_size` and compute the panel geometry.
+
+    Returns a dict of pre-scaled surfaces (including the enlarged variant used to
+    highlight the selected option) so per-frame drawing needs no transforms.
+    """
+    screen_w, screen_h = screen_size
+    top_margin = 40
+    bottom_margin = 40
+    spacing = 18
+    y_offset = top_margin
+
+    # initial logo sizing (conservative caps)
+    logo_display = None
+    if logo:
+        lw, lh = logo.get_size()
+        max_logo_w = int(screen_w * 0.5)
+        max_logo_h = int(screen_h * 0.2)
+        initial_scale = min(1.0, max_logo_w / lw if lw else 1.0, max_logo_h / lh if lh else 1.0)
+        logo_display = pygame.transform.rotozoom(logo, 0, initial_scale) if initial_scale != 1.0 else logo
+
+    # initial option sizing
+    opt_max_w = int(screen_w * 0.5)
+    opt_max_h = int(screen_h * 0.09)
+    scaled_options = []
+    for img in option_images[:option_count]:
+        if img:
+            iw, ih = img.get_size()
+            s = min(1.0, opt_max_w / iw if iw else 1.0, opt_max_h / ih if ih else 1.0)
+            scaled_options.append(pygame.transform.rotozoom(img, 0, s) if s != 1.0 else img)
+        else:
+            scaled_options.append(None)
+    scaled_options += [None] * (option_count - len(scaled_options))
+
+    # compute total required height
+    def _height_of_logo(ld):
+        return ld.get_height() if ld else 0
+
+    def _height_of_opt(o):
+        return o.get_height() if o else font.get_height()
+
+    def _total_height():
+        total = _height_of_logo(logo_display)
+        if logo_display:
+            total += spacing
+        for opt in scaled_options:
+            total += _height_of_opt(opt)
+        return total + spacing * (option_count - 1)
+
+    total_h = _total_height()
+    available_h = screen_h - top_margin - bottom_margin
+
+    # if doesn't fit, scale everything down proportionally
+    if total_h > available_h and total_h > 0:
+        scale_down = available_h / total_h
+        if logo_display:
+            logo_display = pygame.transform.rotozoom(logo_display, 0, scale_down)
+        for idx, opt in enumerate(scaled_options):
+            if opt:
+                scaled_options[idx] = pygame.transform.rotozoom(opt, 0, scale_down)
+        total_h = _total_height()
+
+    # center the block vertically in remaining area, then nudge it upward
+    remaining_space = screen_h - y_offset - bottom_margin
+    start_y = y_offset + max(0, (remaining_space - total_h) // 2)
+    nudge_up = 60
+    start_y = max(top_margin, start_y - nudge_up)
+
+    # translucent panel behind options for contrast
+    panel_padding = 12
+    panel_w = min(int(screen_w * 0.9), screen_w - 20)
+    panel_h = total_h + panel_padding * 2
+    panel_surf = pygame.Surface((panel_w, panel_h), pygame.SRCALPHA)
+    panel_surf.fill((0, 0, 0, 160))
+
+    # static part of the frame: background + panel + logo
+    background = pygame.Surface(screen_size).convert()
+    if bg:
+        background.blit(pygame.transform.scale(bg, screen_size), (0, 0))
+    else:
+        background.fill((0, 0, 0))
+    background.blit(panel_surf, (int((screen_w - panel_w) // 2), start_y - panel_padding))
+    y = start_y
+    if logo_display:
+        lw2, lh2 = logo_display.get_size()
+        background.blit(logo_display, (screen_w // 2 - lw2 // 2, y))
+        y += lh2 + spacing
+
+    return {
+        'size': screen_size,
+        'background': background,
+        'options_y': y,
+        'spacing': spacing,
+        'options': scaled_options,
+        # highlight selected subtly
+        'options_selected': [pygame.transform.rotozoom(o, 0, 1.04) if o else None for o in scaled_options],
+    }
+
+
+def _compose_menu_frame(layout, menu_options, selected_option, font):
+    """Compose a full menu frame for one selection state from a prepared layout."""
+    frame = layout['background'].copy()
+    screen_w = layout['size'][0]
+    spacing = layout['spacing']
+    y = layout['options_y']
+    for i, option in enumerate(menu_options):
+        img = layout['options_selected'][i] if i == selected_option else layout['options'][i]
+        if img:
+            iw, ih = img.get_size()
+            frame.blit(img, (screen_w // 2 - iw // 2, y))
+            y += ih + spacing
+        else:
+            color = (255, 255, 255) if i == selected_option else (200, 200, 200)
+            text = font.render(option, True, color)
+            frame.blit(text, (screen_w // 2 - text.get_width() // 2, y))
+            y += font.get_height() + spacing
+    return frame
+
+
 def main_menu():
+    """Run the main menu until an option is chosen; returns the action name.
+
+    Menu images are acquired from the asset cache for the menu's lifetime only,
+    so they can be evicted once the game is running.
+    """
+    acquired = []
+    try:
+        return _main_menu(acquired)
+    finally:
+        for path in acquired:
+            assets.release(path)
+
+
+def _main_menu(acquired):
     pygame.init()
     screen = pygame.display.set_mode((800, 600))
     pygame.display.set_caption("Main Menu")
@@ -97,16 +245,16 @@ def main_menu():
     selected_option = 0
 
     # Optional assets (place files in LogicLock/images/)
-    bg = _load_image_if_exists('menu_bg.png')
-    logo = _load_image_if_exists('menu_logo.png')
+    bg = _load_image_if_exists('menu_bg.png', acquired)
+    logo = _load_image_if_exists('menu_logo.png', acquired)
     option_images = [
-        _load_image_if_exists('menu_start.png'),
-        _load_image_if_exists('menu_settings.png'),
-        _load_image_if_exists('menu_exit.png'),
+        _load_image_if_exists('menu_start.png', acquired),
+        _load_image_if_exists('menu_settings.png', acquired),
+        _load_image_if_exists('menu_exit.png', acquired),
     ]
 
     # If a dedicated bacmenu.png exists, prefer it as the background (override any menu_bg.png)
-    bac = _load_image_if_exists('bacmenu.png')
+    bac = _load_image_if_exists('bacmenu.png', acquired)
     if bac:
         bg = bac
         try:
@@ -116,11 +264,11 @@ def main_menu():
 
     # Explicit developer-named overrides (highest priority)
     # prefer 'play button.png' for Start, 'load button.png' for Settings, 'save button.png' for Exit
-    play_btn = _load_image_if_exists('play button.png')
-    load_btn = _load_image_if_exists('load button.png')
-    save_btn = _load_image_if_exists('save button.png')
+    play_btn = _load_image_if_exists('play button.png', acquired)
+    load_btn = _load_image_if_exists('load button.png', acquired)
+    save_btn = _load_image_if_exists('save button.png', acquired)
     # prefer 'logo.jpg' or 'logo.png' for the logo
-    explicit_logo = _load_image_if_exists('logo.jpg') or _load_image_if_exists('logo.png')
+    explicit_logo = _load_image_if_exists('logo.jpg', acquired) or _load_image_if_exists('logo.png', acquired)
     if explicit_logo:
         logo = explicit_logo
     if play_btn or load_btn or save_btn:
@@ -153,18 +301,18 @@ def main_menu():
         if any(mapped_logo or mapped_start or mapped_settings or mapped_exit):
             print(f"[menu] found developer images: {found}")
             # load these surfaces (prefer explicit previously loaded surfaces)
-            logo = logo or (_load_image_if_exists(mapped_logo) if mapped_logo else None)
+            logo = logo or (_load_image_if_exists(mapped_logo, acquired) if mapped_logo else None)
             option_images = [
-                option_images[0] or (_load_image_if_exists(mapped_start) if mapped_start else None),
-                option_images[1] or (_load_image_if_exists(mapped_settings) if mapped_settings else None),
-                option_images[2] or (_load_image_if_exists(mapped_exit) if mapped_exit else None),
+                option_images[0] or (_load_image_if_exists(mapped_start, acquired) if mapped_start else None),
+                option_images[1] or (_load_image_if_exists(mapped_settings, acquired) if mapped_settings else None),
+                option_images[2] or (_load_image_if_exists(mapped_exit, acquired) if mapped_exit else None),
             ]
             # choose a sensible background if none
-            bg = bg or (_load_image_if_exists(mapped_bg) if mapped_bg else None)
+            bg = bg or (_load_image_if_exists(mapped_bg, acquired) if mapped_bg else None)
             print(f"[menu] after mapping: bg={bool(bg)}, logo={bool(logo)}, options={[bool(o) for o in option_images]}")
         else:
             print('[menu] no explicit menu_* assets or developer-named images found — attempting auto-assign')
-            bg_auto, logo_auto, options_auto = _auto_assign_images()
+            bg_auto, logo_auto, options_auto = _auto_assign_images(acquired)
             # prefer explicit if present, otherwise use auto-assigned
             bg = bg or bg_auto
             logo = logo or logo_auto
@@ -173,17 +321,34 @@ def main_menu():
 
     clock = pygame.time.Clock()
 
+    # Layout and scaled surfaces are built once per screen size; composed frames are
+    # cached per selected option, so steady frames present without any transforms.
+    layout = None
+    frames = {}
+    dirty = True
+
     while True:
-        for event in pygame.event.get():
+        # Block until input arrives (with a timeout so the window stays responsive)
+        events = [pygame.event.wait(500)] + pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.VIDEORESIZE:
+                screen = pygame.display.get_surface()
+                layout = None
+                frames.clear()
+                dirty = True
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty = True
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
+                if input_state.is_bound(event.key, 'move_up'):
                     selected_option = (selected_option - 1) % len(menu_options)
-                elif event.key == pygame.K_DOWN:
+                    dirty = True
+                elif input_state.is_bound(event.key, 'move_down'):
                     selected_option = (selected_option + 1) % len(menu_options)
-                elif event.key == pygame.K_RETURN:
+                    dirty = True
+                elif input_state.is_bound(event.key, 'confirm'):
                     choice = menu_options[selected_option]
                     if choice == "Start Game":
                         return "start_game"
@@ -195,116 +360,19 @@ def main_menu():
                         pygame.quit()
                         sys.exit()
 
-        # Draw background (fallback to clear color)
-        if bg:
-            bg_scaled = pygame.transform.scale(bg, screen.get_size())
-            screen.blit(bg_scaled, (0, 0))
-        else:
-            screen.fill((0, 0, 0))
-
-        # Draw logo if available and scale everything to fit the visible area
-        top_margin = 40
-        bottom_margin = 40
-        spacing = 18
-        y_offset = top_margin
-
-        # initial logo sizing (conservative caps)
-        logo_display = None
-        if logo:
-            lw, lh = logo.get_size()
-            max_logo_w = int(screen.get_width() * 0.5)
-            max_logo_h = int(screen.get_height() * 0.2)
-            initial_scale = min(1.0, max_logo_w / lw if lw else 1.0, max_logo_h / lh if lh else 1.0)
-            logo_display = pygame.transform.rotozoom(logo, 0, initial_scale) if initial_scale != 1.0 else logo
-
-        # initial option sizing
-        opt_max_w = int(screen.get_width() * 0.5)
-        opt_max_h = int(screen.get_height() * 0.09)
-        scaled_options = []
-        for img in option_images:
-            if img:
-                iw, ih = img.get_size()
-                s = min(1.0, opt_max_w / iw if iw else 1.0, opt_max_h / ih if ih else 1.0)
-                scaled_options.append(pygame.transform.rotozoom(img, 0, s) if s != 1.0 else img)
-            else:
-                scaled_options.append(None)
+        if not dirty:
+            continue
 
-        # compute total required height
-        def _height_of_logo(ld):
-            return ld.get_height() if ld else 0
-
-        def _height_of_opt(o):
-            return o.get_height() if o else font.get_height()
-
-        total_h = _height_of_logo(logo_display)
-        if logo_display:
-            total_h += spacing
-        for opt in scaled_options:
-            total_h += _height_of_opt(opt)
-        total_h += spacing * (len(menu_options) - 1)
-
-        available_h = screen.get_height() - top_margin - bottom_margin
-
-        # if doesn't fit, scale everything down proportionally
-        if total_h > available_h and total_h > 0:
-            scale_down = available_h / total_h
-            if logo_display:
-                logo_display = pygame.transform.rotozoom(logo_display, 0, scale_down)
-            for idx, opt in enumerate(scaled_options):
-                if opt:
-                    scaled_options[idx] = pygame.transform.rotozoom(opt, 0, scale_down)
-
-            # recompute total_h after scaling
-            total_h = _height_of_logo(logo_display)
-            if logo_display:
-                total_h += spacing
-            for opt in scaled_options:
-                total_h += _height_of_opt(opt)
-            total_h += spacing * (len(menu_options) - 1)
-
-        # center the block vertically in remaining area, then nudge it upward
-        remaining_space = screen.get_height() - y_offset - bottom_margin
-        start_y = y_offset + max(0, (remaining_space - total_h) // 2)
-        # nudge up a bit so elements sit higher on the screen
-        nudge_up = 60
-        start_y = max(top_margin, start_y - nudge_up)
-
-        # Draw translucent panel behind options for contrast
-        panel_padding = 12
-        panel_w = min(int(screen.get_width() * 0.9), screen.get_width() - 20)
-        panel_x = int((screen.get_width() - panel_w) // 2)
-        panel_y = start_y - panel_padding
-        panel_h = total_h + panel_padding * 2
-        panel_surf = pygame.Surface((panel_w, panel_h), pygame.SRCALPHA)
-        panel_surf.fill((0, 0, 0, 160))
-        screen.blit(panel_surf, (panel_x, panel_y))
-
-        # Draw the logo (centered)
-        y = start_y
-        if logo_display:
-            lw2, lh2 = logo_display.get_size()
-            logo_x = screen.get_width() // 2 - lw2 // 2
-            screen.blit(logo_display, (logo_x, y))
-            y += lh2 + spacing
-
-        # Draw options centered horizontally
-        for i, option in enumerate(menu_options):
-            img = scaled_options[i]
-            if img:
-                # highlight selected subtly
-                img_display = pygame.transform.rotozoom(img, 0, 1.04) if i == selected_option else img
-                iw, ih = img_display.get_size()
-                x = screen.get_width() // 2 - iw // 2
-                screen.blit(img_display, (x, y))
-                y += ih + spacing
-            else:
-                color = (255, 255, 255) if i == selected_option else (200, 200, 200)
-                text = font.render(option, True, color)
-                tx = screen.get_width() // 2 - text.get_width() // 2
-                screen.blit(text, (tx, y))
-                y += font.get_height() + spacing
+        if layout is None:
+            layout = _build_menu_layout(screen.get_size(), bg, logo, option_images, font, len(menu_options))
+        frame = frames.get(selected_option)
+        if frame is None:
+            frame = _compose_menu_frame(layout, menu_options, selected_option, font)
+            frames[selected_option] = frame
 
+        screen.blit(frame, (0, 0))
         pygame.display.flip()
+        dirty = False
         clock.tick(30)
 
 
@@ -0,0 +1,520 @@
+import heapq
+import math
+import time
+from collections import OrderedDict
+import numpy as np
+from .entities import solid_table
+
+DIAGONAL_COST = math.sqrt(2.0)
+# Border openings up to this many tiles get one entrance (in the middle), longer ones two (at the ends)
+ENTRANCE_SPLIT = 2
+# Paths kept for repeated (start, goal) queries
+PATH_CACHE_SIZE = 4096
+# Abstract nodes expanded per query before giving up (bounds work on huge streamed maps)
+MAX_EXPANSIONS = 20000
+# Heuristic weight for the abstract search: >1 expands far fewer nodes for slightly longer paths
+HEURISTIC_WEIGHT = 1.2
+# Refined paths are re-searched in stretches of this many tiles, each within its
+# bounding box grown by REFINE_PAD tiles (undoes detours through entrance tiles)
+REFINE_WINDOW = 24
+REFINE_PAD = 2
+# Largest default cluster side: bigger chunks are halved until they fit (linking a
+# query endpoint searches its whole cluster, so cost grows with its area)
+MAX_CLUSTER_SIZE = 16
+# Default time per frame spent on queued path requests
+PATH_BUDGET_MS = 2.0
+
+# 8-connected moves (dx, dy, cost); diagonals may not cut corners
+_STEPS = (
+    (1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+    (1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST),
+)
+
+
+def octile(a, b):
+    """Admissible distance between tiles a and b for 8-connected moves."""
+    dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+    return max(dx, dy) + (DIAGONAL_COST - 1.0) * min(dx, dy)
+
+
+def local_search(grid, x0, y0, source):
+    """Dijkstra from tile `source` over `grid` (rows of bools, top-left tile (x0, y0)).
+
+    Returns (dist, parent) dicts keyed by tile; following parent from any reached
+    tile leads back to `source`.
+    """
+    h, w = len(grid), len(grid[0])
+    dist = {source: 0.0}
+    parent = {source: None}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        x, y = node
+        lx, ly = x - x0, y - y0
+        for dx, dy, cost in _STEPS:
+            nx, ny = lx + dx, ly + dy
+            if not (0 <= nx < w and 0 <= ny < h) or not grid[ny][nx]:
+                continue
+            if dx and dy and not (grid[ly][nx] and grid[ny][lx]):
+                continue
+            nd = d + cost
+            key = (x + dx, y + dy)
+            if nd < dist.get(key, math.inf):
+                dist[key] = nd
+                parent[key] = node
+                heapq.heappush(heap, (nd, key))
+    return dist, parent
+
+
+def window_path(grid, x0, y0, source, target):
+    """Shortest tile path from `source` to `target` inside `grid` (A*), or None."""
+    best = {source: 0.0}
+    parent = {source: None}
+    h, w = len(grid), len(grid[0])
+    heap = [(octile(source, target), 0.0, source)]
+    while heap:
+        _, d, node = heapq.heappop(heap)
+        if node == target:
+            return trace(parent, node)[::-1]
+        if d > best[node]:
+            continue
+        x, y = node
+        lx, ly = x - x0, y - y0
+        for dx, dy, cost in _STEPS:
+            nx, ny = lx + dx, ly + dy
+            if not (0 <= nx < w and 0 <= ny < h) or not grid[ny][nx]:
+                continue
+            if dx and dy and not (grid[ly][nx] and grid[ny][lx]):
+                continue
+            nd = d + cost
+            key = (x + dx, y + dy)
+            if nd < best.get(key, math.inf):
+                best[key] = nd
+                parent[key] = node
+                heapq.heappush(heap, (nd + octile(key, target), nd, key))
+    return None
+
+
+def trace(parent, node):
+    """Tiles from `node` back to the search source along `parent`."""
+    out = []
+    while node is not None:
+        out.append(node)
+        node = parent[node]
+    return out
+
+
+def _openings(inside, outside):
+    """Indices along a border where entrances go: runs where both sides are passable."""
+    both = np.concatenate(([False], inside & outside, [False]))
+    edges = np.flatnonzero(both[1:] != both[:-1])
+    picks = []
+    for s, e in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        if e - s <= ENTRANCE_SPLIT:
+            picks.append((s + e - 1) // 2)
+        else:
+            picks.extend((s, e - 1))
+    return picks
+
+
+class _Cluster:
+    __slots__ = ('x0', 'y0', 'grid', 'nodes', 'parents')
+
+    def __init__(self, x0, y0, grid):
+        self.x0 = x0
+        self.y0 = y0
+        self.grid = grid
+        self.nodes = []
+        # entrance node -> local_search parents from it (for refining intra-cluster edges)
+        self.parents = {}
+
+
+class Navigator:
+    """Hierarchical (HPA*) pathfinding over a map's tiles.
+
+    Passability comes from TileKind.is_solid (cells outside the map are blocked).
+    The map is split into clusters of `cluster_size` tiles (by default the map's
+    chunk_size, halved while above MAX_CLUSTER_SIZE so clusters still tile chunks); entrances are placed on open stretches of each cluster border and
+    connected by precomputed intra-cluster distances into an abstract graph. A query
+    links start and goal into that graph, runs A* over it and refines the result
+    into a tile path. Clusters are built on first use (so streamed maps page in only
+    what queries touch) or all at once with build(). The navigator listens for tile
+    changes on the map and rebuilds only the affected clusters, dropping cached paths
+    through them.
+
+    Usage:
+      nav = Navigator(game_map)
+      path = nav.find_path((3, 4), (40, 22))        # [(3, 4), ..., (40, 22)] or None
+      paths = nav.find_paths([(a, goal), (b, goal)])  # goal-side work is shared
+    """
+    def __init__(self, game_map, cluster_size=None):
+        self.map = game_map
+        if not cluster_size:
+            cluster_size = game_map.chunk_size
+            while cluster_size > MAX_CLUSTER_SIZE and cluster_size % 2 == 0:
+                cluster_size //= 2
+        self.cluster_size = int(cluster_size)
+        self.stats = {'queries': 0, 'cache_hits': 0, 'expanded': 0, 'search_ms': 0.0, 'clusters_built': 0}
+        self.reset()
+        game_map.tile_listeners.append(self.tiles_changed)
+
+    def reset(self):
+        """Drop the whole abstract graph and path cache (rebuilt lazily)."""
+        self._clusters = {}
+        self._edges = {}
+        self._cache = OrderedDict()
+        self._requests = OrderedDict()
+        self._table = ~solid_table(self.map.tile_kinds, outside=True)
+        # in-memory maps keep a full passability grid; streamed maps read per cluster
+        self.passable = self._table[self.map.tiles] if self.map.store is None else None
+
+    def close(self):
+        try:
+            self.map.tile_listeners.remove(self.tiles_changed)
+        except ValueError:
+            pass
+
+    def cluster_of(self, tile):
+        return (tile[0] // self.cluster_size, tile[1] // self.cluster_size)
+
+    def _passable_block(self, x0, y0, x1, y1):
+        if self.passable is None:
+            return self._table[self.map.tile_block(x0, y0, x1, y1, fill=len(self._table) - 1)]
+        out = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        h, w = self.passable.shape
+        sx0, sy0, sx1, sy1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+        if sx0 < sx1 and sy0 < sy1:
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = self.passable[sy0:sy1, sx0:sx1]
+        return out
+
+    def is_passable(self, tile):
+        x, y = tile
+        return bool(self._passable_block(x, y, x + 1, y + 1)[0, 0])
+
+    def build(self):
+        """Build every cluster now instead of on first use (in-memory maps)."""
+        cs = self.cluster_size
+        for cy in range((self.map.height + cs - 1) // cs):
+            for cx in range((self.map.width + cs - 1) // cs):
+                self._cluster((cx, cy))
+        return len(self._clusters)
+
+    def _cluster(self, key):
+        cluster = self._clusters.get(key)
+        if cluster is None:
+            cluster = self._build_cluster(key)
+            self._clusters[key] = cluster
+        return cluster
+
+    def _build_cluster(self, key):
+        cs = self.cluster_size
+        cx, cy = key
+        x0, y0 = cx * cs, cy * cs
+        x1 = max(x0 + 1, min(x0 + cs, self.map.width))
+        y1 = max(y0 + 1, min(y0 + cs, self.map.height))
+        pad = self._passable_block(x0 - 1, y0 - 1, x1 + 1, y1 + 1)
+        cluster = _Cluster(x0, y0, pad[1:-1, 1:-1].tolist())
+        # (inside tile, neighbour tile) per entrance; both clusters sharing a border derive the same ones
+        links = []
+        links += [((x0, y0 + i), (x0 - 1, y0 + i)) for i in _openings(pad[1:-1, 1], pad[1:-1, 0])]
+        links += [((x1 - 1, y0 + i), (x1, y0 + i)) for i in _openings(pad[1:-1, -2], pad[1:-1, -1])]
+        links += [((x0 + i, y0), (x0 + i, y0 - 1)) for i in _openings(pad[1, 1:-1], pad[0, 1:-1])]
+        links += [((x0 + i, y1 - 1), (x0 + i, y1)) for i in _openings(pad[-2, 1:-1], pad[-1, 1:-1])]
+        for node, _ in links:
+            if node not in cluster.parents:
+                cluster.nodes.append(node)
+                cluster.parents[node] = None
+        for node in cluster.nodes:
+            dist, parent = local_search(cluster.grid, x0, y0, node)
+            cluster.parents[node] = parent
+            self._edges[node] = {other: dist[other] for other in cluster.nodes if other != node and other in dist}
+        for node, outside in links:
+            self._edges[node][outside] = 1.0
+        self.stats['clusters_built'] += 1
+        return cluster
+
+    def _drop_cluster(self, key):
+        cluster = self._clusters.pop(key, None)
+        if cluster is not None:
+            for node in cluster.nodes:
+                self._edges.pop(node, None)
+
+    def tiles_changed(self, xs=None, ys=None):
+        """Map listener: tiles at (xs, ys) changed (None: anything may have changed)."""
+        if xs is None:
+            self.reset()
+            return
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        if not xs.size:
+            return
+        if self.passable is not None:
+            if self.map.tiles.shape != self.passable.shape:
+                self.reset()
+                return
+            self.passable[ys, xs] = self._table[self.map.tiles[ys, xs]]
+        cs = self.cluster_size
+        # border cells also change the entrances of the neighbouring cluster
+        keys = set()
+        for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)):
+            keys.update(zip(((xs + dx) // cs).tolist(), ((ys + dy) // cs).tolist()))
+        for key in keys:
+            self._drop_cluster(key)
+        for cache_key, (path, clusters) in list(self._cache.items()):
+            if clusters is None or not clusters.isdisjoint(keys):
+                del self._cache[cache_key]
+
+    def find_path(self, start, goal):
+        """Tile path from `start` to `goal` (both included), or None if there is none."""
+        return self.find_paths([(start, goal)])[0]
+
+    def find_paths(self, queries):
+        """Answer [(start, goal), ...] in one batch; searches sharing a goal reuse its linking."""
+        began = time.perf_counter()
+        goal_links = {}
+        results = [self._query(start, goal, goal_links) for start, goal in queries]
+        self.stats['search_ms'] += (time.perf_counter() - began) * 1000.0
+        return results
+
+    def request(self, key, start, goal):
+        """Queue a path query under `key` (a newer request for the same key replaces it)."""
+        self._requests.pop(key, None)
+        self._requests[key] = (start, goal)
+
+    def pending_requests(self):
+        return len(self._requests)
+
+    def process_requests(self, budget_ms=PATH_BUDGET_MS):
+        """Answer queued requests, oldest first, until `budget_ms` is spent. Returns {key: path or None}."""
+        began = time.perf_counter()
+        deadline = began + budget_ms / 1000.0
+        goal_links = {}
+        done = {}
+        while self._requests:
+            key, (start, goal) = self._requests.popitem(last=False)
+            done[key] = self._query(start, goal, goal_links)
+            if time.perf_counter() >= deadline:
+                break
+        self.stats['search_ms'] += (time.perf_counter() - began) * 1000.0
+        return done
+
+    def _query(self, start, goal, goal_links):
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        self.stats['queries'] += 1
+        key = (start, goal)
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return list(hit[0]) if hit[0] is not None else None
+        path = None
+        if self.is_passable(start) and self.is_passable(goal):
+            if goal not in goal_links:
+                gc = self._cluster(self.cluster_of(goal))
+                goal_links[goal] = local_search(gc.grid, gc.x0, gc.y0, goal)
+            path = self._search(start, goal, goal_links[goal])
+        cs = self.cluster_size
+        clusters = frozenset((x // cs, y // cs) for x, y in path) if path is not None else None
+        self._cache[key] = (path, clusters)
+        if len(self._cache) > PATH_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return list(path) if path is not None else None
+
+    def _search(self, start, goal, goal_link):
+        sc = self._cluster(self.cluster_of(start))
+        s_dist, s_parent = local_search(sc.grid, sc.x0, sc.y0, start)
+        if goal in s_dist:
+            # same cluster and connected inside it
+            return self.refine(trace(s_parent, goal)[::-1])
+        g_dist, g_parent = goal_link
+        g_nodes = self._cluster(self.cluster_of(goal)).nodes
+        to_goal = {node: g_dist[node] for node in g_nodes if node in g_dist}
+        if not to_goal:
+            return None
+
+        # A* over entrance nodes; came[node] = (previous node, how the hop is refined)
+        came = {start: (None, None)}
+        best = {start: 0.0}
+        gx, gy = goal
+        weight = HEURISTIC_WEIGHT
+        diag = DIAGONAL_COST - 1.0
+        # ties go to the deeper node (-g), which keeps open-field searches narrow
+        heap = [(octile(start, goal) * weight, 0.0, start)]
+        clusters = self._clusters
+        edges = self._edges
+        cs = self.cluster_size
+        expanded = 0
+        while heap and expanded < MAX_EXPANSIONS:
+            _, g, node = heapq.heappop(heap)
+            g = -g
+            if g > best[node]:
+                continue
+            if node == goal:
+                break
+            expanded += 1
+            key = (node[0] // cs, node[1] // cs)
+            if key not in clusters:
+                self._cluster(key)
+            hops = [(nbr, cost, 'edge') for nbr, cost in edges.get(node, {}).items()]
+            if node == start:
+                hops += [(n, s_dist[n], 'start') for n in sc.nodes if n in s_dist]
+            if node in to_goal:
+                hops.append((goal, to_goal[node], 'goal'))
+            for nbr, cost, how in hops:
+                ng = g + cost
+                if ng < best.get(nbr, math.inf):
+                    best[nbr] = ng
+                    came[nbr] = (node, how)
+                    dx, dy = abs(nbr[0] - gx), abs(nbr[1] - gy)
+                    h = dx + diag * dy if dx > dy else dy + diag * dx
+                    heapq.heappush(heap, (ng + h * weight, -ng, nbr))
+        self.stats['expanded'] += expanded
+        if goal not in came:
+            return None
+
+        hops = []
+        node = goal
+        while came[node][0] is not None:
+            prev, how = came[node]
+            hops.append((prev, node, how))
+            node = prev
+        path = [start]
+        for a, b, how in reversed(hops):
+            if how == 'start':
+                segment = trace(s_parent, b)[::-1]
+            elif how == 'goal':
+                segment = trace(g_parent, a)
+            elif self.cluster_of(a) == self.cluster_of(b):
+                segment = trace(self._clusters[self.cluster_of(a)].parents[a], b)[::-1]
+            else:
+                segment = [a, b]
+            path.extend(segment[1:])
+        return self.refine(path)
+
+    def refine(self, path):
+        """Shorten a tile path by re-searching it in windows of REFINE_WINDOW tiles.
+
+        Abstract paths must pass through entrance tiles and same-cluster paths
+        stay inside their cluster, both of which can bend them well past the
+        heuristic weight's bound; an exact A* between the ends of each stretch,
+        over its bounding box plus REFINE_PAD tiles, straightens them out. A
+        stretch is only ever replaced by one that is no longer.
+        """
+        out = [path[0]]
+        pad = REFINE_PAD
+        for i in range(0, len(path) - 1, REFINE_WINDOW):
+            stretch = path[i:i + REFINE_WINDOW + 1]
+            xs = [t[0] for t in stretch]
+            ys = [t[1] for t in stretch]
+            x0, y0 = min(xs) - pad, min(ys) - pad
+            grid = self._passable_block(x0, y0, max(xs) + 1 + pad, max(ys) + 1 + pad).tolist()
+            better = window_path(grid, x0, y0, stretch[0], stretch[-1])
+            out.extend((better or stretch)[1:])
+        return out
+
+    def cache_info(self):
+        q = self.stats['queries']
+        return {
+            'paths': len(self._cache),
+            'clusters': len(self._clusters),
+            'hit_rate': self.stats['cache_hits'] / q if q else 0.0,
+        }
+
+    def memory_items(self):
+        if self.passable is not None:
+            yield 'tiles', 'nav passability', self.passable
+        # rough Python object sizes: ~100 bytes per cached path tile / graph edge
+        yield 'caches', 'nav path cache', 100 * sum(len(p) for p, _ in self._cache.values() if p is not None)
+        yield 'caches', 'nav graph', 100 * sum(len(e) for e in self._edges.values())
+
+
+class PathFollower:
+    """Walks entities of an EntityStore along navigator paths.
+
+    go_to() queues path requests; update() collects answered ones within the
+    frame budget and steers every following entity toward its current waypoint
+    in one vectorized step (EntityStore.steer). Python work per entity happens
+    only when it reaches a waypoint.
+
+    Usage:
+      follower = PathFollower(npcs, nav)
+      follower.go_to(ids, goal_tiles)
+      follower.update(dt, speed)
+      follower.roam(radius)      # idle entities pick new nearby goals
+    """
+    def __init__(self, store, navigator):
+        self.store = store
+        self.nav = navigator
+        # entity id -> [path tiles, index of the current waypoint]
+        self.paths = {}
+
+    def go_to(self, ids, goals):
+        ts = self.nav.map.tile_size
+        rows = self.store.rows(ids)
+        for eid, row, goal in zip(np.atleast_1d(ids).tolist(), rows.tolist(), goals):
+            if row < 0:
+                continue
+            cx = self.store.x[row] + self.store.w[row] / 2.0
+            cy = self.store.y[row] + self.store.h[row] / 2.0
+            self.nav.request(eid, (int(cx // ts), int(cy // ts)), goal)
+            self.paths[eid] = None
+
+    def _aim(self, rows, tiles):
+        ts = self.nav.map.tile_size
+        store = self.store
+        store.tx[rows] = [t[0] * ts for t in tiles] + (ts - store.w[rows]) / 2.0
+        store.ty[rows] = [t[1] * ts for t in tiles] + (ts - store.h[rows]) / 2.0
+
+    def update(self, dt, speed, budget_ms=PATH_BUDGET_MS):
+        """Collect answered paths and steer following entities at `speed`."""
+        store = self.store
+        advance = set()
+        for eid, path in self.nav.process_requests(budget_ms).items():
+            if eid in self.paths:
+                # index 0 is the start tile; advancing aims at path[1]
+                self.paths[eid] = [path, 0] if path and len(path) > 1 else None
+                advance.add(eid)
+        if store.count:
+            advance.update(store.id[store.steer(speed, dt)].tolist())
+        aims = []
+        for eid in advance:
+            entry = self.paths.get(eid)
+            if entry is None:
+                continue
+            entry[1] += 1
+            if entry[1] >= len(entry[0]):
+                self.paths[eid] = None
+                continue
+            aims.append((eid, entry[0][entry[1]]))
+        if aims:
+            rows = store.rows([eid for eid, _ in aims])
+            live = rows >= 0
+            if live.any():
+                self._aim(rows[live], [tile for (_, tile), ok in zip(aims, live.tolist()) if ok])
+                store.steer(speed, dt)
+
+    def roam(self, radius, rng=None):
+        """Send every idle entity to a random tile within `radius` tiles of where it stands."""
+        idle = self.idle_ids()
+        if not len(idle):
+            return
+        rng = rng if rng is not None else np.random.default_rng()
+        store = self.store
+        ts = self.nav.map.tile_size
+        rows = store.rows(idle)
+        tx = ((store.x[rows] + store.w[rows] / 2.0) // ts).astype(np.int64) + rng.integers(-radius, radius + 1, len(idle))
+        ty = ((store.y[rows] + store.h[rows] / 2.0) // ts).astype(np.int64) + rng.integers(-radius, radius + 1, len(idle))
+        self.go_to(idle, list(zip(tx.tolist(), ty.tolist())))
+
+    def idle_ids(self):
+        """Ids with no path and no pending request (forgets despawned entities)."""
+        ids = self.store.id
+        live = set(ids.tolist())
+        for eid in [e for e in self.paths if e not in live]:
+            del self.paths[eid]
+        waiting = set(self.nav._requests)
+        busy = {eid for eid, p in self.paths.items() if p is not None or eid in waiting}
+        return ids[~np.isin(ids, list(busy))] if busy else ids.copy()
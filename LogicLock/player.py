@@ -1,6 +1,6 @@
 import pygame
 from .sprite import Sprite
-from .input import is_key_pressed
+from .input import input_state
 from .camera import camera
 
 class Player(Sprite):
@@ -15,16 +15,8 @@ class Player(Sprite):
         self.speed = float(speed)
 
     def update(self, game_map=None, dt=0.0):
-        # Read input and build a direction vector
-        dx = dy = 0.0
-        if is_key_pressed(pygame.K_w) or is_key_pressed(pygame.K_UP):
-            dy -= 1.0
-        if is_key_pressed(pygame.K_s) or is_key_pressed(pygame.K_DOWN):
-            dy += 1.0
-        if is_key_pressed(pygame.K_a) or is_key_pressed(pygame.K_LEFT):
-            dx -= 1.0
-        if is_key_pressed(pygame.K_d) or is_key_pressed(pygame.K_RIGHT):
-            dx += 1.0
+        # Build a direction vector from this frame's input snapshot
+        dx, dy = input_state.current.axis()
 
         # Normalize direction
         mag = (dx*dx + dy*dy) ** 0.5
@@ -92,9 +84,9 @@ class Player(Sprite):
         for ty in range(start_y, end_y + 1):
             for tx in range(start_x, end_x + 1):
                 # Out-of-bounds tiles are treated as non-solid here (change if necessary)
-                if ty < 0 or tx < 0 or ty >= len(game_map.tiles) or tx >= len(game_map.tiles[0]):
+                tile_index = game_map.tile_at(tx, ty)
+                if tile_index is None:
                     continue
-                tile_index = game_map.tiles[ty][tx]
                 tk = game_map.tile_kinds[tile_index]
                 if not tk.is_solid:
                     continue
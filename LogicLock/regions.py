@@ -0,0 +1,237 @@
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+import numpy as np
+
+# Default tiles per region side and number of regions kept in memory
+DEFAULT_REGION_SIZE = 64
+DEFAULT_MAX_REGIONS = 64
+
+
+def region_file(directory, rx, ry):
+    return os.path.join(directory, f"r.{rx}.{ry}.npy")
+
+
+class RegionStore:
+    """Tile data split into fixed-size square regions, paged in on demand.
+
+    Regions are produced by `source(x0, y0, w, h)`, a callback returning a (h, w)
+    array of tile indices (a compiled MapFile's read_block or a world generator),
+    and kept in an LRU of at most `max_regions` entries. Edited regions are spilled
+    to a scratch directory when evicted and read back from there, so edits survive
+    paging. save() collects every edited region into a directory; load_overlay()
+    makes a saved directory take precedence over the source. The scratch directory
+    is removed by close() (or at interpreter exit if the store is never closed).
+
+    Usage:
+      store = RegionStore(lambda x0, y0, w, h: gen(x0, y0, w, h), 1 << 20, 1 << 20)
+      t = store.tile(tx, ty)
+      block = store.read_block(x0, y0, x1, y1)
+      store.set_tile(tx, ty, 3)
+      store.save("saves/world")
+      store.close()
+    """
+    def __init__(self, source, width, height, region_size=DEFAULT_REGION_SIZE, max_regions=DEFAULT_MAX_REGIONS, fill=0):
+        self.source = source
+        self.width = int(width)
+        self.height = int(height)
+        self.region_size = int(region_size)
+        self.max_regions = max(1, int(max_regions))
+        self.fill = fill
+        self._regions = OrderedDict()
+        self._dirty = set()
+        # regions edited at some point this session (spilled or still resident)
+        self._edited = set()
+        # scratch TemporaryDirectory for spilled edits (created on first spill)
+        self._spill_tmp = None
+        self._spill_dir = None
+        self._overlay_dir = None
+        self.loads = 0
+        self.evictions = 0
+
+    def region_key(self, tx, ty):
+        return tx // self.region_size, ty // self.region_size
+
+    def _region_shape(self, rx, ry):
+        rs = self.region_size
+        return min(rs, self.height - ry * rs), min(rs, self.width - rx * rs)
+
+    def _load(self, rx, ry):
+        for directory in (self._spill_dir, self._overlay_dir):
+            if directory and os.path.exists(region_file(directory, rx, ry)):
+                return np.load(region_file(directory, rx, ry)).astype(np.int16, copy=False)
+        h, w = self._region_shape(rx, ry)
+        rs = self.region_size
+        block = np.asarray(self.source(rx * rs, ry * rs, w, h))
+        return np.array(block, dtype=np.int16).reshape(h, w)
+
+    def region(self, rx, ry):
+        """The (h, w) int16 array for region (rx, ry), paging it in if needed."""
+        key = (rx, ry)
+        grid = self._regions.get(key)
+        if grid is not None:
+            self._regions.move_to_end(key)
+            return grid
+        grid = self._load(rx, ry)
+        self.loads += 1
+        self._regions[key] = grid
+        self._evict()
+        return grid
+
+    def _evict(self):
+        while len(self._regions) > self.max_regions:
+            key, grid = self._regions.popitem(last=False)
+            if key in self._dirty:
+                self._spill(key, grid)
+            self.evictions += 1
+
+    def _spill(self, key, grid):
+        if self._spill_tmp is None:
+            self._spill_tmp = tempfile.TemporaryDirectory(prefix='logiclock-regions-')
+            self._spill_dir = self._spill_tmp.name
+        np.save(region_file(self._spill_dir, *key), grid)
+        self._dirty.discard(key)
+
+    def prefetch(self, x0, y0, x1, y1, limit=1):
+        """Page in up to `limit` missing regions meeting tiles [x0, x1) x [y0, y1), nearest its centre first.
+
+        Skipped when the area spans more than half of max_regions, where it would
+        only evict regions still in use. Returns the number of regions loaded.
+        """
+        rs = self.region_size
+        rx0, ry0 = max(0, x0) // rs, max(0, y0) // rs
+        rx1 = (min(self.width, x1) - 1) // rs
+        ry1 = (min(self.height, y1) - 1) // rs
+        if rx1 < rx0 or ry1 < ry0 or (rx1 - rx0 + 1) * (ry1 - ry0 + 1) > self.max_regions // 2:
+            return 0
+        mx, my = (rx0 + rx1) / 2.0, (ry0 + ry1) / 2.0
+        missing = [(rx, ry) for ry in range(ry0, ry1 + 1) for rx in range(rx0, rx1 + 1) if (rx, ry) not in self._regions]
+        missing.sort(key=lambda k: (k[0] - mx) ** 2 + (k[1] - my) ** 2)
+        for key in missing[:limit]:
+            self.region(*key)
+        return min(limit, len(missing))
+
+    def in_bounds(self, tx, ty):
+        return 0 <= tx < self.width and 0 <= ty < self.height
+
+    def tile(self, tx, ty):
+        """Tile index at (tx, ty), or None outside the world."""
+        if not self.in_bounds(tx, ty):
+            return None
+        rs = self.region_size
+        return int(self.region(tx // rs, ty // rs)[ty % rs, tx % rs])
+
+    def set_tile(self, tx, ty, value):
+        if not self.in_bounds(tx, ty):
+            raise IndexError(f"tile ({tx},{ty}) outside world")
+        rs = self.region_size
+        key = (tx // rs, ty // rs)
+        self.region(*key)[ty % rs, tx % rs] = value
+        self._dirty.add(key)
+        self._edited.add(key)
+
+    def read_block(self, x0, y0, x1, y1, fill=None):
+        """Tiles in [x0, x1) x [y0, y1) assembled across regions; cells outside the world get `fill`."""
+        fill = self.fill if fill is None else fill
+        out = np.full((max(0, y1 - y0), max(0, x1 - x0)), fill, dtype=np.int16)
+        sx0, sy0 = max(0, x0), max(0, y0)
+        sx1, sy1 = min(self.width, x1), min(self.height, y1)
+        if sx0 >= sx1 or sy0 >= sy1:
+            return out
+        rs = self.region_size
+        for ry in range(sy0 // rs, (sy1 - 1) // rs + 1):
+            for rx in range(sx0 // rs, (sx1 - 1) // rs + 1):
+                grid = self.region(rx, ry)
+                bx0, by0 = rx * rs, ry * rs
+                ax0, ay0 = max(sx0, bx0), max(sy0, by0)
+                ax1, ay1 = min(sx1, bx0 + grid.shape[1]), min(sy1, by0 + grid.shape[0])
+                out[ay0 - y0:ay1 - y0, ax0 - x0:ax1 - x0] = grid[ay0 - by0:ay1 - by0, ax0 - bx0:ax1 - bx0]
+        return out
+
+    def gather(self, xs, ys, fill=None):
+        """Tiles at coordinate arrays (xs, ys); cells outside the world get `fill`.
+
+        Points are grouped by region, so each touched region is read once however
+        far apart the points are (unlike read_block over their bounding box).
+        """
+        fill = self.fill if fill is None else fill
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        out = np.full(xs.shape, fill, dtype=np.int16)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        if not inside.any():
+            return out
+        ix, iy = xs[inside], ys[inside]
+        rs = self.region_size
+        keys, inverse = np.unique(np.stack([ix // rs, iy // rs], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        vals = np.empty(ix.shape, dtype=np.int16)
+        for k, (rx, ry) in enumerate(keys.tolist()):
+            sel = order[bounds[k]:bounds[k + 1]]
+            vals[sel] = self.region(rx, ry)[iy[sel] - ry * rs, ix[sel] - rx * rs]
+        out[inside] = vals
+        return out
+
+    def save(self, directory):
+        """Write every region edited this session into `directory` (one .npy per region)."""
+        os.makedirs(directory, exist_ok=True)
+        for key in self._edited:
+            grid = self._regions.get(key)
+            if grid is not None:
+                np.save(region_file(directory, *key), grid)
+            elif self._spill_dir and os.path.exists(region_file(self._spill_dir, *key)):
+                shutil.copyfile(region_file(self._spill_dir, *key), region_file(directory, *key))
+            elif self._overlay_dir and os.path.abspath(self._overlay_dir) != os.path.abspath(directory):
+                shutil.copyfile(region_file(self._overlay_dir, *key), region_file(directory, *key))
+        return len(self._edited)
+
+    def load_overlay(self, directory):
+        """Use regions saved in `directory` in place of the source; drops everything paged in."""
+        self.discard(keep_edits=False)
+        self._overlay_dir = directory
+        if directory and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                parts = name.split('.')
+                if len(parts) == 4 and parts[0] == 'r' and parts[3] == 'npy':
+                    try:
+                        self._edited.add((int(parts[1]), int(parts[2])))
+                    except ValueError:
+                        pass
+
+    def discard(self, keep_edits=True):
+        """Drop resident regions so they are re-read from the source on next access.
+
+        Edited regions stay unless `keep_edits` is False, which also forgets spilled edits.
+        """
+        if keep_edits:
+            for key in [k for k in self._regions if k not in self._edited]:
+                del self._regions[key]
+            return
+        self._regions.clear()
+        self._dirty.clear()
+        self._edited.clear()
+        if self._spill_tmp is not None:
+            self._spill_tmp.cleanup()
+            self._spill_tmp = None
+            self._spill_dir = None
+
+    def close(self):
+        """Drop every region and remove the scratch directory; unsaved edits are lost."""
+        self.discard(keep_edits=False)
+        self._overlay_dir = None
+
+    def resident_bytes(self):
+        return sum(g.nbytes for g in self._regions.values())
+
+    def stats(self):
+        return {
+            'regions': len(self._regions),
+            'max_regions': self.max_regions,
+            'bytes': self.resident_bytes(),
+            'edited': len(self._edited),
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
@@ -1,9 +1,9 @@
 import os
 import pygame
 from .camera import camera
+from .assets import assets
 
 sprites = []
-loaded = {}
 
 def _resolve_image_path(image):
     if os.path.isabs(image):
@@ -12,19 +12,15 @@ def _resolve_image_path(image):
 
 class Sprite:
     def __init__(self, image, x, y):
-        img_path = _resolve_image_path(image)
-        if img_path in loaded:
-            self.image = loaded[img_path]
-        else:
-            self.image = pygame.image.load(img_path)
-            loaded[img_path] = self.image
+        self.image_path = _resolve_image_path(image)
+        self.image = assets.acquire(self.image_path)
         self.x = x
         self.y = y
         sprites.append(self)
 
     def delete(self):
         sprites.remove(self)
+        assets.release(self.image_path)
 
     def draw(self, screen):
         screen.blit(self.image, (int(self.x - camera.x), int(self.y - camera.y)))
-
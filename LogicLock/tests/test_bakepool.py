@@ -0,0 +1,71 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import pytest
+
+from LogicLock.bakepool import BakePool
+from LogicLock.map_render import render_plan
+from LogicLock.tilekind import TileKind
+
+TILE = 16
+
+
+def _solid(color):
+    surf = pygame.Surface((TILE, TILE)).convert()
+    surf.fill(color)
+    return surf
+
+
+@pytest.fixture
+def kinds():
+    pygame.init()
+    pygame.display.set_mode((64, 64))
+    kinds = [TileKind(name, 'images/grass.png', False) for name in ('red', 'blue', 'glass', 'keyed')]
+    # opaque kinds as convert() leaves them: their exported alpha byte is meaningless
+    kinds[0].image = _solid((200, 0, 0))
+    kinds[1].image = _solid((0, 0, 200))
+    glass = pygame.Surface((TILE, TILE), pygame.SRCALPHA)
+    glass.fill((0, 200, 0, 128))
+    kinds[2].image = glass
+    keyed = _solid((250, 250, 0))
+    keyed.fill((255, 0, 255), (4, 4, 8, 8))
+    keyed.set_colorkey((255, 0, 255))
+    kinds[3].image = keyed
+    yield kinds
+    pygame.quit()
+
+
+def _pixels(surf, opaque):
+    return pygame.image.tobytes(surf, 'RGB' if opaque else 'RGBA')
+
+
+def _jobs():
+    items = [(0, 0, 0), (1, TILE, 0), (2, 0, TILE), (3, TILE, TILE), (2, TILE // 2, TILE // 2)]
+    size = (2 * TILE, 2 * TILE)
+    return [(size, items, True), (size, items, False), (size, items[:2], True)]
+
+
+def test_pool_bake_matches_serial_bake(kinds):
+    pool = BakePool(workers=2)
+    try:
+        jobs = _jobs()
+        baked = pool.bake(jobs, kinds)
+        for (size, items, opaque), surf in zip(jobs, baked):
+            serial = render_plan(size, items, opaque, kinds, TILE)
+            assert _pixels(surf, opaque) == _pixels(serial, opaque)
+    finally:
+        pool.close()
+
+
+def test_pool_republishes_changed_images(kinds):
+    pool = BakePool(workers=1)
+    try:
+        job = ((TILE, TILE), [(0, 0, 0)], True)
+        assert pool.bake([job], kinds)[0].get_at((1, 1))[:3] == (200, 0, 0)
+        # a reloaded image of the same size may even reuse the old surface's id
+        kinds[0].image = _solid((10, 20, 30))
+        assert pool.bake([job], kinds)[0].get_at((1, 1))[:3] == (10, 20, 30)
+    finally:
+        pool.close()
@@ -1,32 +1,173 @@
 import os
 import pygame
+from .assets import assets
+from .map_render import optimize_surface
+
+# Number of scaled variants each TileKind keeps referenced in the asset cache
+MAX_VARIANTS = 8
+# Seconds each animation frame is shown unless a TileKind says otherwise
+DEFAULT_FRAME_TIME = 0.15
+
 
 class TileKind:
     """Represents a tile type with its image and properties.
 
     Fields:
       name: string
-      image: pygame.Surface
+      image: pygame.Surface currently used for drawing (the source or a scaled variant)
+      source_image: pristine pygame.Surface loaded from `image_path` (never rescaled)
+      image_path: absolute path of the source image
+      target_height: pixel height `image` is scaled to, or None for the source size
       is_solid: bool
+      opaque: bool, blocks line of sight (defaults to is_solid)
+      layer: map layer the kind is drawn on ('ground', 'objects' or 'overhead')
       mask: pygame.Mask or None (set after conversion to display format)
+      frames_path: absolute path of the animation sheet, or None for a static kind
+      frames: animation frames (subsurfaces of the sheet, cut left to right into
+              cells the size of `image`); empty for static kinds
+      frame_time: seconds each frame is shown
     """
-    def __init__(self, name, image, is_solid):
+    def __init__(self, name, image, is_solid, layer='ground', opaque=None, frames=None, frame_time=DEFAULT_FRAME_TIME):
         image_path = image if os.path.isabs(image) else os.path.join(os.path.dirname(__file__), image)
         self.name = name
-        self.image = pygame.image.load(image_path)
+        self.image_path = image_path
+        self.source_image = assets.acquire(image_path)
+        self.image = self.source_image
+        self.target_height = None
         self.is_solid = is_solid
+        self.opaque = is_solid if opaque is None else opaque
+        self.layer = layer
         self.mask = None
+        # target height -> scaled surface (held in the asset cache) and its mask
+        self._variants = {}
+        self._masks = {}
+        if frames is not None and not os.path.isabs(frames):
+            frames = os.path.join(os.path.dirname(__file__), frames)
+        self.frames_path = frames
+        self.frame_time = float(frame_time)
+        self.frames = []
+        if frames is not None:
+            # held for the kind's lifetime, like source_image
+            assets.acquire(frames)
+        self._load_frames()
+
+    @property
+    def animated(self):
+        return len(self.frames) > 1
+
+    def _load_frames(self):
+        """Cut the animation sheet into frames the size of the source image.
+
+        Once a display exists the sheet is first copied into the cheapest format
+        that draws it (opaque water frames then blit without alpha blending).
+        """
+        self.frames = []
+        if self.frames_path is None:
+            return
+        sheet = optimize_surface(assets.acquire(self.frames_path))
+        assets.release(self.frames_path)
+        fw, fh = self.source_image.get_size()
+        if fw <= 0 or sheet.get_height() < fh:
+            print(f"[tilekind] animation sheet for {self.name} is smaller than its image; not animated")
+            return
+        self.frames = [sheet.subsurface((i * fw, 0, fw, fh)) for i in range(sheet.get_width() // fw)]
+
+    def frame_index(self, t):
+        """Index of the frame shown at time `t` (seconds); 0 for static kinds."""
+        if len(self.frames) < 2:
+            return 0
+        return int(t / self.frame_time) % len(self.frames)
+
+    def _variant_size(self, height):
+        w, h = self.source_image.get_size()
+        return max(1, int(w * (height / h))), int(height)
+
+    def _variant(self, height):
+        """Return the image scaled from the pristine source to `height` pixels (cached)."""
+        if height is None or height == self.source_image.get_height() or self.source_image.get_height() == 0:
+            return self.source_image
+        surf = self._variants.pop(height, None)
+        if surf is None:
+            surf = assets.acquire(self.image_path, scale=self._variant_size(height))
+            # keep the most recent variants referenced; older ones become evictable
+            while len(self._variants) >= MAX_VARIANTS:
+                old_h = next(iter(self._variants))
+                del self._variants[old_h]
+                self._masks.pop(old_h, None)
+                assets.release(self.image_path, scale=self._variant_size(old_h))
+        self._variants[height] = surf
+        return surf
+
+    def _mask_for(self, height):
+        mask = self._masks.get(height)
+        if mask is None:
+            try:
+                mask = pygame.mask.from_surface(self.image)
+            except Exception:
+                mask = None
+            self._masks[height] = mask
+        return mask
+
+    def set_height(self, height):
+        """Switch `image` to the variant `height` pixels tall (None = source size).
+
+        Returns True if the drawn image changed.
+        """
+        height = None if height is None else max(1, int(height))
+        if height == self.target_height:
+            return False
+        self.target_height = height
+        image = self._variant(height)
+        changed = image is not self.image
+        self.image = image
+        self.mask = self._mask_for(height)
+        return changed
 
     def convert_for_display(self):
-        """Convert the surface to display format and build a mask for pixel-perfect collisions."""
-        try:
-            self.image = self.image.convert_alpha()
-        except Exception:
-            self.image = self.image.convert()
-        try:
-            self.mask = pygame.mask.from_surface(self.image)
-        except Exception:
-            self.mask = None
+        """Make sure the surfaces are in display format and build a mask for pixel-perfect collisions.
+
+        Images are re-acquired from the asset cache, which converts entries that were
+        loaded before the display existed.
+        """
+        self.source_image = assets.acquire(self.image_path)
+        assets.release(self.image_path)
+        for height in list(self._variants):
+            size = self._variant_size(height)
+            self._variants[height] = assets.acquire(self.image_path, scale=size)
+            assets.release(self.image_path, scale=size)
+        self._masks.clear()
+        self.image = self._variant(self.target_height)
+        self.mask = self._mask_for(self.target_height)
+        self._load_frames()
+
+    def reload(self):
+        """Re-read the image from disk (after it changed), rebuild variants and the mask."""
+        for height in list(self._variants):
+            assets.release(self.image_path, scale=self._variant_size(height))
+        self._variants.clear()
+        self._masks.clear()
+        assets.invalidate(self.image_path)
+        self.source_image = assets.acquire(self.image_path)
+        self.image = self._variant(self.target_height)
+        self.mask = self._mask_for(self.target_height)
+        if self.frames_path is not None:
+            assets.invalidate(self.frames_path)
+            assets.acquire(self.frames_path)
+        self._load_frames()
 
     def __repr__(self):
         return f"TileKind(name={self.name!r}, size={self.image.get_size()}, solid={self.is_solid})"
+
+
+def default_tile_kinds(animated=False):
+    """The game's tile kinds, in the order maps and saves index them.
+
+    With `animated`, water cycles through the frames in images/water_anim.png.
+    """
+    return [
+        TileKind("dirt", "images/dirt.png", False),
+        TileKind("grass", "images/grass.png", False),
+        TileKind("water", "images/water.png", False, frames="images/water_anim.png" if animated else None),
+        TileKind("tree", "images/tree.png", True, layer='overhead'),
+        TileKind("wood", "images/wood.png", False),
+    ]
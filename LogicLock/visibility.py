@@ -0,0 +1,307 @@
+import math
+import time
+from collections import OrderedDict
+import numpy as np
+from .entities import MAX_BLOCK_TILES
+
+# FOV results kept per (origin tile, radius)
+FOV_CACHE_SIZE = 512
+# Tiles a single long ray (whose box is too large to read) looks up at a time
+RAY_SEGMENT = 1024
+
+# Octant transforms for shadowcasting: (xx, xy, yx, yy)
+_OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
+
+
+def opacity_table(tile_kinds):
+    """Bool lookup: kind index -> blocks sight (TileKind.opaque), plus a trailing True for cells outside the map."""
+    return np.array([bool(getattr(tk, 'opaque', tk.is_solid)) for tk in tile_kinds] + [True], dtype=bool)
+
+
+def shadowcast(opaque, radius):
+    """Tiles visible from the centre of `opaque` ((2r+1) x (2r+1) rows of bools) within `radius`.
+
+    Recursive shadowcasting over the 8 octants; opaque tiles that are seen are
+    themselves visible. It is permissive: every tile whose centre has a clear
+    ray from the origin's centre is included, plus partly visible tiles.
+    Returns a bool array of the same shape.
+    """
+    size = 2 * radius + 1
+    seen = np.zeros((size, size), dtype=bool)
+    seen[radius, radius] = True
+    r2 = radius * radius + radius  # a little rounder than the exact circle
+
+    def cast(row, start, end, xx, xy, yx, yy):
+        if start < end:
+            return
+        new_start = start
+        for j in range(row, radius + 1):
+            dx, dy = -j - 1, -j
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                left, right = (dx - 0.5) / (dy + 0.5), (dx + 0.5) / (dy - 0.5)
+                if start < right:
+                    continue
+                if end > left:
+                    break
+                x = radius + dx * xx + dy * xy
+                y = radius + dx * yx + dy * yy
+                if dx * dx + dy * dy <= r2:
+                    seen[y, x] = True
+                wall = opaque[y][x]
+                if blocked:
+                    if wall:
+                        new_start = right
+                        continue
+                    blocked = False
+                    start = new_start
+                elif wall and j < radius:
+                    blocked = True
+                    cast(j + 1, start, left, xx, xy, yx, yy)
+                    new_start = right
+            if blocked:
+                break
+
+    for xx, xy, yx, yy in _OCTANTS:
+        cast(1, 1.0, 0.0, xx, xy, yx, yy)
+    return seen
+
+
+class Visibility:
+    """Line of sight and field of view against the map's opaque tiles.
+
+    Opacity comes from TileKind.opaque (solid kinds, i.e. trees, by default);
+    cells outside the map block sight. raycast() traces one ray tile by tile
+    (DDA); raycast_many() traces any number of rays at once, stepping all of
+    them together with NumPy. fov() gives the tiles visible within a radius
+    (shadowcasting), cached per (origin tile, radius) until tiles near the
+    origin change (the map's tile_listeners report edits).
+
+    Coordinates are pixels for rays (entity positions) and tiles for fov().
+
+    Usage:
+      vis = Visibility(game_map)
+      clear = vis.line_of_sight(npc_x, npc_y, player_x, player_y)
+      blocked, hit_x, hit_y = vis.raycast_many(xs, ys, target_xs, target_ys)
+      seen, (x0, y0) = vis.fov(tx, ty, 8)     # seen[y - y0, x - x0]
+    """
+    def __init__(self, game_map):
+        self.map = game_map
+        self.stats = {'rays': 0, 'fov_computed': 0, 'fov_cached': 0, 'ray_ms': 0.0, 'fov_ms': 0.0, 'last_batch': 0, 'last_batch_ms': 0.0}
+        self.reset()
+        game_map.tile_listeners.append(self.tiles_changed)
+
+    def reset(self):
+        self._table = opacity_table(self.map.tile_kinds)
+        # in-memory maps keep a full opacity grid; streamed maps read blocks on demand
+        self.opaque = self._table[self.map.tiles] if self.map.store is None else None
+        self._fov = OrderedDict()
+
+    def close(self):
+        try:
+            self.map.tile_listeners.remove(self.tiles_changed)
+        except ValueError:
+            pass
+
+    def tiles_changed(self, xs=None, ys=None):
+        """Map listener: refresh opacity at (xs, ys) and drop FOV results that could see them."""
+        if xs is None:
+            self.reset()
+            return
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        if not xs.size:
+            return
+        if self.opaque is not None:
+            if self.opaque.shape != self.map.tiles.shape:
+                self.reset()
+                return
+            self.opaque[ys, xs] = self._table[self.map.tiles[ys, xs]]
+        x0, x1, y0, y1 = xs.min(), xs.max(), ys.min(), ys.max()
+        for key in list(self._fov):
+            ox, oy, r = key
+            if ox + r < x0 or ox - r > x1 or oy + r < y0 or oy - r > y1:
+                continue
+            if np.any((np.abs(xs - ox) <= r) & (np.abs(ys - oy) <= r)):
+                del self._fov[key]
+
+    def opacity_block(self, x0, y0, x1, y1):
+        """Opacity of tiles [x0, x1) x [y0, y1) as a bool array (outside the map is opaque)."""
+        if self.opaque is None:
+            return self._table[self.map.tile_block(x0, y0, x1, y1, fill=len(self._table) - 1)]
+        out = np.ones((y1 - y0, x1 - x0), dtype=bool)
+        h, w = self.opaque.shape
+        sx0, sy0, sx1, sy1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+        if sx0 < sx1 and sy0 < sy1:
+            out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = self.opaque[sy0:sy1, sx0:sx1]
+        return out
+
+    def opacity_at(self, xs, ys):
+        """Opacity at tile coordinate arrays (xs, ys), for lookups too scattered for opacity_block()."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if self.opaque is None:
+            return self._table[self.map.tiles_at(xs, ys, fill=len(self._table) - 1)]
+        h, w = self.opaque.shape
+        out = np.ones(xs.shape, dtype=bool)
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        out[inside] = self.opaque[ys[inside], xs[inside]]
+        return out
+
+    def raycast(self, ax, ay, bx, by):
+        """Trace from pixel (ax, ay) to (bx, by). Returns the first opaque tile between them, or None.
+
+        The tiles containing the two end points are not tested, so an entity
+        standing next to (or inside) a tree can still be seen.
+        """
+        ts = float(self.map.tile_size)
+        ax, ay, bx, by = float(ax) / ts, float(ay) / ts, float(bx) / ts, float(by) / ts
+        tx, ty = int(math.floor(ax)), int(math.floor(ay))
+        ex, ey = int(math.floor(bx)), int(math.floor(by))
+        dx, dy = bx - ax, by - ay
+        step_x = (dx > 0) - (dx < 0)
+        step_y = (dy > 0) - (dy < 0)
+        t_dx = abs(1.0 / dx) if dx else math.inf
+        t_dy = abs(1.0 / dy) if dy else math.inf
+        t_x = ((tx + (step_x > 0)) - ax) / dx if dx else math.inf
+        t_y = ((ty + (step_y > 0)) - ay) / dy if dy else math.inf
+        steps = abs(ex - tx) + abs(ey - ty)
+        self.stats['rays'] += 1
+        if (abs(ex - tx) + 1) * (abs(ey - ty) + 1) > MAX_BLOCK_TILES:
+            # long diagonal: walk in segments and look up only the tiles on the ray
+            remaining = steps - 1
+            while remaining > 0:
+                xs, ys = [], []
+                for _ in range(min(remaining, RAY_SEGMENT)):
+                    if t_x < t_y:
+                        tx += step_x
+                        t_x += t_dx
+                    else:
+                        ty += step_y
+                        t_y += t_dy
+                    xs.append(tx)
+                    ys.append(ty)
+                remaining -= len(xs)
+                hits = np.flatnonzero(self.opacity_at(xs, ys))
+                if hits.size:
+                    return (xs[hits[0]], ys[hits[0]])
+            return None
+        block = self.opacity_block(min(tx, ex), min(ty, ey), max(tx, ex) + 1, max(ty, ey) + 1)
+        ox, oy = min(tx, ex), min(ty, ey)
+        for _ in range(steps - 1):
+            if t_x < t_y:
+                tx += step_x
+                t_x += t_dx
+            else:
+                ty += step_y
+                t_y += t_dy
+            if block[ty - oy, tx - ox]:
+                return (tx, ty)
+        return None
+
+    def line_of_sight(self, ax, ay, bx, by):
+        return self.raycast(ax, ay, bx, by) is None
+
+    def raycast_many(self, ax, ay, bx, by):
+        """Trace many rays (pixel coordinate arrays) at once.
+
+        Returns (blocked, hit_x, hit_y): per ray, whether an opaque tile lies
+        strictly between the end tiles, and that first tile (-1 where clear).
+        All rays advance one tile per step together, so the cost is a few array
+        operations per tile of the longest ray. Opacity comes from one block over
+        all rays when that is small, else from per-step lookups of the tiles the
+        active rays are on.
+        """
+        start = time.perf_counter()
+        ts = float(self.map.tile_size)
+        ax, ay, bx, by = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) / ts for v in (ax, ay, bx, by)))
+        n = ax.size
+        ax, ay, bx, by = ax.ravel(), ay.ravel(), bx.ravel(), by.ravel()
+        blocked = np.zeros(n, bool)
+        hit_x = np.full(n, -1, np.int64)
+        hit_y = np.full(n, -1, np.int64)
+        if n == 0:
+            return blocked, hit_x, hit_y
+        tx, ty = np.floor(ax).astype(np.int64), np.floor(ay).astype(np.int64)
+        ex, ey = np.floor(bx).astype(np.int64), np.floor(by).astype(np.int64)
+        dx, dy = bx - ax, by - ay
+        step_x, step_y = np.sign(dx).astype(np.int64), np.sign(dy).astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_dx = np.where(dx != 0, np.abs(1.0 / dx), np.inf)
+            t_dy = np.where(dy != 0, np.abs(1.0 / dy), np.inf)
+            t_x = np.where(dx != 0, ((tx + (step_x > 0)) - ax) / dx, np.inf)
+            t_y = np.where(dy != 0, ((ty + (step_y > 0)) - ay) / dy, np.inf)
+        remaining = np.abs(ex - tx) + np.abs(ey - ty) - 1
+        ox, oy = int(min(tx.min(), ex.min())), int(min(ty.min(), ey.min()))
+        x1, y1 = int(max(tx.max(), ex.max())) + 1, int(max(ty.max(), ey.max())) + 1
+        block = self.opacity_block(ox, oy, x1, y1) if (x1 - ox) * (y1 - oy) <= MAX_BLOCK_TILES else None
+        active = remaining > 0
+        while active.any():
+            idx = np.flatnonzero(active)
+            go_x = t_x[idx] < t_y[idx]
+            ix, iy = idx[go_x], idx[~go_x]
+            tx[ix] += step_x[ix]
+            t_x[ix] += t_dx[ix]
+            ty[iy] += step_y[iy]
+            t_y[iy] += t_dy[iy]
+            remaining[idx] -= 1
+            hit = block[ty[idx] - oy, tx[idx] - ox] if block is not None else self.opacity_at(tx[idx], ty[idx])
+            hits = idx[hit]
+            blocked[hits] = True
+            hit_x[hits] = tx[hits]
+            hit_y[hits] = ty[hits]
+            active[idx] = (remaining[idx] > 0) & ~hit
+        elapsed = (time.perf_counter() - start) * 1000.0
+        self.stats['rays'] += n
+        self.stats['ray_ms'] += elapsed
+        self.stats['last_batch'] = n
+        self.stats['last_batch_ms'] = elapsed
+        return blocked, hit_x, hit_y
+
+    def sees(self, ax, ay, bx, by, max_distance):
+        """Per pair: is (bx, by) within `max_distance` pixels of (ax, ay) with a clear line? (arrays)."""
+        ax, ay, bx, by = np.broadcast_arrays(ax, ay, bx, by)
+        near = np.hypot(np.asarray(bx, np.float64) - ax, np.asarray(by, np.float64) - ay) <= max_distance
+        out = np.zeros(near.shape, bool)
+        if near.any():
+            blocked, _, _ = self.raycast_many(ax[near], ay[near], bx[near], by[near])
+            out[near] = ~blocked
+        return out
+
+    def fov(self, tx, ty, radius):
+        """Tiles visible from tile (tx, ty) within `radius` tiles.
+
+        Returns (seen, (x0, y0)): a (2r+1) x (2r+1) bool array (do not modify it; it
+        is cached) whose [0, 0] is tile (x0, y0).
+        """
+        tx, ty, radius = int(tx), int(ty), int(radius)
+        key = (tx, ty, radius)
+        seen = self._fov.get(key)
+        if seen is not None:
+            self._fov.move_to_end(key)
+            self.stats['fov_cached'] += 1
+            return seen, (tx - radius, ty - radius)
+        start = time.perf_counter()
+        block = self.opacity_block(tx - radius, ty - radius, tx + radius + 1, ty + radius + 1)
+        seen = shadowcast(block.tolist(), radius)
+        seen.flags.writeable = False
+        self._fov[key] = seen
+        if len(self._fov) > FOV_CACHE_SIZE:
+            self._fov.popitem(last=False)
+        self.stats['fov_computed'] += 1
+        self.stats['fov_ms'] += (time.perf_counter() - start) * 1000.0
+        return seen, (tx - radius, ty - radius)
+
+    def fov_many(self, tiles, radius):
+        """fov() for each (tx, ty) in `tiles`; observers sharing a tile share the result."""
+        return [self.fov(tx, ty, radius) for tx, ty in tiles]
+
+    def memory_items(self):
+        if self.opaque is not None:
+            yield 'tiles', 'visibility opacity', self.opaque
+        for seen in list(self._fov.values()):
+            yield 'caches', 'fov cache', seen
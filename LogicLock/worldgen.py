@@ -0,0 +1,110 @@
+import numpy as np
+
+# Default side length (tiles) of generated worlds; large enough to never reach the edge
+DEFAULT_WORLD_SIZE = 1 << 20
+
+
+def _hash01(ix, iy, seed):
+    """Deterministic pseudo-random values in [0, 1) for integer lattice points (vectorized)."""
+    h = (ix.astype(np.uint32) * np.uint32(0x27D4EB2D)) ^ (iy.astype(np.uint32) * np.uint32(0x165667B1))
+    h ^= np.uint32((int(seed) * 0x9E3779B1) & 0xFFFFFFFF)
+    h ^= h >> np.uint32(15)
+    h *= np.uint32(0x85EBCA6B)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xC2B2AE35)
+    h ^= h >> np.uint32(16)
+    return h.astype(np.float32) * np.float32(1.0 / 4294967296.0)
+
+
+def _axis(start, count, scale):
+    """Lattice cell index and smoothstepped fraction for `count` positions along one axis."""
+    pos = (np.arange(start, start + count, dtype=np.float64) + 0.5) / scale
+    cell = np.floor(pos)
+    f = (pos - cell).astype(np.float32)
+    return cell.astype(np.int64), f * f * (3.0 - 2.0 * f)
+
+
+def value_noise(x0, y0, w, h, scale, seed=0):
+    """Smooth value noise in [0, 1) for tiles [x0, x0+w) x [y0, y0+h).
+
+    Values depend only on absolute tile coordinates, so separately generated blocks
+    tile seamlessly. Lattice values are hashed once for the covering cells and
+    interpolated separably.
+    """
+    cx, sx = _axis(x0, w, scale)
+    cy, sy = _axis(y0, h, scale)
+    lx = np.arange(cx[0], cx[-1] + 2)
+    ly = np.arange(cy[0], cy[-1] + 2)
+    lattice = _hash01(lx[None, :], ly[:, None], seed)
+    ix = cx - lx[0]
+    iy = cy - ly[0]
+    top = lattice[iy][:, ix]
+    bottom = lattice[iy + 1][:, ix]
+    top_r = lattice[iy][:, ix + 1]
+    bottom_r = lattice[iy + 1][:, ix + 1]
+    upper = top + (top_r - top) * sx
+    lower = bottom + (bottom_r - bottom) * sx
+    return upper + (lower - upper) * sy[:, None]
+
+
+def fractal_noise(x0, y0, w, h, scale, octaves=4, seed=0, persistence=0.5):
+    """Sum of `octaves` value-noise layers, each at half the scale of the previous, normalized to [0, 1)."""
+    total = np.zeros((h, w), dtype=np.float32)
+    amplitude = 1.0
+    norm = 0.0
+    for octave in range(max(1, int(octaves))):
+        total += value_noise(x0, y0, w, h, scale / (2 ** octave), seed * 131 + octave) * np.float32(amplitude)
+        norm += amplitude
+        amplitude *= persistence
+    return total / np.float32(norm)
+
+
+class WorldGenerator:
+    """Procedural tile source: `gen(x0, y0, w, h)` returns an int16 (h, w) grid.
+
+    An elevation noise field picks water, dirt (shores) and grass by threshold; a
+    second, independent field marks forests on grass as tree tiles. Map thins those
+    forests with its tree_density/clustered settings, like trees in image maps.
+    Output depends only on the seed and tile coordinates.
+
+    Usage:
+      gen = WorldGenerator(tile_kinds, seed=7)
+      world = Map.from_source(gen, gen.size, gen.size, tile_kinds, 32, tree_density=0.04)
+    """
+    def __init__(self, tile_kinds, seed=0, size=DEFAULT_WORLD_SIZE, scale=64.0, octaves=4,
+                 water_level=0.36, shore_level=0.42, forest_level=0.58, forest_scale=40.0):
+        names = {tk.name: i for i, tk in enumerate(tile_kinds)}
+        self.grass = names.get('grass', 0)
+        self.water = names.get('water', self.grass)
+        self.dirt = names.get('dirt', self.grass)
+        self.tree = names.get('tree', self.grass)
+        self.seed = int(seed)
+        self.size = int(size)
+        self.scale = float(scale)
+        self.octaves = int(octaves)
+        self.water_level = water_level
+        self.shore_level = shore_level
+        self.forest_level = forest_level
+        self.forest_scale = float(forest_scale)
+
+    def __call__(self, x0, y0, w, h):
+        elevation = fractal_noise(x0, y0, w, h, self.scale, self.octaves, self.seed)
+        forest = fractal_noise(x0, y0, w, h, self.forest_scale, 3, self.seed + 1)
+        tiles = np.full((h, w), self.grass, dtype=np.int16)
+        tiles[forest > self.forest_level] = self.tree
+        tiles[elevation < self.shore_level] = self.dirt
+        tiles[elevation < self.water_level] = self.water
+        return tiles
+
+    def find_spawn(self, tx, ty, tile_kinds, radius=64):
+        """Nearest grass tile to (tx, ty) within `radius` (else any walkable dry tile, else (tx, ty))."""
+        x0, y0 = max(0, tx - radius), max(0, ty - radius)
+        block = self(x0, y0, 2 * radius + 1, 2 * radius + 1)
+        ys, xs = np.nonzero(block == self.grass)
+        if not len(ys):
+            ok = ~np.array([tk.is_solid for tk in tile_kinds])[block] & (block != self.water)
+            ys, xs = np.nonzero(ok)
+        if not len(ys):
+            return tx, ty
+        i = int(np.argmin((xs + x0 - tx) ** 2 + (ys + y0 - ty) ** 2))
+        return int(xs[i] + x0), int(ys[i] + y0)